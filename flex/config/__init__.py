@@ -1,8 +1,22 @@
-import pandas as pd
+from __future__ import annotations
+from collections.abc import Mapping
 import warnings
-import yaml
 import os
+import shutil
+import threading
+import time
 from abc import abstractmethod
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from ..lazy import LazyModule
+
+# Imported on first use, to keep import flex fast
+pd = LazyModule('pandas')
+yaml = LazyModule('yaml')
 
 
 class DataMgr:
@@ -10,10 +24,35 @@ class DataMgr:
     Separate data should be kept for the config and logs for the following reasons:
     1. Merge might introduce NaN in case of deleted or added cols. So the output reports will have NaN
     2. Order of calling to save_log or save_config might make the config record not always the last in the merged DF
+
+    Appended records are buffered and only merged into the logs DataFrame when the logs are read.
+    Records are first kept as a list of small frames, which is folded into one chunk every chunk_size records,
+    so appending N records costs O(N) overall instead of copying the whole logs table on every record.
+
+    With compact, the merged logs are kept compact, see compact_frame: mostly NaN columns are sparse, repeated strings
+    categorical and numbers downcast. dense() converts them back.
+
+    The rankings of the records queried by top are kept as Leaderboards, updated on every append and edit.
     '''
-    def __init__(self, logs:pd.DataFrame=None, config:pd.DataFrame=None):
+    chunk_size = 1024
+    compact = False
+
+    def __init__(self, logs:pd.DataFrame=None, config:pd.DataFrame=None, compact: bool=None):
+        """
+
+        :param compact: keep the logs compact in memory. Default: the class compact
+        :type compact: bool
+        """
+        if compact is not None:
+            self.compact = compact
         self.config_df = pd.DataFrame()
         self.df = pd.DataFrame()
+        self.chunks = []  # Folded chunks of chunk_size records each, not yet merged in df
+        self.pending = []  # Records appended since the last fold
+        self.resets = 0  # Number of times the logs were overwritten
+        self.edits = []  # Positions of the records edited by edit_config
+        self.loaded = 0  # Number of records set by the last logs overwrite
+        self.leaderboards = {}  # (metric, mode) -> Leaderboard of the logs
 
         if isinstance(config, pd.DataFrame):
             self.config = config
@@ -33,30 +72,170 @@ class DataMgr:
 
     @property
     def logs(self)->pd.DataFrame:
+        self.flush()
         return self.df
 
     @logs.setter
     def logs(self, df:pd.DataFrame):
         # Overwrite logs
-        self.df = df
+        self.df = df.reset_index(drop=True)
+        if self.compact:
+            self.df = compact_frame(self.df)
+        self.chunks = []
+        self.pending = []
+        self.resets += 1
+        self.loaded = len(df)
+        # Ranked again on the next top
+        self.leaderboards = {}
         # Append config_df
         self.append(self.config)
 
     def append(self, df:pd.DataFrame):
-        self.df = self.df.append(df, sort=False, ignore_index=True)
+        if df.empty:
+            return
+        if self.leaderboards:
+            start = self.count()
+            for i, record in enumerate(df.to_dict(orient='records')):
+                for leaderboard in self.leaderboards.values():
+                    leaderboard.add(start + i, record)
+        self.pending.append(df)
+        if len(self.pending) >= self.chunk_size:
+            self.chunks.append(self.concat(self.pending))
+            self.pending = []
+
+    def flush(self):
+        """
+        Merge the buffered records into the logs DataFrame
+        """
+        if self.chunks or self.pending:
+            self.df = self.concat([self.df] + self.chunks + self.pending)
+            self.chunks = []
+            self.pending = []
+            if self.compact:
+                self.df = compact_frame(self.df)
+
+    def dense(self) -> pd.DataFrame:
+        """
+        The logs as a dense DataFrame, without sparse or categorical columns
+        :rtype: pd.DataFrame
+        """
+        return dense_frame(self.logs)
+
+    def memory(self) -> dict:
+        """
+        Memory used by the logs
+        :return: bytes, dense_bytes: the bytes of the dense logs, and saving: the share of dense_bytes saved
+        :rtype: dict
+        """
+        logs = self.logs
+        used = memory_usage(logs)
+        dense_used = memory_usage(dense_frame(logs))
+        return {'bytes': used, 'dense_bytes': dense_used, 'saving': 1 - used / dense_used if dense_used else 0.}
+
+    def count(self) -> int:
+        return len(self.df) + sum(len(df) for df in self.chunks) + sum(len(df) for df in self.pending)
+
+    def tail(self, start: int) -> pd.DataFrame:
+        """
+        Get the records from position start on, without merging the buffers into the whole logs
+        :param start: position of the first record
+        :type start: int
+        :return: records indexed by their position in the logs
+        :rtype: pd.DataFrame
+        """
+        if start < len(self.df):
+            return self.logs.iloc[start:]
+
+        # Only the buffered frames from start on, so saving the new records after each run doesn't concat all of them
+        dfs = []
+        position = len(self.df)
+        for df in self.chunks + self.pending:
+            if position + len(df) > start:
+                dfs.append(df.iloc[max(start - position, 0):])
+            position += len(df)
+
+        records = self.concat(dfs).copy()
+        records.index = range(start, start + len(records))
+        return records
+
+    @staticmethod
+    def concat(dfs) -> pd.DataFrame:
+        dfs = [df for df in dfs if not df.empty]
+        if not dfs:
+            return pd.DataFrame()
+        if len(dfs) == 1:
+            return dfs[0].reset_index(drop=True)
+        return pd.concat(dfs, sort=False, ignore_index=True)
 
     def edit_config(self, attribs:dict):
 
         attrib_df = pd.DataFrame(attribs, index=[0])
 
-        # Merge in config. It will add new entry, keeping the old one.
-        new_config_df = pd.concat([self.config_df, attrib_df], axis=1)
+        # Merge in config. It will add new entries, and overwrite the existing ones in place.
+        new_config_df = self.merge_config(self.config_df, attrib_df)
 
         # Update the config_df
         self.config_df = new_config_df
 
-        # Update the last entry in the logs
-        self.df.iloc[-1] = new_config_df.iloc[-1]# we want to have a Series, so we use iloc[-1] on the new_config_df
+        self.edits.append(self.count() - 1)
+
+        if self.compact and not self.pending and not self.chunks and not self.df.empty:
+            # Sparse, categorical and downcast columns can't take any new value in place,
+            # the edited record goes back to the buffer, with the full size types
+            self.pending = [dense_frame(self.df.iloc[-1:], upcast=True)]
+            self.df = self.df.iloc[:-1]
+
+        # Update the last entry in the logs, which might still be buffered
+        # we want to have a Series, so we use iloc[-1] on the new_config_df
+        # Buffered records might be shared with the caller (e.g. the old config_df), so edit a copy
+        if self.pending:
+            self.pending[-1] = self.pending[-1].copy()
+            self.edit_last(self.pending[-1], new_config_df.iloc[-1])
+        elif self.chunks:
+            self.chunks[-1] = self.chunks[-1].copy()
+            self.edit_last(self.chunks[-1], new_config_df.iloc[-1])
+        else:
+            self.edit_last(self.df, new_config_df.iloc[-1])
+
+        if self.leaderboards:
+            record = new_config_df.iloc[-1:].to_dict(orient='records')[0]
+            for leaderboard in self.leaderboards.values():
+                leaderboard.edit_last(record)
+
+    def top(self, metric: str, k: int=10, mode: str='max', filters: list=None, columns: list=None) -> pd.DataFrame:
+        """
+        The best records by metric. The first query of a metric ranks the logs, the next ones read its Leaderboard
+        :param metric: the ranking key, e.g. val_acc
+        :param k: number of records
+        :param mode: max or min, the best value
+        :param filters: only rank the records matching all the filters. See ConfigTypeMgr.load
+        :param columns: only get these columns
+        :return: the k best records, best first
+        :rtype: pd.DataFrame
+        """
+        leaderboard = self.leaderboards.get((metric, mode))
+        if leaderboard is None:
+            leaderboard = Leaderboard(metric, mode)
+            for position, record in enumerate(self.logs.to_dict(orient='records')):
+                leaderboard.add(position, record)
+            self.leaderboards[(metric, mode)] = leaderboard
+
+        top = pd.DataFrame.from_records([record for _, record in leaderboard.top(k, filters)])
+        if columns is not None:
+            top = top.reindex(columns=[col for col in columns if col in top.columns])
+        return top
+
+    @staticmethod
+    def merge_config(config_df: pd.DataFrame, attrib_df: pd.DataFrame) -> pd.DataFrame:
+        existing = [key for key in attrib_df.columns if key in config_df.columns]
+        new_config_df = pd.concat([config_df.drop(columns=existing), attrib_df], axis=1)
+        return new_config_df[list(config_df.columns) + [key for key in attrib_df.columns if key not in existing]]
+
+    @staticmethod
+    def edit_last(df: pd.DataFrame, record: pd.Series):
+        # Set key by key, so new attribs are added as new columns
+        for key, value in record.items():
+            df.at[df.index[-1], key] = value
 
 class PklConfig:
     @classmethod
@@ -82,6 +261,30 @@ class CSVConfig:
     def load(cls, file: str)-> pd.DataFrame:
         return pd.read_csv(file, index_col=0)
 
+    @classmethod
+    @abstractmethod
+    def load_columns(cls, file: str, columns: list=None, filters: list=None) -> pd.DataFrame:
+        needed = ConfigTypeMgr.needed_columns(columns, filters)
+        # The unnamed first column is the index. None: only filters, all the columns are needed
+        usecols = None if needed is None else lambda col: col in needed or col == '' or col.startswith('Unnamed: ')
+        df = pd.read_csv(file, index_col=0, usecols=usecols)
+        return ConfigTypeMgr.select(df, columns=columns, filters=filters)
+
+    @classmethod
+    @abstractmethod
+    def append(cls, df: pd.DataFrame, file: str):
+        if not os.path.exists(file):
+            # Created atomically, so readers never see it partially written
+            ConfigTypeMgr.save(df, file)
+            return
+
+        header = pd.read_csv(file, index_col=0, nrows=0).columns
+        if set(df.columns).issubset(header):
+            df.reindex(columns=header).to_csv(file, mode='a', header=False)
+        else:
+            # The header can't be extended in place, so new columns need a rewrite
+            ConfigTypeMgr.save(pd.concat([cls.load(file), df], sort=False, ignore_index=True), file)
+
 
 class JSONConfig:
 
@@ -96,6 +299,31 @@ class JSONConfig:
         return pd.read_json(file, orient='index')
 
 
+class JSONLConfig:
+    '''
+    JSON lines, one record per line. Records are self describing, so new records are always appended in place.
+    '''
+
+    @classmethod
+    @abstractmethod
+    def save(cls, df: pd.DataFrame, file: str):
+        df.to_json(file, orient='records', lines=True)
+
+    @classmethod
+    @abstractmethod
+    def load(cls, file: str) -> pd.DataFrame:
+        return pd.read_json(file, orient='records', lines=True)
+
+    @classmethod
+    @abstractmethod
+    def append(cls, df: pd.DataFrame, file: str):
+        records = df.to_json(orient='records', lines=True)
+        if not records.endswith('\n'):
+            records += '\n'
+        with open(file, 'a') as f:
+            f.write(records)
+
+
 class HTMLConfig:
 
     @classmethod
@@ -110,6 +338,78 @@ class HTMLConfig:
         return pd.read_html(file)
 
 
+class ParquetConfig:
+    '''
+    Columnar storage, needs pyarrow. Only the requested columns are read, and filters are pushed down to the row groups.
+    Incremental appends are written as part files in a directory named as the logs file, which compact folds back.
+    '''
+
+    @classmethod
+    @abstractmethod
+    def save(cls, df: pd.DataFrame, file: str):
+        if os.path.isdir(file):
+            shutil.rmtree(file)
+        df.to_parquet(file)
+
+    @classmethod
+    @abstractmethod
+    def load(cls, file: str) -> pd.DataFrame:
+        return cls.load_columns(file)
+
+    @classmethod
+    @abstractmethod
+    def load_columns(cls, file: str, columns: list=None, filters: list=None) -> pd.DataFrame:
+        if not os.path.isdir(file):
+            return pd.read_parquet(file, columns=columns, filters=filters)
+
+        # Parts might have different columns, so each part is projected to its own columns and filtered after merge
+        import pyarrow.parquet as pq
+        needed = ConfigTypeMgr.needed_columns(columns, filters)
+        parts = []
+        for part in sorted(os.listdir(file)):
+            part = os.path.join(file, part)
+            part_columns = None if needed is None else [col for col in pq.read_schema(part).names if col in needed]
+            parts.append(pd.read_parquet(part, columns=part_columns))
+
+        return ConfigTypeMgr.select(pd.concat(parts, sort=False), columns=columns, filters=filters)
+
+    @classmethod
+    @abstractmethod
+    def append(cls, df: pd.DataFrame, file: str):
+        if os.path.isfile(file):
+            # Move the single file logs as the first part
+            os.rename(file, file + '.part')
+            os.makedirs(file)
+            os.rename(file + '.part', os.path.join(file, 'part-00000.parquet'))
+        os.makedirs(file, exist_ok=True)
+
+        df.to_parquet(os.path.join(file, 'part-{:05d}.parquet'.format(len(os.listdir(file)))))
+
+
+class FeatherConfig:
+    '''
+    Arrow IPC (feather) storage, needs pyarrow. Only the requested columns are read.
+    '''
+
+    @classmethod
+    @abstractmethod
+    def save(cls, df: pd.DataFrame, file: str):
+        # Feather only stores the default index
+        df.reset_index(drop=True).to_feather(file)
+
+    @classmethod
+    @abstractmethod
+    def load(cls, file: str) -> pd.DataFrame:
+        return pd.read_feather(file)
+
+    @classmethod
+    @abstractmethod
+    def load_columns(cls, file: str, columns: list=None, filters: list=None) -> pd.DataFrame:
+        needed = ConfigTypeMgr.needed_columns(columns, filters)
+        df = pd.read_feather(file, columns=needed)
+        return ConfigTypeMgr.select(df, columns=columns, filters=filters)
+
+
 class YAMLConfig:
 
     @classmethod
@@ -125,24 +425,153 @@ class YAMLConfig:
             return pd.DataFrame(yaml.load(f), index=[0])
 
 
+class FileLock:
+    '''
+    Lock on a file between processes, held on the side file <file>.lock.
+    Exclusive for writers, shared for readers (exclusive too on Windows).
+    '''
+    def __init__(self, file: str, shared: bool=False):
+        self.lock_file = file + '.lock'
+        self.shared = shared
+        self.fd = None
+
+    @staticmethod
+    def is_shared(file: str) -> bool:
+        """
+        Check if file is written by share_logs, which creates the lock file before writing it
+        """
+        return os.path.exists(file + '.lock')
+
+    def __enter__(self):
+        self.fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT)
+        if fcntl:
+            fcntl.flock(self.fd, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(self.fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after 10 seconds
+                    time.sleep(0.1)
+        return self
+
+    def __exit__(self, *args):
+        if fcntl:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        os.close(self.fd)
+        self.fd = None
+
+
 class ConfigTypeMgr:
     type_hndlr = {'csv'    :CSVConfig,
                   'json'   :JSONConfig,
+                  'jsonl'  :JSONLConfig,
                   'html'   :HTMLConfig,
                   'pkl'    :PklConfig,
-                  'yml'    :YAMLConfig}
+                  'yml'    :YAMLConfig,
+                  'parquet':ParquetConfig,
+                  'feather':FeatherConfig,
+                  'arrow'  :FeatherConfig}
+    filter_ops = {'==': lambda col, value: col == value,
+                  '=': lambda col, value: col == value,
+                  '!=': lambda col, value: col != value,
+                  '<': lambda col, value: col < value,
+                  '<=': lambda col, value: col <= value,
+                  '>': lambda col, value: col > value,
+                  '>=': lambda col, value: col >= value,
+                  'in': lambda col, value: col.isin(value),
+                  'not in': lambda col, value: ~col.isin(value)}
     def __init(self):
         pass
 
     @classmethod
     @abstractmethod
     def save(cls, df: pd.DataFrame, file:str):
-        cls.type_hndlr[cls.check_file_type(file)].save(df, file)
+        # Write to a temp file then rename, so readers and other writers never see a partially written file
+        root, ext = os.path.splitext(file)
+        tmp_file = '{}.{}.tmp{}'.format(root, os.getpid(), ext)
+        cls.type_hndlr[cls.check_file_type(file)].save(dense_frame(df), tmp_file)
+        if os.path.isdir(file):
+            shutil.rmtree(file)
+        os.replace(tmp_file, file)
+
+    @classmethod
+    @abstractmethod
+    def load(cls, file:str, columns: list=None, filters: list=None)-> pd.DataFrame:
+        """
+
+        :param file:
+        :param columns: only load these columns
+        :type columns: list
+        :param filters: only load the rows matching all the filters, in pyarrow format: [(column, op, value), ...]
+        op is one of ==, =, !=, <, <=, >, >=, in, not in
+        :type filters: list
+        :return:
+        :rtype: pd.DataFrame
+        """
+        hndlr = cls.type_hndlr[cls.check_file_type(file)]
+        if columns is None and filters is None:
+            return hndlr.load(file)
+        if hasattr(hndlr, 'load_columns'):
+            return hndlr.load_columns(file, columns=columns, filters=filters)
+        return cls.select(hndlr.load(file), columns=columns, filters=filters)
 
     @classmethod
     @abstractmethod
-    def load(cls, file:str)-> pd.DataFrame:
-        return cls.type_hndlr[cls.check_file_type(file)].load(file)
+    def select(cls, df: pd.DataFrame, columns: list=None, filters: list=None) -> pd.DataFrame:
+        """
+        Filter the rows, then project the columns of df. See load for the format
+        """
+        if filters:
+            mask = pd.Series(True, index=df.index)
+            for col, op, value in filters:
+                mask &= cls.filter_ops[op](df[col], value)
+            df = df[mask]
+        if columns is not None:
+            df = df[[col for col in columns if col in df.columns]]
+        return df
+
+    @classmethod
+    @abstractmethod
+    def needed_columns(cls, columns: list=None, filters: list=None) -> list:
+        """
+        Columns to read to apply the projection and filters. None means all columns
+        """
+        if columns is None:
+            return None
+        return list(columns) + [col for col, _, _ in filters or [] if col not in columns]
+
+    @classmethod
+    @abstractmethod
+    def append(cls, df: pd.DataFrame, file:str):
+        """
+        Append the records of df to file. Types that can't be appended in place are merged: loaded, extended and saved.
+        """
+        df = dense_frame(df)
+        if cls.can_append(file):
+            cls.type_hndlr[cls.check_file_type(file)].append(df, file)
+        elif os.path.exists(file):
+            cls.save(pd.concat([cls.load(file), df], sort=False, ignore_index=True), file)
+        else:
+            cls.save(df, file)
+
+    @classmethod
+    @abstractmethod
+    def can_append(cls, file:str) -> bool:
+        return hasattr(cls.type_hndlr[cls.check_file_type(file)], 'append')
+
+    @classmethod
+    @abstractmethod
+    def compact(cls, file:str, out_file:str=None):
+        """
+        Fold the pieces written by incremental appends back into one file
+        :param file: appended logs file
+        :param out_file: compacted file, of any supported type. Default: overwrite file
+        """
+        cls.save(cls.load(file), out_file if out_file else file)
 
     @classmethod
     @abstractmethod
@@ -150,44 +579,272 @@ class ConfigTypeMgr:
         return str(os.path.splitext(file)[1].split('.')[-1])
 
 
+class ConfigView(Mapping):
+    '''
+    Read only snapshot of the current config record, with dict and attribute access: config()['lr'] or config().lr.
+
+    Values are plain Python values, each keeping its column type. A snapshot is not updated by later edits,
+    Configuration.config returns a new one after them. Pickled as a plain dict.
+    '''
+    __slots__ = ('_values',)
+
+    def __init__(self, values: dict=None):
+        object.__setattr__(self, '_values', dict(values or {}))
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __getattr__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            raise AttributeError('No config key ' + str(key)) from None
+
+    def __setattr__(self, key, value):
+        raise TypeError('ConfigView is read only, edit the config with Configuration.add_config_attribs')
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __repr__(self):
+        return 'ConfigView(' + repr(self._values) + ')'
+
+    def __reduce__(self):
+        return ConfigView, (self._values,)
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+    @property
+    def index(self) -> list:
+        """
+        The keys, as the index of the config Series
+        """
+        return list(self._values)
+
+    def to_dict(self) -> dict:
+        return dict(self._values)
+
+    def to_series(self) -> pd.Series:
+        return pd.Series(self._values, dtype=object)
+
+
 class Configuration:
 
-    def __init__(self, config=None, logs=None):
+    def __init__(self, config=None, logs=None, data_mgr: DataMgr=None):
+        """
+
+        :param config:
+        :param logs:
+        :param data_mgr: backend keeping the logs, e.g. SQLiteDataMgr. Default: in memory DataMgr.
+        Old runs are already in a persistent backend, so logs are only loaded into it if given.
+        :type data_mgr: DataMgr
+        """
+
+        # Serializes the edits of the records, e.g. by Application.run calls in several threads
+        self.lock = threading.RLock()
+        # Keys added to the config record by add_config_attribs, e.g. the metrics and results of the runs
+        self.logged = set()
 
         # Load old runs
-        logs_df = self.process_logs(logs)
+        logs_df = self.process_logs(logs) if data_mgr is None or logs is not None else None
 
         # Log config
         config_df = self.process_config(config)
 
         # Update the DB
-        self.data_mgr = DataMgr(logs=logs_df, config=config_df)
+        if data_mgr is None:
+            self.data_mgr = DataMgr(logs=logs_df, config=config_df)
+        else:
+            self.data_mgr = data_mgr
+            self.data_mgr.config = config_df
+            if logs_df is not None:
+                self.data_mgr.logs = logs_df
+
+        # Watermarks of the logs files: file -> (resets, records, edits) of data_mgr when last saved
+        self.log_marks = {}
+        if isinstance(logs, str):
+            self.mark_logs(logs, records=len(logs_df))
 
     ####### Interfaces ############
     def __call__(self, *args, **kwargs):
         return self.config
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Rebuilt on first access
+        state.pop('view', None)
+        state.pop('view_df', None)
+        state.pop('lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
     def save_config(self, file: str):
         ConfigTypeMgr.save(df=self.data_mgr.config, file=file)
 
     def load_config(self, file):
-        self.data_mgr.config = self.process_config(file)
+        self.config = file
+
+    def save_logs(self, file: str, incremental: bool=False, shared: bool=False):
+        """
+
+        :param file:
+        :param incremental: only write the records added since the last save to the same file. Supported for csv, jsonl and parquet.
+        Falls back to a full save if the file wasn't saved or loaded before, or an already saved record was edited.
+        :type incremental: bool
+        :param shared: file is shared with other processes logging to it. See share_logs
+        :type shared: bool
+        :return:
+        :rtype:
+        """
+        if shared:
+            self.share_logs(file)
+            return
+
+        if incremental and self.is_marked(file):
+            _, records, _ = self.log_marks[os.path.abspath(file)]
+            new_logs = self.data_mgr.tail(records)
+            if not new_logs.empty:
+                ConfigTypeMgr.append(df=new_logs, file=file)
+        else:
+            if incremental and not ConfigTypeMgr.can_append(file):
+                warnings.warn(UserWarning("Incremental save is not supported for " + file + ". All logs are saved."))
+            ConfigTypeMgr.save(df=self.data_mgr.logs, file=file)
+
+        self.mark_logs(file)
+
+    def share_logs(self, file: str):
+        """
+        Add the new records to a logs file shared with other processes, without losing the records they added.
+        New records are the ones added since the last save to file, or since the logs were loaded if never saved to file.
+        They are appended while holding a lock on file: in place for csv, jsonl and parquet, merged for the other types.
+        Records edited after being saved can't be updated in a shared file, they are kept as first saved.
+        :param file:
+        """
+        mark = self.log_marks.get(os.path.abspath(file))
+        if mark and mark[0] == self.data_mgr.resets:
+            _, start, edits = mark
+            if any(edit < start for edit in self.data_mgr.edits[edits:]):
+                warnings.warn(UserWarning("Records edited after being saved to the shared " + file + " are not updated."))
+        else:
+            start = self.data_mgr.loaded
+
+        new_logs = self.data_mgr.tail(start)
+        if not new_logs.empty:
+            with FileLock(file):
+                ConfigTypeMgr.append(df=new_logs, file=file)
+
+        self.mark_logs(file)
+
+    def load_logs(self, file, columns: list=None, filters: list=None):
+        """
+
+        :param file:
+        :param columns: only load these columns. See ConfigTypeMgr.load
+        :param filters: only load the rows matching the filters. See ConfigTypeMgr.load
+        :return:
+        :rtype:
+        """
+        logs_df = self.process_logs(file, columns=columns, filters=filters)
+        self.data_mgr.logs = logs_df
+        # Partially loaded logs can't be appended to the same file
+        if columns is None and filters is None:
+            self.mark_logs(file, records=len(logs_df))
+
+    def query_logs(self, columns: list=None, filters: list=None) -> pd.DataFrame:
+        """
+        Get the logs records matching the filters, without changing the logs.
+        Backends like SQLiteDataMgr answer from their indexes without loading all the logs.
+        :param columns: only get these columns. See ConfigTypeMgr.load
+        :param filters: only get the rows matching the filters. See ConfigTypeMgr.load
+        :rtype: pd.DataFrame
+        """
+        if hasattr(self.data_mgr, 'query'):
+            return self.data_mgr.query(columns=columns, filters=filters)
+        return ConfigTypeMgr.select(self.data_mgr.logs, columns=columns, filters=filters)
+
+    def top_logs(self, metric: str, k: int=10, mode: str='max', filters: list=None, columns: list=None) -> pd.DataFrame:
+        """
+        Get the k best records by metric, e.g. the leaderboard of a running sweep, without sorting the logs.
+        DataMgr keeps the ranking updated as records are logged, SQLiteDataMgr answers from its index
+        :param metric: the ranking key, e.g. val_acc
+        :param k: number of records
+        :param mode: max or min, the best value
+        :param filters: only rank the records matching all the filters. See ConfigTypeMgr.load
+        :param columns: only get these columns
+        :return: the k best records, best first
+        :rtype: pd.DataFrame
+        """
+        return self.data_mgr.top(metric, k=k, mode=mode, filters=filters, columns=columns)
+
+    def compact_logs(self, file: str, out_file: str=None):
+        """
+        Fold the incrementally saved logs into one file
+        :param file: logs file saved with save_logs(incremental=True)
+        :param out_file: compacted logs file. Default: overwrite file
+        """
+        ConfigTypeMgr.compact(file=file, out_file=out_file)
+        if out_file and os.path.abspath(file) in self.log_marks:
+            self.log_marks[os.path.abspath(out_file)] = self.log_marks[os.path.abspath(file)]
 
-    def save_logs(self, file: str):
-        ConfigTypeMgr.save(df=self.data_mgr.logs, file=file)
+    def mark_logs(self, file: str, records: int=None):
+        records = self.data_mgr.count() if records is None else records
+        self.log_marks[os.path.abspath(file)] = (self.data_mgr.resets, records, len(self.data_mgr.edits))
 
-    def load_logs(self, file):
-        self.data_mgr.logs = self.process_logs(file)
+    def is_marked(self, file: str) -> bool:
+        """
+        Check if file holds all the logs records before its watermark, so new records can be appended to it
+        """
+        mark = self.log_marks.get(os.path.abspath(file))
+        if not mark or not os.path.exists(file) or not ConfigTypeMgr.can_append(file):
+            return False
+        resets, records, edits = mark
+        if resets != self.data_mgr.resets:
+            return False
+        # Records edited after being saved need a full save
+        return all(edit >= records for edit in self.data_mgr.edits[edits:])
 
     def append_logs(self, logs):
-        self.data_mgr.append(self.process_logs(logs))
+        logs_df = self.process_logs(logs)
+        with self.lock:
+            self.data_mgr.append(logs_df)
 
     def add_config_attribs(self, attribs:dict):
-        self.data_mgr.edit_config(attribs)
+        with self.lock:
+            self.logged.update(key for key in attribs if key not in self.data_mgr.config.columns)
+            self.data_mgr.edit_config(attribs)
+
+    def param_keys(self) -> list:
+        """
+        Keys of the config record set with the config, without the ones logged by the runs, see add_config_attribs.
+        The config values a run depends on, e.g. to key the loaded models or the cached data
+        :rtype: list
+        """
+        logged = self.logged
+        return [key for key in self.config if key not in logged]
 
     @property
-    def config(self)->pd.Series:
-        return self.data_mgr.config.iloc[-1]
+    def config(self) -> ConfigView:
+        """
+        The current config record, cached until the config is set or edited
+        :rtype: ConfigView
+        """
+        config_df = self.data_mgr.config
+        # set and edit_config replace the config DataFrame, so it keys the cached view
+        if getattr(self, 'view_df', None) is not config_df:
+            records = config_df.iloc[-1:].to_dict('records')
+            self.view = ConfigView(records[0] if records else None)
+            self.view_df = config_df
+        return self.view
 
     @config.setter
     def config(self, config):
@@ -198,11 +855,16 @@ class Configuration:
         :return:
         :rtype:
         """
-        self.data_mgr.config = self.process_config(config)
+        config_df = self.process_config(config)
+        with self.lock:
+            self.data_mgr.config = config_df
+            self.logged = set()
 
     @property
     def logs(self)->pd.DataFrame:
-        return self.data_mgr.logs
+        # Reading flushes the pending records
+        with self.lock:
+            return self.data_mgr.logs
 
     @logs.setter
     def logs(self, logs):
@@ -213,7 +875,9 @@ class Configuration:
         :return:
         :rtype:
         """
-        self.data_mgr.logs = self.process_logs(logs)
+        logs_df = self.process_logs(logs)
+        with self.lock:
+            self.data_mgr.logs = logs_df
 
     def process_config(self, config) -> pd.DataFrame:
         """
@@ -238,20 +902,28 @@ class Configuration:
 
         return config_df
 
-    def process_logs(self, logs) -> pd.DataFrame:
+    def process_logs(self, logs, columns: list=None, filters: list=None) -> pd.DataFrame:
         """
 
         :param logs:
         :type logs: pd.DataFrame, dict, file
+        :param columns: only keep these columns. See ConfigTypeMgr.load
+        :type columns: list
+        :param filters: only keep the rows matching the filters. See ConfigTypeMgr.load
+        :type filters: list
         :return:
         :rtype:
         """
         if isinstance(logs, pd.DataFrame):
-            logs_df = logs
+            logs_df = ConfigTypeMgr.select(logs, columns=columns, filters=filters)
+        elif isinstance(logs, str) and FileLock.is_shared(logs):
+            # Other processes append to it in place
+            with FileLock(logs, shared=True):
+                logs_df = ConfigTypeMgr.load(file=logs, columns=columns, filters=filters)
         elif isinstance(logs, str):
-            logs_df = ConfigTypeMgr.load(file=logs)
+            logs_df = ConfigTypeMgr.load(file=logs, columns=columns, filters=filters)
         elif isinstance(logs, dict):
-            logs_df = pd.DataFrame(logs)
+            logs_df = ConfigTypeMgr.select(pd.DataFrame(logs), columns=columns, filters=filters)
         else: # No records exist
             logs_df = pd.DataFrame()
             warnings.warn(UserWarning("No old runs records given or unsupported type. It's OK if this is the first record or you will add later using from_csv or from_df. Otherwise, old records they will be overwritten"))
@@ -276,4 +948,9 @@ class Configuration:
         config_df = df[config_cols]
         results_df = df[results_cols]
 
-        return meta_df, config_df, results_df
\ No newline at end of file
+        return meta_df, config_df, results_df
+
+
+from .compact import compact_frame, dense_frame, memory_usage
+from .leaderboard import Leaderboard
+from .sqlite_mgr import SQLiteDataMgr
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+
+def compact_frame(df: pd.DataFrame, sparse_density: float=0.5, category_ratio: float=0.5) -> pd.DataFrame:
+    """
+    Compact copy of a logs DataFrame, with the same values:
+    integers downcast, floats as float32 when no value changes, rarely set numeric columns sparse,
+    and repeated strings categorical
+    :param sparse_density: numeric columns with less than this share of values set are sparse
+    :param category_ratio: string columns with less unique values than this share of their values are categorical
+    :rtype: pd.DataFrame
+    """
+    if df.empty:
+        return df
+    columns = {}
+    for key in df.columns:
+        column = df[key]
+        if isinstance(column.dtype, (pd.SparseDtype, pd.CategoricalDtype)) or pd.api.types.is_bool_dtype(column):
+            pass
+        elif pd.api.types.is_integer_dtype(column):
+            column = pd.to_numeric(column, downcast='integer')
+        elif pd.api.types.is_float_dtype(column):
+            small = column.astype('float32')
+            if ((small == column) | column.isna()).all():
+                column = small
+            if column.notna().mean() < sparse_density:
+                column = column.astype(pd.SparseDtype(column.dtype, np.nan))
+        elif pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column):
+            values = column.dropna()
+            if len(values) and all(isinstance(value, str) for value in values) \
+                    and values.nunique() <= category_ratio * len(values):
+                column = column.astype('category')
+        columns[key] = column
+    return pd.DataFrame(columns, index=df.index)
+
+
+def dense_frame(df: pd.DataFrame, upcast: bool=False) -> pd.DataFrame:
+    """
+    Dense copy of a compact DataFrame: sparse columns densified and categorical ones back to their values type.
+    df itself if it has none
+    :param upcast: also cast the downcast numbers back to int64 and float64, e.g. to edit them with any value
+    :rtype: pd.DataFrame
+    """
+    keys = [key for key in df.columns if isinstance(df[key].dtype, (pd.SparseDtype, pd.CategoricalDtype))
+            or (upcast and (pd.api.types.is_integer_dtype(df[key]) or pd.api.types.is_float_dtype(df[key])))]
+    if not keys:
+        return df
+    df = df.copy(deep=False)
+    for key in keys:
+        if isinstance(df[key].dtype, pd.SparseDtype):
+            df[key] = df[key].sparse.to_dense()
+        elif isinstance(df[key].dtype, pd.CategoricalDtype):
+            df[key] = df[key].astype(df[key].cat.categories.dtype)
+        if upcast and pd.api.types.is_integer_dtype(df[key]) and not pd.api.types.is_bool_dtype(df[key]):
+            df[key] = df[key].astype('int64')
+        elif upcast and pd.api.types.is_float_dtype(df[key]):
+            df[key] = df[key].astype('float64')
+    return df
+
+
+def memory_usage(df: pd.DataFrame) -> int:
+    """
+    Bytes used by df, including its strings
+    """
+    return int(df.memory_usage(deep=True).sum())
@@ -0,0 +1,90 @@
+from __future__ import annotations
+import bisect
+import math
+import numbers
+import operator
+
+
+class Leaderboard:
+    '''
+    Records of the logs ranked by a metric, kept sorted as the records are logged and edited,
+    so the top runs are read from the start of the ranking instead of sorting the logs.
+
+    Only the records with a numeric metric are ranked. Ties keep the logging order.
+    '''
+    ops = {'==': operator.eq,
+           '=': operator.eq,
+           '!=': operator.ne,
+           '<': operator.lt,
+           '<=': operator.le,
+           '>': operator.gt,
+           '>=': operator.ge,
+           'in': lambda value, values: value in values,
+           'not in': lambda value, values: value not in values}
+
+    def __init__(self, metric: str, mode: str='max'):
+        """
+
+        :param metric: the ranking key, e.g. val_acc
+        :param mode: max or min, the best value
+        """
+        assert mode in ['max', 'min'], 'mode must be max or min'
+        self.metric = metric
+        self.mode = mode
+        self.ranking = []  # Sorted (rank key, position)
+        self.records = {}  # position -> record, for the ranked records
+        self.last = None  # (position, record) of the last logged record, updated by edit_last
+
+    def add(self, position: int, record: dict):
+        """
+        Rank the record logged at position, replacing the one ranked at the same position if any
+        """
+        self.remove(position)
+        if self.last is None or position >= self.last[0]:
+            self.last = (position, record)
+        value = record.get(self.metric)
+        if not isinstance(value, numbers.Number) or isinstance(value, bool) or math.isnan(value):
+            return
+        bisect.insort(self.ranking, (-value if self.mode == 'max' else value, position))
+        self.records[position] = record
+
+    def edit_last(self, attribs: dict):
+        """
+        Update the last logged record with attribs, e.g. the metrics added to the config record
+        """
+        if self.last is None:
+            return
+        position, record = self.last
+        self.add(position, {**record, **attribs})
+
+    def remove(self, position: int):
+        record = self.records.pop(position, None)
+        if record is None:
+            return
+        value = record[self.metric]
+        del self.ranking[bisect.bisect_left(self.ranking, (-value if self.mode == 'max' else value, position))]
+
+    def top(self, k: int=10, filters: list=None) -> list:
+        """
+        :param k: number of records
+        :param filters: [(key, op, value), ...], see ConfigTypeMgr.load. Records missing the key don't match
+        :return: the k best records matching the filters, best first, as (position, record)
+        :rtype: list
+        """
+        top = []
+        for _, position in self.ranking:
+            record = self.records[position]
+            if all(self.match(record, key, op, value) for key, op, value in filters or []):
+                top.append((position, record))
+                if len(top) == k:
+                    break
+        return top
+
+    def match(self, record: dict, key: str, op: str, value) -> bool:
+        if key not in record:
+            return False
+        try:
+            return bool(self.ops[op](record[key], value))
+        except TypeError:
+            # e.g. a string compared to a number
+            return False
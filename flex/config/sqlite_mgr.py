@@ -0,0 +1,260 @@
+from __future__ import annotations
+import sqlite3
+import threading
+import time
+import numbers
+from contextlib import contextmanager
+
+from ..lazy import LazyModule
+from . import DataMgr
+
+pd = LazyModule('pandas')
+
+
+class SQLiteDataMgr(DataMgr):
+    '''
+    DataMgr backend that keeps the logs in a local SQLite database instead of memory.
+
+    Config keys change between runs, so records are stored as entity-attribute-value rows:
+    runs(id, created) and attribs(run_id, key, value), with an index on (key, value).
+    This way logs can be queried by name, tag or metric range without loading the whole history,
+    and many processes can log to the same database (WAL mode, writes serialized by SQLite).
+    Each thread uses its own connection.
+
+    The config is kept in memory as in DataMgr. Its record is the last run added by this DataMgr,
+    which is the one updated by edit_config, even if other processes logged runs after it.
+    The database is shared with the other writers, so setting the logs adds them to the runs instead of overwriting them.
+    '''
+    sql_ops = {'==': '=', '=': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>=',
+               'in': 'IN', 'not in': 'NOT IN'}
+
+    def __init__(self, file: str, logs:pd.DataFrame=None, config:pd.DataFrame=None, timeout: float=60):
+        self.file = file
+        self.timeout = timeout
+        self.local = threading.local()  # conn of each thread
+        self.run_id = None  # Id of the config record
+        self.create()
+        super().__init__(logs=logs, config=config)
+
+    def __getstate__(self):
+        # Connections can't be pickled, each process opens its own
+        state = self.__dict__.copy()
+        del state['local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # Transactions are managed in transaction()
+            conn = self.local.conn = sqlite3.connect(self.file, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        # Take the write lock at the start, so concurrent writers wait for each other instead of failing
+        conn = self.connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def create(self):
+        with self.transaction() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY, pos INTEGER)')
+            conn.execute('CREATE TABLE IF NOT EXISTS attribs (run_id INTEGER, key TEXT, value, '
+                         'PRIMARY KEY (run_id, key))')
+            conn.execute('CREATE INDEX IF NOT EXISTS attribs_key_value ON attribs (key, value)')
+
+    @property
+    def config(self):
+        return self.config_df
+
+    @config.setter
+    def config(self, config_df: pd.DataFrame):
+        # Overwrite config_df
+        self.config_df = config_df
+        # Add to logs
+        self.run_id = self.append(config_df)
+
+    @property
+    def logs(self)->pd.DataFrame:
+        return self.query()
+
+    @logs.setter
+    def logs(self, df:pd.DataFrame):
+        # The runs of the other writers are kept: df is added to the runs, and the config record moved after it,
+        # as in DataMgr, in one transaction
+        with self.transaction() as conn:
+            if self.run_id is not None:
+                conn.execute('DELETE FROM attribs WHERE run_id = ?', (self.run_id,))
+                conn.execute('DELETE FROM runs WHERE id = ?', (self.run_id,))
+            self.add(conn, df)
+            self.run_id = self.add(conn, self.config)
+        self.resets += 1
+        # The runs before the config record are the loaded ones
+        self.loaded = self.position(self.run_id) if self.run_id is not None else self.count()
+
+    def append(self, df:pd.DataFrame) -> int:
+        """
+        Add the records of df as new runs, in one transaction
+        :return: id of the last added run
+        :rtype: int
+        """
+        with self.transaction() as conn:
+            return self.add(conn, df)
+
+    def add(self, conn: sqlite3.Connection, df: pd.DataFrame) -> int:
+        run_id = None
+        conn.executemany('INSERT OR IGNORE INTO keys (key, pos) VALUES (?, (SELECT COUNT(*) FROM keys))',
+                         [(str(key),) for key in df.columns])
+        for record in df.to_dict(orient='records'):
+            run_id = conn.execute('INSERT INTO runs (created) VALUES (?)', (time.time(),)).lastrowid
+            self.insert(conn, run_id, record)
+        return run_id
+
+    def insert(self, conn: sqlite3.Connection, run_id: int, record: dict):
+        conn.executemany('INSERT OR REPLACE INTO attribs (run_id, key, value) VALUES (?, ?, ?)',
+                         [(run_id, str(key), self.to_sql(value)) for key, value in record.items()
+                          if not self.is_missing(value)])
+
+    def flush(self):
+        pass
+
+    def edit_config(self, attribs:dict):
+
+        attrib_df = pd.DataFrame(attribs, index=[0])
+
+        # Merge in config. It will add new entries, and overwrite the existing ones in place.
+        self.config_df = self.merge_config(self.config_df, attrib_df)
+
+        self.edits.append(self.position(self.run_id))
+
+        # Update the config record
+        with self.transaction() as conn:
+            conn.executemany('INSERT OR IGNORE INTO keys (key, pos) VALUES (?, (SELECT COUNT(*) FROM keys))',
+                             [(str(key),) for key in attrib_df.columns])
+            self.insert(conn, self.run_id, attrib_df.iloc[-1].to_dict())
+
+    def count(self) -> int:
+        return self.connect().execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+    def position(self, run_id: int) -> int:
+        return self.connect().execute('SELECT COUNT(*) FROM runs WHERE id < ?', (run_id,)).fetchone()[0]
+
+    def tail(self, start: int) -> pd.DataFrame:
+        runs = 'SELECT id FROM runs ORDER BY id LIMIT -1 OFFSET ?'
+        records = self.records(runs, [start])
+        records.index = range(start, start + len(records))
+        return records
+
+    def query(self, columns: list=None, filters: list=None) -> pd.DataFrame:
+        """
+        Get the runs matching all the filters, using the (key, value) index
+        :param columns: only get these columns
+        :type columns: list
+        :param filters: [(key, op, value), ...], op is one of ==, =, !=, <, <=, >, >=, in, not in.
+        e.g. [('name', '==', 'exp1')], [('tag', 'in', ['sweep1', 'sweep2'])] or [('val_acc', '>=', 0.9)]
+        :type filters: list
+        :return: the matching runs, in logging order
+        :rtype: pd.DataFrame
+        """
+        runs, params = self.select(filters)
+        records = self.records(runs + ' ORDER BY id', params, columns=columns)
+        if columns is not None:
+            records = records.reindex(columns=[col for col in columns if col in records.columns])
+        return records
+
+    def top(self, metric: str, k: int=10, mode: str='max', filters: list=None, columns: list=None) -> pd.DataFrame:
+        """
+        The best runs by metric, read in order from the (key, value) index. See DataMgr.top
+        :return: the k best runs, best first
+        :rtype: pd.DataFrame
+        """
+        assert mode in ['max', 'min'], 'mode must be max or min'
+        runs, params = self.select(filters)
+        sql = "SELECT run_id FROM attribs WHERE key = ? AND typeof(value) IN ('integer', 'real') " \
+              "AND run_id IN ({}) ORDER BY value {}, run_id LIMIT ?".format(runs, 'DESC' if mode == 'max' else 'ASC')
+        ids = [row[0] for row in self.connect().execute(sql, [metric] + params + [k])]
+
+        records = self.records('SELECT id FROM runs WHERE id IN ({})'.format(', '.join('?' * len(ids))), ids,
+                               columns=columns)
+        # records are in logging order
+        records.index = sorted(ids)
+        records = records.reindex(ids).reset_index(drop=True)
+        if columns is not None:
+            records = records.reindex(columns=[col for col in columns if col in records.columns])
+        return records
+
+    def select(self, filters: list=None) -> tuple:
+        """
+        :return: the query of the ids of the runs matching all the filters, and its params
+        :rtype: tuple
+        """
+        runs = 'SELECT id FROM runs'
+        params = []
+        conditions = []
+        for key, op, value in filters or []:
+            if op in ['in', 'not in']:
+                values = [self.to_sql(v) for v in value]
+                condition = 'value {} ({})'.format(self.sql_ops[op], ', '.join('?' * len(values)))
+            else:
+                values = [self.to_sql(value)]
+                condition = 'value {} ?'.format(self.sql_ops[op])
+                # SQLite orders the numbers before the strings, so a range only matches values of the same type
+                if op in ['<', '<=', '>', '>=']:
+                    if isinstance(values[0], numbers.Number):
+                        condition += " AND typeof(value) IN ('integer', 'real')"
+                    elif isinstance(values[0], str):
+                        condition += " AND typeof(value) = 'text'"
+            conditions.append('id IN (SELECT run_id FROM attribs WHERE key = ? AND {})'.format(condition))
+            params += [key] + values
+        if conditions:
+            runs += ' WHERE ' + ' AND '.join(conditions)
+        return runs, params
+
+    def records(self, runs: str, params: list, columns: list=None) -> pd.DataFrame:
+        """
+        Pivot the attribs of the runs selected by the runs query into a logs DataFrame
+        """
+        sql = 'SELECT a.run_id, a.key, a.value FROM attribs a JOIN keys k ON a.key = k.key ' \
+              'WHERE a.run_id IN ({})'.format(runs)
+        key_params = []
+        if columns is not None:
+            sql += ' AND a.key IN ({})'.format(', '.join('?' * len(columns)))
+            key_params = [str(col) for col in columns]
+
+        conn = self.connect()
+        # Runs without any of the columns are kept as empty records
+        records = {row[0]: {} for row in conn.execute(runs, params)}
+        for run_id, key, value in conn.execute(sql + ' ORDER BY a.run_id, k.pos', list(params) + key_params):
+            # Runs might be added by other processes between both queries
+            records.setdefault(run_id, {})[key] = value
+
+        keys = [row[0] for row in conn.execute('SELECT key FROM keys ORDER BY pos')]
+        df = pd.DataFrame.from_records([records[run_id] for run_id in sorted(records)])
+        return df.reindex(columns=[key for key in keys if key in df.columns])
+
+    @staticmethod
+    def to_sql(value):
+        # numpy scalars to python types, anything else not supported by sqlite to str
+        if hasattr(value, 'item'):
+            value = value.item()
+        if value is None or isinstance(value, (str, numbers.Number, bytes)):
+            return value
+        return str(value)
+
+    @staticmethod
+    def is_missing(value) -> bool:
+        try:
+            return bool(pd.isna(value))
+        except (TypeError, ValueError):
+            return False
@@ -1,6 +1,11 @@
+from __future__ import annotations
 from abc import ABCMeta, abstractmethod
 from ..config import Configuration
-import numpy as np
+from ..lazy import LazyModule
+import functools
+
+asyncio = LazyModule('asyncio')
+np = LazyModule('numpy')
 
 class RawData:
     def __init__(self, x:list, y:list):
@@ -8,6 +13,12 @@ class RawData:
         self.y = y
         assert len(x) == len(y)
 
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, index):
+        return RawData(x=self.x[index], y=self.y[index])
+
 
 class Data:
     def __init__(self, x: np.ndarray, y: np.ndarray):
@@ -15,8 +26,60 @@ class Data:
         self.y = y
         assert len(x) == len(y)
 
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, index):
+        # Slices of arrays are views, not copies
+        return Data(x=self.x[index], y=self.y[index])
+
+    def batches(self, batch_size: int):
+        """
+        Iterate over consecutive batches, as slices of the data
+        :param batch_size: number of samples per batch
+        :return: generator of Data
+        """
+        for start in range(0, len(self), batch_size):
+            yield self[start:start + batch_size]
+
+
+class DataView(Data):
+    '''
+    Samples of a Data selected by an index, without copying them, e.g. the train and test folds of a Data.
+    x and y gather the selected samples when accessed, batches gather only the samples of each batch.
+    '''
+    def __init__(self, data: Data, index):
+        """
+
+        :param data: the shared data
+        :type data: Data
+        :param index: positions of the samples in data
+        :type index: np.ndarray, list
+        """
+        self.data = data
+        self.index = np.asarray(index, dtype=np.intp)
+
+    @property
+    def x(self):
+        return self.data.x[self.index]
+
+    @property
+    def y(self):
+        return self.data.y[self.index]
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, index):
+        # View on the same shared data
+        return DataView(self.data, self.index[index])
+
 
 class BaseDataLoader(metaclass=ABCMeta):
+    # Config keys the loaded data depends on, used to key the DataCache.
+    # None: the whole config, without the keys logged by the runs, see Configuration.param_keys
+    config_keys = None
+
     def __init__(self, config: Configuration):
         self.config = config
 
@@ -25,11 +88,55 @@ class BaseDataLoader(metaclass=ABCMeta):
 
         pass
 
+    async def aload_data(self, *args, **kwargs) -> RawData:
+        """
+        Async load_data. By default, load_data runs in the default executor of the event loop.
+        Override it with a native async implementation for loaders fetching from object stores or databases.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.load_data, *args, **kwargs))
+
+    def load_chunks(self, chunk_size: int, *args, **kwargs):
+        """
+        Load the data chunk by chunk, for streaming runs.
+        By default, all the data is loaded then split. Override it to read only one chunk at a time.
+        :param chunk_size: number of samples per chunk
+        :return: generator of RawData
+        """
+        raw_data = self.load_data(*args, **kwargs)
+        for start in range(0, len(raw_data), chunk_size):
+            yield raw_data[start:start + chunk_size]
+
 
 class BaseDataPreprocessor(metaclass=ABCMeta):
+    # Config keys the preprocessed data depends on, used to key the DataCache.
+    # None: the whole config, without the keys logged by the runs, see Configuration.param_keys
+    config_keys = None
+
     def __init__(self, config: Configuration):
         self.config = config
 
     @abstractmethod
     def preprocess_data(self, data: RawData, *args, **kwargs) -> Data:
         pass
+
+    async def apreprocess_data(self, data: RawData, *args, **kwargs) -> Data:
+        """
+        Async preprocess_data. By default, preprocess_data runs in the default executor of the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.preprocess_data, data, *args, **kwargs))
+
+    def preprocess_chunks(self, chunks, *args, **kwargs):
+        """
+        Preprocess the chunks one at a time, for streaming runs.
+        Override it if preprocessing needs state across chunks.
+        :param chunks: iterable of RawData
+        :return: generator of Data
+        """
+        for chunk in chunks:
+            yield self.preprocess_data(chunk, *args, **kwargs)
+
+
+from .memmap import MemmapData
+from .cache import DataCache
@@ -0,0 +1,115 @@
+from __future__ import annotations
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import uuid
+
+from ..lazy import LazyModule
+from . import Data, BaseDataLoader, BaseDataPreprocessor
+
+np = LazyModule('numpy')
+
+
+class DataCache:
+    '''
+    On disk cache of the preprocessed Data, so runs with the same data config don't load and preprocess it again.
+
+    Entries are keyed by a hash of the loader and preprocessor classes (name and source code) and of the config
+    keys they depend on, declared in their config_keys (None means the whole config, without the keys logged by the runs,
+    see Configuration.param_keys).
+    Data.x and Data.y are stored as .npy files and memory mapped on a hit, so they are not copied into memory.
+    When the cache grows above max_size bytes, the least recently used entries are removed.
+    '''
+    def __init__(self, path: str, max_size: int=10 * 2 ** 30):
+        """
+
+        :param path: cache directory
+        :type path: str
+        :param max_size: max total size of the entries in bytes. Default: 10 GB
+        :type max_size: int
+        """
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(path, exist_ok=True)
+
+    def load(self, loader: BaseDataLoader, preprocessor: BaseDataPreprocessor) -> Data:
+        """
+        Get the preprocessed data from the cache, or load and preprocess it then add it to the cache
+        """
+        key = self.key(loader, preprocessor)
+        data = self.get(key)
+        if data is None:
+            raw_data = loader.load_data()
+            data = preprocessor.preprocess_data(raw_data)
+            self.put(key, data)
+        return data
+
+    def key(self, *plugins) -> str:
+        """
+        Hash of the plugins classes and of the config values they depend on
+        """
+        key = []
+        for plugin in plugins:
+            cls = type(plugin)
+            try:
+                source = inspect.getsource(cls)
+            except (OSError, TypeError):
+                source = None
+            config = plugin.config()
+            # Not the metrics and results logged in the config by the runs, they change on every run
+            keys = plugin.config_keys if plugin.config_keys is not None else plugin.config.param_keys()
+            key.append({'class': cls.__module__ + '.' + cls.__qualname__,
+                        'source': source,
+                        'config': {str(k): config.get(k) for k in keys}})
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key: str) -> Data:
+        entry = os.path.join(self.path, key)
+        if not os.path.isdir(entry):
+            return None
+
+        # Mark as recently used
+        os.utime(entry)
+        return Data(x=self.load_array(os.path.join(entry, 'x.npy')),
+                    y=self.load_array(os.path.join(entry, 'y.npy')))
+
+    def put(self, key: str, data: Data):
+        # Write in a temp dir then rename, so other processes never see a partial entry
+        tmp_entry = os.path.join(self.path, '.tmp-' + uuid.uuid4().hex)
+        os.makedirs(tmp_entry)
+        np.save(os.path.join(tmp_entry, 'x.npy'), np.asarray(data.x), allow_pickle=True)
+        np.save(os.path.join(tmp_entry, 'y.npy'), np.asarray(data.y), allow_pickle=True)
+        try:
+            os.rename(tmp_entry, os.path.join(self.path, key))
+        except OSError:  # Already added by another process
+            shutil.rmtree(tmp_entry)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in max_size
+        """
+        entries = []
+        for key in os.listdir(self.path):
+            entry = os.path.join(self.path, key)
+            if key.startswith('.tmp-') or not os.path.isdir(entry):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, file)) for file in os.listdir(entry))
+            entries.append((os.path.getmtime(entry), size, entry))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= size
+
+    @staticmethod
+    def load_array(file: str) -> np.ndarray:
+        try:
+            return np.load(file, mmap_mode='r')
+        except ValueError:  # Object arrays can't be memory mapped
+            return np.load(file, allow_pickle=True)
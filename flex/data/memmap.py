@@ -0,0 +1,103 @@
+from __future__ import annotations
+import io
+import os
+import struct
+
+from ..lazy import LazyModule
+from . import Data
+
+np = LazyModule('numpy')
+
+
+class MemmapData(Data):
+    '''
+    Data kept on disk in x.npy and y.npy files, and memory mapped, for datasets larger than RAM.
+
+    x and y are np.memmap arrays, so learners and models use them as any other Data, and only the accessed
+    slices are read from disk. Slicing and batches give Data views on the same files.
+    '''
+    # Header size reserved by from_chunks, before the final shape is known
+    header_size = 128
+
+    def __init__(self, path: str, mode: str='r'):
+        """
+
+        :param path: directory with x.npy and y.npy
+        :type path: str
+        :param mode: memory map mode. r: read only, r+: read and write, c: copy on write
+        :type mode: str
+        """
+        self.path = path
+        super().__init__(x=np.load(os.path.join(path, 'x.npy'), mmap_mode=mode),
+                         y=np.load(os.path.join(path, 'y.npy'), mmap_mode=mode))
+
+    @classmethod
+    def create(cls, path: str, length: int, x_shape: tuple=(), y_shape: tuple=(),
+               x_dtype='float32', y_dtype='float32') -> 'MemmapData':
+        """
+        Create empty x and y files of a known length, to be filled in place
+        :param path: directory of the files
+        :param length: number of samples
+        :param x_shape: shape of one x sample
+        :param y_shape: shape of one y sample
+        :return: writable MemmapData
+        :rtype: MemmapData
+        """
+        os.makedirs(path, exist_ok=True)
+        for name, shape, dtype in [('x', x_shape, x_dtype), ('y', y_shape, y_dtype)]:
+            array = np.lib.format.open_memmap(os.path.join(path, name + '.npy'), mode='w+', dtype=dtype,
+                                              shape=(length,) + tuple(shape))
+            array.flush()
+            del array
+        return cls(path, mode='r+')
+
+    @classmethod
+    def from_chunks(cls, path: str, chunks) -> 'MemmapData':
+        """
+        Write the chunks one after the other, without holding more than one chunk in memory
+        :param path: directory of the files
+        :param chunks: iterable of Data with the same sample shapes and dtypes
+        :return: read only MemmapData of all the chunks
+        :rtype: MemmapData
+        """
+        os.makedirs(path, exist_ok=True)
+        files = {}
+        length = 0
+        try:
+            for chunk in chunks:
+                for name, array in [('x', np.asarray(chunk.x)), ('y', np.asarray(chunk.y))]:
+                    if name not in files:
+                        files[name] = (open(os.path.join(path, name + '.npy'), 'wb'), array.dtype, array.shape[1:])
+                        # The shape is written when all the chunks are known
+                        files[name][0].write(b'\0' * cls.header_size)
+                    file, dtype, shape = files[name]
+                    assert array.dtype == dtype and array.shape[1:] == shape, 'Chunks must have the same shapes and dtypes'
+                    file.write(np.ascontiguousarray(array).tobytes())
+                length += len(chunk)
+
+            for name in ['x', 'y']:
+                if name not in files:  # No chunks
+                    np.save(os.path.join(path, name + '.npy'), np.empty((0,)))
+                    continue
+                file, dtype, shape = files[name]
+                file.seek(0)
+                file.write(cls.npy_header(dtype, (length,) + shape))
+        finally:
+            for file, _, _ in files.values():
+                file.close()
+
+        return cls(path)
+
+    @classmethod
+    def npy_header(cls, dtype, shape: tuple) -> bytes:
+        """
+        .npy header padded to header_size
+        """
+        buffer = io.BytesIO()
+        np.lib.format.write_array_header_1_0(buffer, {'descr': np.lib.format.dtype_to_descr(dtype),
+                                                      'fortran_order': False,
+                                                      'shape': shape})
+        header = buffer.getvalue()
+        assert len(header) <= cls.header_size, 'Shape too long for the reserved header'
+        # magic and version, header length, then the header dict padded with spaces and ending with a new line
+        return header[:8] + struct.pack('<H', cls.header_size - 10) + header[10:-1].ljust(cls.header_size - 11) + b'\n'
@@ -0,0 +1,15 @@
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    '''
+    Module imported on the first access to one of its attributes, e.g. pd = LazyModule('pandas'),
+    so the heavy dependencies are imported when they are used, not when flex is imported.
+    '''
+    def __getattr__(self, attr):
+        # Called only for the attributes missing from __dict__: copy the module's attributes on the
+        # first access, so the later ones are plain lookups
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
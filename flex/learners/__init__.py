@@ -1,10 +1,40 @@
+from __future__ import annotations
 from abc import ABCMeta, abstractmethod
 
 from ..data import Data
 from ..models import BaseModel
 from ..config import Configuration
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+
+
+def config_value(config, key: str, default=None):
+    """
+    Value of key in the config record, default if missing or NaN, e.g. in a record of logs without the key
+    """
+    value = config.get(key)
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return default
+    return value
+
+
+class TrialPruned(Exception):
+    '''
+    Raised by BaseLearner.report when the sweep scheduler stops the trial
+    '''
+    def __init__(self, step: int, metrics: dict):
+        super().__init__('Trial pruned at step ' + str(step))
+        self.step = step
+        self.metrics = metrics
+
 
 class BaseLearner(metaclass=ABCMeta):
+    # True if train and test release the GIL, e.g. in numpy or torch, so the cross validation folds run on threads, not processes
+    releases_gil = False
+    # Set by the Sweep on the learner of each trial, see report
+    scheduler = None
+    trial = None
 
     def __init__(self, config: Configuration):
         self.config = config
@@ -15,4 +45,47 @@ class BaseLearner(metaclass=ABCMeta):
 
     @abstractmethod
     def test(self, model: BaseModel, test_data: Data, *args, **kwargs):
-        pass
\ No newline at end of file
+        pass
+
+    def report(self, step: int, metrics: dict):
+        """
+        Report intermediate metrics during train, e.g. after each epoch, to the scheduler of the sweep running the trial.
+        Raises TrialPruned if the scheduler stops the trial, to end train; don't catch it.
+        Does nothing out of a sweep with a scheduler
+        :param step: e.g. the epoch
+        :param metrics: e.g. {'val_loss': 0.3}
+        """
+        if self.scheduler is not None and self.scheduler.report(self.trial, step, metrics):
+            raise TrialPruned(step, metrics)
+
+    def split(self, data: Data):
+        """
+        Split the data in train and test, from the config test_size (fraction of the samples, default 0.2,
+        0: test on the train data), shuffle (default True) and seed.
+        Override it for custom splits, e.g. by time
+        :return: train index, test index
+        :rtype: tuple of np.ndarray
+        """
+        test_size = config_value(self.config(), 'test_size', 0.2)
+        index = self.shuffle(len(data))
+        if not test_size:
+            return index, index
+        test_len = max(int(round(len(data) * test_size)), 1)
+        return index[test_len:], index[:test_len]
+
+    def folds(self, data: Data, k: int):
+        """
+        Split the data in k folds for cross validation, each sample is in one test fold, with the config shuffle and seed
+        :param k: number of folds
+        :return: generator of k (train index, test index)
+        """
+        folds = np.array_split(self.shuffle(len(data)), k)
+        for i in range(k):
+            yield np.concatenate(folds[:i] + folds[i + 1:]), folds[i]
+
+    def shuffle(self, length: int) -> np.ndarray:
+        config = self.config()
+        if not config_value(config, 'shuffle', True):
+            return np.arange(length)
+        seed = config_value(config, 'seed')
+        return np.random.default_rng(None if seed is None else int(seed)).permutation(length)
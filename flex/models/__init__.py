@@ -1,7 +1,16 @@
 from abc import ABCMeta, abstractmethod
 from ..config import Configuration
+from ..lazy import LazyModule
+import copy
+import functools
+
+asyncio = LazyModule('asyncio')
 
 class BaseModel(metaclass=ABCMeta):
+    # Config keys the loaded model depends on, besides model_file, used to key the ModelPool.
+    # None: the whole config, without the keys logged by the runs, see Configuration.param_keys
+    config_keys = None
+
     def __init__(self, config: Configuration):
         self.config = config
 
@@ -20,3 +29,42 @@ class BaseModel(metaclass=ABCMeta):
     @abstractmethod
     def predict(self, data, *args, **kwargs):
         pass
+
+    def copy(self, config: Configuration):
+        """
+        Independent copy of this loaded model, using config. See ModelPool.copy
+        By default, a deep copy. Override it for models that can't be deep copied, or copy faster
+        :return: the copy
+        :rtype: BaseModel
+        """
+        return copy.deepcopy(self, {id(self.config): config})
+
+    async def aload(self, *args, **kwargs):
+        """
+        Async load. By default, load runs in the default executor of the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.load, *args, **kwargs))
+
+    async def apredict(self, data, *args, **kwargs):
+        """
+        Async predict. By default, predict runs in the default executor of the event loop.
+        Override it with a native async implementation for models served remotely.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.predict, data, *args, **kwargs))
+
+    def predict_batches(self, chunks, batch_size: int=None, *args, **kwargs):
+        """
+        Predict chunk by chunk in fixed size batches, for streaming runs
+        :param chunks: iterable of Data
+        :param batch_size: number of samples per predict call. Default: one call per chunk
+        :return: generator of predict results, one per batch
+        """
+        for chunk in chunks:
+            for batch in chunk.batches(batch_size) if batch_size else [chunk]:
+                yield self.predict(batch, *args, **kwargs)
+
+
+from .pool import ModelPool
+from .artifacts import ArtifactStore
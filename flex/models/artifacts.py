@@ -0,0 +1,206 @@
+from __future__ import annotations
+import hashlib
+import importlib
+import json
+import os
+import uuid
+import zlib
+
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+
+
+def compressor(codec: str):
+    """
+    :return: compress and decompress functions of the codec
+    """
+    if codec == 'zstd':
+        zstd = importlib.import_module('zstandard')
+        return zstd.ZstdCompressor(level=3).compress, zstd.ZstdDecompressor().decompress
+    if codec == 'lz4':
+        lz4 = importlib.import_module('lz4.frame')
+        return lz4.compress, lz4.decompress
+    if codec == 'zlib':
+        return (lambda data: zlib.compress(data, 1)), zlib.decompress
+    if codec == 'none':
+        return bytes, bytes
+    raise ValueError('Unknown codec ' + str(codec))
+
+
+def available_codec() -> str:
+    """
+    The fastest installed codec: zstd (zstandard), lz4, or zlib
+    """
+    for codec, module in [('zstd', 'zstandard'), ('lz4', 'lz4.frame')]:
+        try:
+            importlib.import_module(module)
+            return codec
+        except ImportError:
+            pass
+    return 'zlib'
+
+
+class ArtifactStore:
+    '''
+    Content addressed store of the saved models and other run artifacts, deduplicated across runs.
+
+    Files are split in content defined chunks: a boundary is where a rolling hash of the last window bytes matches
+    a mask, so an edit only changes the chunks around it, and the unchanged parts of the next saves are the same chunks.
+    Chunks are stored once by their sha256, compressed with zstd or lz4 if installed, else zlib.
+    put returns the artifact ID, to reference from the run config record, e.g. as model_artifact.
+    '''
+    codecs = ['none', 'zlib', 'lz4', 'zstd']
+    window = 48
+    # Bytes read at once when splitting a file
+    block_size = 2 ** 22
+
+    def __init__(self, path: str, codec: str=None, avg_chunk_size: int=2 ** 20,
+                 min_chunk_size: int=None, max_chunk_size: int=None):
+        """
+
+        :param path: store directory
+        :type path: str
+        :param codec: zstd, lz4, zlib or none. Default: the fastest installed
+        :type codec: str
+        :param avg_chunk_size: average chunk size in bytes, a power of 2
+        :type avg_chunk_size: int
+        :param min_chunk_size: Default: avg_chunk_size / 4
+        :param max_chunk_size: Default: avg_chunk_size * 4
+        """
+        assert avg_chunk_size & (avg_chunk_size - 1) == 0, 'avg_chunk_size must be a power of 2'
+        self.path = path
+        self.codec = codec if codec else available_codec()
+        # Fails early if the codec is not installed
+        compressor(self.codec)
+        self.mask = avg_chunk_size - 1
+        self.min_chunk_size = min_chunk_size if min_chunk_size else avg_chunk_size // 4
+        self.max_chunk_size = max_chunk_size if max_chunk_size else avg_chunk_size * 4
+        # Stats of the last put: bytes, chunks, new_bytes (before compression), new_chunks, stored_bytes
+        self.stats = {}
+        os.makedirs(os.path.join(path, 'chunks'), exist_ok=True)
+        os.makedirs(os.path.join(path, 'artifacts'), exist_ok=True)
+
+        # Random value per byte, summed over the window as rolling hash
+        self.gear = np.random.default_rng(0).integers(0, 2 ** 63, size=256, dtype=np.uint64)
+
+    def put(self, path: str) -> str:
+        """
+        Store a file or a directory
+        :return: the artifact ID
+        :rtype: str
+        """
+        self.stats = {'bytes': 0, 'chunks': 0, 'new_bytes': 0, 'new_chunks': 0, 'stored_bytes': 0}
+        if os.path.isdir(path):
+            files = {}
+            for root, _, names in os.walk(path):
+                for name in names:
+                    file = os.path.join(root, name)
+                    files[os.path.relpath(file, path).replace(os.sep, '/')] = self.put_file(file)
+            manifest = {'type': 'dir', 'files': files}
+        else:
+            manifest = {'type': 'file', 'chunks': self.put_file(path)}
+
+        content = json.dumps(manifest, sort_keys=True).encode()
+        artifact = hashlib.sha256(content).hexdigest()
+        file = os.path.join(self.path, 'artifacts', artifact + '.json')
+        if not os.path.exists(file):
+            self.write_file(file, content)
+        return artifact
+
+    def get(self, artifact: str, path: str):
+        """
+        Restore an artifact to path
+        """
+        with open(os.path.join(self.path, 'artifacts', artifact + '.json')) as f:
+            manifest = json.load(f)
+        if manifest['type'] == 'file':
+            self.get_file(manifest['chunks'], path)
+        else:
+            for name, chunks in manifest['files'].items():
+                self.get_file(chunks, os.path.join(path, *name.split('/')))
+
+    def put_file(self, file: str) -> list:
+        with open(file, 'rb') as f:
+            return [self.put_chunk(chunk) for chunk in self.split(f)]
+
+    def get_file(self, chunks: list, file: str):
+        if os.path.dirname(file):
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+        with open(file, 'wb') as f:
+            for chunk in chunks:
+                f.write(self.get_chunk(chunk))
+
+    def split(self, f):
+        """
+        Content defined chunks of the binary file f, read in blocks of block_size bytes,
+        so the memory used doesn't grow with the file size
+        """
+        window = self.window
+        buffer = bytearray()  # Data of the next chunks, not cut yet
+        tail = b''  # Last window bytes of the previous block, the rolling hash carries over the blocks
+        while True:
+            block = f.read(self.block_size)
+            if not block:
+                break
+            data = tail + block
+            # Offset of data in buffer, the ends of the chunks are offsets in buffer
+            offset = len(buffer) - len(tail)
+            buffer += block
+            tail = data[-window:]
+
+            candidates = []
+            if len(data) > window:
+                # Rolling hash: sum of the gear values of the last window bytes, wrapping around 2 ** 64
+                sums = np.cumsum(self.gear[np.frombuffer(data, dtype=np.uint8)], dtype=np.uint64)
+                hashes = sums[window:] - sums[:-window]
+                candidates = (np.flatnonzero((hashes & np.uint64(self.mask)) == 0) + offset + window + 1).tolist()
+
+            start = 0
+            for end in candidates:
+                while end - start > self.max_chunk_size:
+                    yield bytes(buffer[start:start + self.max_chunk_size])
+                    start += self.max_chunk_size
+                if end - start >= self.min_chunk_size:
+                    yield bytes(buffer[start:end])
+                    start = end
+            while len(buffer) - start > self.max_chunk_size:
+                yield bytes(buffer[start:start + self.max_chunk_size])
+                start += self.max_chunk_size
+            del buffer[:start]
+        if buffer:
+            yield bytes(buffer)
+
+    def put_chunk(self, data: bytes) -> str:
+        chunk = hashlib.sha256(data).hexdigest()
+        self.stats['bytes'] += len(data)
+        self.stats['chunks'] += 1
+
+        file = self.chunk_file(chunk)
+        if not os.path.exists(file):
+            # The codec id first, so chunks of stores with different codecs can be read
+            compress, _ = compressor(self.codec)
+            content = bytes([self.codecs.index(self.codec)]) + compress(data)
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            self.write_file(file, content)
+            self.stats['new_bytes'] += len(data)
+            self.stats['new_chunks'] += 1
+            self.stats['stored_bytes'] += len(content)
+        return chunk
+
+    def get_chunk(self, chunk: str) -> bytes:
+        with open(self.chunk_file(chunk), 'rb') as f:
+            content = f.read()
+        _, decompress = compressor(self.codecs[content[0]])
+        return decompress(content[1:])
+
+    def chunk_file(self, chunk: str) -> str:
+        return os.path.join(self.path, 'chunks', chunk[:2], chunk[2:])
+
+    @staticmethod
+    def write_file(path: str, content: bytes):
+        # Write in a temp file then rename, so other processes never see a partial chunk
+        tmp_path = path + '.' + uuid.uuid4().hex + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
@@ -0,0 +1,160 @@
+from contextlib import contextmanager
+import collections
+import hashlib
+import json
+import os
+import threading
+
+from . import BaseModel
+
+
+def rss() -> int:
+    """
+    Resident memory of this process in bytes, 0 if unknown
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+class ModelPool:
+    '''
+    Registry of loaded models, so runs reuse a loaded model instead of calling load() again.
+
+    Models are keyed by their class, model_file and the config keys they depend on
+    (config_keys, None: the whole config, without the keys logged by the runs, see Configuration.param_keys).
+    Up to replicas instances of the same model are loaded for parallel predict calls; more callers wait for a free one.
+    When the memory of the loaded models goes above max_memory bytes (measured as the RSS growth during load),
+    or there are more than max_models, the least recently used models without a replica in use are dropped.
+    '''
+    def __init__(self, replicas: int=1, max_memory: int=None, max_models: int=None):
+        """
+
+        :param replicas: max number of loaded instances per model
+        :type replicas: int
+        :param max_memory: memory budget of the loaded models in bytes. Default: no limit
+        :type max_memory: int
+        :param max_models: max number of different models. Default: no limit
+        :type max_models: int
+        """
+        self.replicas = replicas
+        self.max_memory = max_memory
+        self.max_models = max_models
+        # key -> {'free': [models], 'used': count, 'loaded': count, 'size': bytes}, least recently used first
+        self.models = collections.OrderedDict()
+        self.lock = threading.Condition()
+
+    @contextmanager
+    def acquire(self, model: BaseModel, keep: bool=True):
+        """
+        Get a loaded instance of model for the duration of the with block
+        :param model: the model to load, used as the first replica
+        :type model: BaseModel
+        :param keep: put the instance back in the pool after use. False if the caller changes it, e.g. trains it
+        :type keep: bool
+        :return: loaded model
+        :rtype: BaseModel
+        """
+        key = self.key(model)
+        instance = self.get(key, model)
+        try:
+            yield instance
+        finally:
+            self.release(key, instance, keep)
+
+    def take(self, model: BaseModel) -> BaseModel:
+        """
+        Get a loaded instance of model, and remove it from the pool, for callers changing it, e.g. training it
+        """
+        with self.acquire(model, keep=False) as instance:
+            return instance
+
+    def copy(self, model: BaseModel) -> BaseModel:
+        """
+        Get a copy of a loaded instance of model, for callers changing it, e.g. training it.
+        The loaded instance goes back to the pool, so the next callers copy it instead of loading the model again
+        :return: the copy, using the config of model. See BaseModel.copy
+        :rtype: BaseModel
+        """
+        with self.acquire(model) as instance:
+            return instance.copy(model.config)
+
+    def key(self, model: BaseModel) -> str:
+        config = model.config()
+        # Not the metrics and results logged in the config by the runs, they change on every run
+        keys = model.config_keys if model.config_keys is not None else model.config.param_keys()
+        key = {'class': type(model).__module__ + '.' + type(model).__qualname__,
+               'model_file': config.get('model_file'),
+               'config': {str(k): config.get(k) for k in keys}}
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key: str, model: BaseModel) -> BaseModel:
+        with self.lock:
+            while True:
+                entry = self.models.setdefault(key, {'free': [], 'used': 0, 'loaded': 0, 'size': 0})
+                self.models.move_to_end(key)
+                if entry['free']:
+                    entry['used'] += 1
+                    return entry['free'].pop()
+                if entry['loaded'] < self.replicas:
+                    # Reserve the replica, and load it without holding the lock
+                    entry['loaded'] += 1
+                    entry['used'] += 1
+                    first = entry['loaded'] == 1
+                    break
+                self.lock.wait()
+
+        instance = model if first else type(model)(model.config)
+        try:
+            start = rss()
+            instance.load()
+            size = max(rss() - start, 0)
+        except BaseException:
+            with self.lock:
+                entry['loaded'] -= 1
+                entry['used'] -= 1
+                self.lock.notify_all()
+            raise
+
+        with self.lock:
+            entry['size'] += size
+            self.evict()
+        return instance
+
+    def release(self, key: str, instance: BaseModel, keep: bool=True):
+        with self.lock:
+            entry = self.models[key]
+            entry['used'] -= 1
+            if keep:
+                entry['free'].append(instance)
+            else:
+                entry['loaded'] -= 1
+                entry['size'] -= entry['size'] // (entry['loaded'] + 1)
+                if not entry['loaded']:
+                    # No instance left, so not counted in max_models
+                    del self.models[key]
+            self.evict()
+            self.lock.notify_all()
+
+    def evict(self):
+        """
+        Drop the least recently used models, not in use, until the pool fits in the budget
+        """
+        for key in list(self.models):
+            if not self.over_budget():
+                break
+            entry = self.models[key]
+            if entry['used'] == 0:
+                del self.models[key]
+
+    def over_budget(self) -> bool:
+        if self.max_models is not None and len(self.models) > self.max_models:
+            return True
+        return self.max_memory is not None and sum(entry['size'] for entry in self.models.values()) > self.max_memory
+
+    def clear(self):
+        with self.lock:
+            for key in [key for key, entry in self.models.items() if entry['used'] == 0]:
+                del self.models[key]
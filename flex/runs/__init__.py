@@ -2,38 +2,266 @@ from ..data import BaseDataPreprocessor
 
 from ..config import Configuration
 from ..data import BaseDataLoader
+from ..data import Data
+from ..data import DataCache
+from ..data import DataView
+from ..lazy import LazyModule
 from ..learners import BaseLearner
+from ..learners import config_value
+from ..models import ArtifactStore
 from ..models import BaseModel
-
+from ..models import ModelPool
+from .checkpoint import Checkpoint
+from .cross_validation import cross_validate
+from .graph import Graph, Stage
+from .monitor import StageMonitor
+from .profiler import BaseProfiler, CProfiler, SamplingProfiler
+from .tracking import GitTracker
+
+from contextlib import contextmanager
+import importlib
 import os
-import subprocess
+import queue
+import threading
 import warnings
+
+asyncio = LazyModule('asyncio')
+subprocess = LazyModule('subprocess')
+
+
+def prefetch(iterable, queue_size: int=2):
+    """
+    Iterate over iterable in a background thread, keeping up to queue_size items ready in a bounded queue.
+    The thread blocks when the queue is full (backpressure), and stops when the returned generator is closed.
+    Exceptions raised in the thread are raised again by the generator.
+    :param iterable: stage to run in the background
+    :param queue_size: max number of items produced ahead of the consumer
+    :return: generator of the items of iterable
+    """
+    items = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    break
+            put((done, None))
+        except BaseException as e:
+            put((done, e))
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+
+
+def log_metrics(config: Configuration, monitor: StageMonitor, config_file: str=None):
+    """
+    Log the stages metrics of the monitor in the config record, with the profile of the run saved next to config_file
+    """
+    monitor.save_profile(os.path.dirname(config_file) if config_file else None)
+    if monitor.metrics and not config.data_mgr.config.empty:
+        config.add_config_attribs(monitor.metrics)
+
+
 class Application:
     def __init__(self,
                  loader: BaseDataLoader,
                  preprocessor: BaseDataPreprocessor,
                  model: BaseModel,
-                 config: Configuration):
+                 config: Configuration,
+                 cache: DataCache=None,
+                 pool: ModelPool=None,
+                 monitor: StageMonitor=None):
+        """
+
+        :param cache: get the preprocessed data from this cache
+        :param pool: get the loaded model from this pool
+        :param monitor: measures the run stages, logged in config. Default: StageMonitor()
+        """
         self.loader = loader
         self.preprocessor = preprocessor
         self.model = model
         self.config = config
+        self.cache = cache
+        self.pool = pool
+        self.monitor = monitor if monitor else StageMonitor()
 
     def run(self):
-        # Load data
-        raw_data = self.loader.load_data()
+        self.monitor.reset()
+
+        if self.cache:
+            # Load and preprocess data, or get it from the cache
+            with self.monitor.stage('load_data'):
+                data = self.cache.load(self.loader, self.preprocessor)
+        else:
+            # Load data
+            with self.monitor.stage('load_data'):
+                raw_data = self.loader.load_data()
+
+            # Preprocess data
+            with self.monitor.stage('preprocess_data'):
+                data = self.preprocessor.preprocess_data(raw_data)
+
+        if self.pool:
+            # Get the loaded model from the pool, and predict
+            key = self.pool.key(self.model)
+            with self.monitor.stage('load'):
+                model = self.pool.get(key, self.model)
+            try:
+                with self.monitor.stage('predict'):
+                    result = model.predict(data)
+            finally:
+                self.pool.release(key, model)
+        else:
+            # Load model
+            with self.monitor.stage('load'):
+                self.model.load()
+
+            # Predict
+            with self.monitor.stage('predict'):
+                result = self.model.predict(data)
+
+        log_metrics(self.config, self.monitor)
+
+        return result
+
+    def graph(self, cache_path: str=None, workers: int=None) -> Graph:
+        """
+        The stages of run as a Graph, to add or replace stages instead of overriding run.
+        Its outputs: raw_data, data, model and result. The model stages are not cached, see Graph
+        :param cache_path: directory of the cached data stages outputs
+        :param workers: max number of stages running in parallel
+        :rtype: Graph
+        """
+        def load():
+            self.model.load()
+            return self.model
+
+        def predict(model, data):
+            return model.predict(data)
+
+        graph = Graph(self.config, cache_path, workers, self.monitor)
+        graph.add('load_data', self.loader.load_data, outputs=['raw_data'], plugin=self.loader)
+        graph.add('preprocess_data', self.preprocessor.preprocess_data, inputs=['raw_data'], outputs=['data'],
+                  plugin=self.preprocessor)
+        graph.add('load', load, outputs=['model'], cache=False)
+        graph.add('predict', predict, inputs=['model', 'data'], outputs=['result'], cache=False)
+        return graph
 
-        # Preprocess data
-        data = self.preprocessor.preprocess_data(raw_data)
+    async def arun(self):
+        """
+        Same steps as run, on the event loop, so many runs can overlap their I/O in one process.
+        Sync plugins run in the default executor, see BaseDataLoader.aload_data and BaseModel.apredict
+        """
+        if self.cache:
+            # Load and preprocess data, or get it from the cache
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(None, self.cache.load, self.loader, self.preprocessor)
+        else:
+            # Load data
+            raw_data = await self.loader.aload_data()
+
+            # Preprocess data
+            data = await self.preprocessor.apreprocess_data(raw_data)
+
+        if self.pool:
+            # Get the loaded model from the pool, and predict. Waiting for a free replica blocks, so not on the loop
+            loop = asyncio.get_running_loop()
+            key = self.pool.key(self.model)
+            model = await loop.run_in_executor(None, self.pool.get, key, self.model)
+            try:
+                return await model.apredict(data)
+            finally:
+                self.pool.release(key, model)
 
         # Load model
-        self.model.load()
+        await self.model.aload()
 
         # Predict
-        result = self.model.predict(data)
+        result = await self.model.apredict(data)
 
         return result
 
+    def stream(self, chunk_size: int, batch_size: int=None, pipeline: bool=False, queue_size: int=2):
+        """
+        Run chunk by chunk: the loader yields chunks, the preprocessor transforms them one at a time,
+        and the model predicts them in fixed size batches, so memory is bounded by the chunk size, not the data size.
+        :param chunk_size: number of samples per loaded chunk
+        :type chunk_size: int
+        :param batch_size: number of samples per predict call. Default: one call per chunk
+        :type batch_size: int
+        :param pipeline: run loading and preprocessing in background threads, concurrently with predict.
+        Throughput is then bounded by the slowest stage instead of the sum of the stages.
+        :type pipeline: bool
+        :param queue_size: max number of chunks waiting between two pipelined stages
+        :type queue_size: int
+        :return: generator of the results, one per batch. Consume it to write them out incrementally
+        """
+        if self.pool:
+            # Get the loaded model from the pool for the whole stream
+            with self.pool.acquire(self.model) as model:
+                yield from self.predict_chunks(model, chunk_size, batch_size, pipeline, queue_size)
+            return
+
+        # Load model
+        self.model.load()
+
+        yield from self.predict_chunks(self.model, chunk_size, batch_size, pipeline, queue_size)
+
+    def predict_chunks(self, model: BaseModel, chunk_size: int, batch_size: int=None, pipeline: bool=False,
+                       queue_size: int=2):
+        """
+        Load, preprocess and predict with the loaded model lazily, one chunk at a time. See stream
+        """
+        raw_chunks = self.loader.load_chunks(chunk_size)
+        if pipeline:
+            raw_chunks = prefetch(raw_chunks, queue_size)
+        chunks = self.preprocessor.preprocess_chunks(raw_chunks)
+        if pipeline:
+            chunks = prefetch(chunks, queue_size)
+        yield from model.predict_batches(chunks, batch_size=batch_size)
+
+    def serve(self, host: str='127.0.0.1', port: int=8000, **batcher_args):
+        """
+        Serve the model on a local HTTP endpoint until interrupted. The model is loaded once,
+        and concurrent requests are grouped into micro batches. See ModelServer
+        :param host:
+        :param port:
+        :param batcher_args: max_batch_size, max_wait and stats_size, see MicroBatcher
+        """
+        from .serving import ModelServer
+
+        server = ModelServer(self, host=host, port=port, **batcher_args)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
 
 
 
@@ -43,42 +271,223 @@ class Experiment:
                  preprocessor: BaseDataPreprocessor=None,
                  model: BaseModel=None,
                  learner: BaseLearner=None,
-                 config: Configuration=None):
+                 config: Configuration=None,
+                 performance_file: str='../../runs/performance.csv',
+                 cache: DataCache=None,
+                 pool: ModelPool=None,
+                 monitor: StageMonitor=None,
+                 workers: int=None,
+                 checkpoint: Checkpoint=None,
+                 tracker: GitTracker=None,
+                 artifacts: ArtifactStore=None):
+        """
+
+        :param performance_file: the config is saved to it at the end of run. None: not saved
+        :param cache: get the preprocessed data from this cache
+        :param pool: get the loaded model to train from this pool, as a copy, see ModelPool.copy
+        :param monitor: measures the run stages, logged in config. Default: StageMonitor()
+        :param workers: number of parallel cross validation folds. Default: number of CPUs. 0: one after the other
+        :param checkpoint: record the completed stages, to resume a failed run. The model save and load must round trip
+        :param tracker: save_git commits with it in this process, instead of the git commands
+        :param artifacts: store the saved model_file in it, referenced by model_artifact in config, see save_model
+        """
         self.loader = loader
         self.preprocessor = preprocessor
         self.model = model
         self.learner = learner
         self.config = config
+        self.performance_file = performance_file
+        self.cache = cache
+        self.pool = pool
+        self.monitor = monitor if monitor else StageMonitor()
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self.run_id = None
+        self.tracker = tracker
+        self.artifacts = artifacts
+
+    def run(self, data: Data=None):
+        """
+        Train and test the model on a split of the data, see BaseLearner.split.
+        With the config folds, run a k-fold cross validation instead, see cross_validate.
+        With a checkpoint, the stages completed by a previous run of the same run ID are skipped.
 
-    def run(self):
-
-        # Load data
-        raw_data = self.loader.load_data()
-
-        # Preprocess data
-        data = self.preprocessor.preprocess_data(raw_data)
-
-        # TODO: Add to learner train, test split
-        train_data = data
-        test_data = data
+        :param data: already preprocessed data. Default: load and preprocess it
+        :type data: Data
+        :return:
+        :rtype:
+        """
 
-        # Build model
-        if self.config().model_file:
-            self.model.load()
+        self.monitor.reset()
+
+        # The run ID is kept until the run completes, so a retry in this process resumes it,
+        # even if the failed run added metrics to the config
+        if self.checkpoint and not self.run_id:
+            self.run_id = self.checkpoint.run_id(self.config, self.loader, self.preprocessor, self.model, self.learner)
+            self.config.add_config_attribs({'checkpoint_id': self.run_id})
+
+        # Completed before
+        if self.resume('test') or self.resume('cross_validate'):
+            self.log_run()
+            return
+
+        if data is None and self.resume('preprocess_data'):
+            with self.monitor.stage('load_data'):
+                data = self.checkpoint.load_data(self.run_id)
+        elif data is None and self.cache:
+            # Load and preprocess data, or get it from the cache
+            with self.monitor.stage('load_data'):
+                data = self.cache.load(self.loader, self.preprocessor)
+        elif data is None:
+            # Load data
+            with self.monitor.stage('load_data'):
+                raw_data = self.loader.load_data()
+
+            # Preprocess data
+            with self.monitor.stage('preprocess_data'):
+                data = self.preprocessor.preprocess_data(raw_data)
+            self.save_checkpoint('preprocess_data', data=data)
+
+        folds = config_value(self.config(), 'folds')
+        if folds:
+            # The folds models are built and trained in parallel, on views of the same data
+            with self.monitor.stage('cross_validate'):
+                metrics = cross_validate(data, type(self.model), type(self.learner), self.config.config.to_dict(),
+                                         list(self.learner.folds(data, int(folds))),
+                                         workers=self.workers, threads=self.learner.releases_gil)
+            self.config.add_config_attribs(metrics)
+            self.save_checkpoint('cross_validate')
+            self.log_run()
+            return
+
+        # Split, as views of the data. A resumed run tests on the split its model was trained on
+        resumed = self.resume('train')
+        if resumed:
+            train_index, test_index = self.checkpoint.load_split(self.run_id)
         else:
-            self.model.build()
-
-        # Train
-        self.learner.train(train_data=train_data, model=self.model)
+            train_index, test_index = self.learner.split(data)
+        train_data = DataView(data, train_index)
+        test_data = DataView(data, test_index)
+
+        if resumed:
+            # The trained model was saved at the end of train
+            with self.monitor.stage('load'), self.checkpoint_model_file():
+                self.load_model()
+        else:
+            # Build model
+            if self.config().get('model_file') and self.pool:
+                # Reuse a loaded model. Training changes it, so a copy is trained and the loaded one stays in the pool
+                with self.monitor.stage('load'):
+                    self.model = self.pool.copy(self.model)
+            elif self.config().get('model_file'):
+                with self.monitor.stage('load'):
+                    self.load_model()
+            else:
+                with self.monitor.stage('build'):
+                    self.model.build()
+
+            # Train
+            with self.monitor.stage('train'):
+                self.learner.train(train_data=train_data, model=self.model)
+            if self.checkpoint:
+                with self.checkpoint_model_file():
+                    self.save_model()
+                self.checkpoint.save_split(self.run_id, train_index, test_index)
+                self.save_checkpoint('train')
 
         # Test
-        self.learner.test(test_data=test_data, model=self.model)
+        with self.monitor.stage('test'):
+            self.learner.test(test_data=test_data, model=self.model)
+        self.save_checkpoint('test')
 
         # Predict
         #self.model.predict()
 
+        self.log_run()
+
+    def graph(self, cache_path: str=None, workers: int=None) -> Graph:
+        """
+        The stages of run as a Graph, to add or replace stages instead of overriding run.
+        Its outputs: raw_data, data, train_data, test_data, model and trained_model. The test stage logs the metrics in config.
+        The model stages are not cached, as they change the model and the config, see Graph
+        :param cache_path: directory of the cached data stages outputs
+        :param workers: max number of stages running in parallel
+        :rtype: Graph
+        """
+        def split(data):
+            train_index, test_index = self.learner.split(data)
+            return DataView(data, train_index), DataView(data, test_index)
+
+        def build():
+            self.model.build()
+            return self.model
+
+        def train(model, train_data):
+            self.learner.train(train_data=train_data, model=model)
+            return model
+
+        def test(model, test_data):
+            self.learner.test(test_data=test_data, model=model)
+
+        graph = Graph(self.config, cache_path, workers, self.monitor)
+        graph.add('load_data', self.loader.load_data, outputs=['raw_data'], plugin=self.loader)
+        graph.add('preprocess_data', self.preprocessor.preprocess_data, inputs=['raw_data'], outputs=['data'],
+                  plugin=self.preprocessor)
+        graph.add('split', split, inputs=['data'], outputs=['train_data', 'test_data'], cache=False)
+        graph.add('build', build, outputs=['model'], cache=False)
+        graph.add('train', train, inputs=['model', 'train_data'], outputs=['trained_model'], cache=False)
+        graph.add('test', test, inputs=['trained_model', 'test_data'], cache=False)
+        return graph
+
+    def resume(self, stage: str) -> bool:
+        """
+        Restore the config of the stage, if it was completed by a previous run
+        :return: True if the stage was completed
+        :rtype: bool
+        """
+        if not self.checkpoint or not self.checkpoint.done(self.run_id, stage):
+            return False
+        self.config.add_config_attribs(self.checkpoint.load_config(self.run_id, stage))
+        return True
+
+    @contextmanager
+    def checkpoint_model_file(self):
+        """
+        Set the config model_file to the model of the run in the checkpoint, see Checkpoint.model_file,
+        so runs sharing a model_file, e.g. the trials of a sweep, don't save over each other's model
+        """
+        model_file = config_value(self.config(), 'model_file')
+        if not model_file:
+            warnings.warn(UserWarning("No model_file in config. The checkpointed model is saved where the model saves it, "
+                                      "runs saving to the same place overwrite each other's model"))
+            yield
+            return
+        self.config.add_config_attribs({'model_file': self.checkpoint.model_file(self.run_id, model_file)})
+        try:
+            yield
+        finally:
+            self.config.add_config_attribs({'model_file': model_file})
+
+    def save_checkpoint(self, stage: str, data: Data=None):
+        if self.checkpoint:
+            self.checkpoint.save(self.run_id, stage, self.config, data=data)
+
+    def log_run(self):
+        """
+        Log the run metrics in config, and save it to the performance file
+        """
+        log_metrics(self.config, self.monitor, self.performance_file)
+        # Completed, the next run is a new one
+        self.run_id = None
+
         # Load performance
-        self.config.save_config(file='../../runs/performance.csv')
+        if self.performance_file:
+            self.monitor.reset()
+            # Not profiled, its profile couldn't be referenced in the saved config
+            with self.monitor.stage('save_config', profile=False):
+                self.config.save_config(file=self.performance_file)
+            # Only in the logs, the saved config can't include its own save time
+            log_metrics(self.config, self.monitor)
 
     def save(self, config_file=None, git_info=None):
         """
@@ -89,6 +498,9 @@ class Experiment:
         :return:
         :rtype:
         """
+        # Save model first, so the saved config references its artifact
+        self.save_model()
+
         # Save configs
         if config_file:
             self.config.save_config(config_file)
@@ -99,13 +511,32 @@ class Experiment:
             except:
                 warnings.warn(UserWarning("No defined config file. No config is saved"))
 
-        # Save model
-        self.model.save()
-
         # Track on git
         if git_info:
             self.save_git(git_info['branch'], git_info['tag'])
 
+    def save_model(self):
+        """
+        Save the model. With an artifact store, its model_file is stored in it, and logged in config:
+        model_artifact, its ID, and model_artifact_new_bytes, the bytes not already in the store
+        """
+        self.model.save()
+        model_file = config_value(self.config(), 'model_file')
+        if self.artifacts and model_file and os.path.exists(model_file):
+            artifact = self.artifacts.put(model_file)
+            self.config.add_config_attribs({'model_artifact': artifact,
+                                            'model_artifact_new_bytes': self.artifacts.stats['new_bytes']})
+
+    def load_model(self):
+        """
+        Load the model. With an artifact store, its model_file is first restored from the config model_artifact
+        """
+        model_file = config_value(self.config(), 'model_file')
+        artifact = config_value(self.config(), 'model_artifact')
+        if self.artifacts and model_file and artifact:
+            self.artifacts.get(artifact, model_file)
+        self.model.load()
+
     def save_git(self, branch=None, tag=None):
         """
         git checkout -b <branch>
@@ -121,6 +552,10 @@ class Experiment:
         :return:
         :rtype:
         """
+        if self.tracker:
+            # Commit and tag the work tree without checking out the branch. Pushed by tracker.push()
+            return self.tracker.snapshot(branch=branch, tag=tag)
+
         #
         # Change dir to base repo path
         # TODO: make repo path generic
@@ -183,7 +618,7 @@ class Experiment:
                 warnings.warn(UserWarning("No defined config file. No config is loaded"))
 
         # Load model
-        self.model.load()
+        self.load_model()
 
         # Load git info
         self.load(git_info['branch'], git_info['tag'])
@@ -199,4 +634,19 @@ class Experiment:
         assert res==0, 'Git command failed: ' + 'git checkout -b <branch>'
 
         res = subprocess.call(['git', 'checkout', 'tags/'+tag])
-        assert res==0, 'Git command failed: ' + 'git checkout tags/<tag>'
\ No newline at end of file
+        assert res==0, 'Git command failed: ' + 'git checkout tags/<tag>'
+
+
+# Imported on first use, to keep import flex.runs fast
+lazy_imports = {'BaseScheduler': '.scheduler',
+                'MedianStoppingScheduler': '.scheduler',
+                'SuccessiveHalvingScheduler': '.scheduler',
+                'Sweep': '.sweep',
+                'MicroBatcher': '.serving',
+                'ModelServer': '.serving'}
+
+
+def __getattr__(name):
+    if name in lazy_imports:
+        return getattr(importlib.import_module(lazy_imports[name], __name__), name)
+    raise AttributeError('module ' + __name__ + ' has no attribute ' + name)
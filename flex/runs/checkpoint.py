@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import uuid
+
+from ..config import Configuration
+from ..data import Data, DataCache
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+
+
+class Checkpoint:
+    '''
+    Outputs of the completed stages of the runs, so a restarted run skips them and reloads their outputs.
+
+    Each run has a run ID: the config run_id if set, else a hash of the plugins classes and of the config at the start
+    of the run. The config record is saved after each completed stage, with the preprocessed Data for the
+    preprocess_data stage. The trained model is saved by its BaseModel.save, and loaded back by its load,
+    and the train and test split it was trained on is saved with it, so the resumed test uses the same split.
+    '''
+    def __init__(self, path: str):
+        """
+
+        :param path: checkpoints directory
+        :type path: str
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.data = DataCache(os.path.join(path, 'data'), max_size=float('inf'))
+
+    def run_id(self, config: Configuration, *plugins) -> str:
+        record = config()
+        if record.get('run_id') is not None:
+            return str(record['run_id'])
+        key = {'classes': [type(plugin).__module__ + '.' + type(plugin).__qualname__ for plugin in plugins],
+               'config': {str(k): v for k, v in record.items() if k != 'checkpoint_id'}}
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+    def stages(self, run_id: str) -> dict:
+        """
+        :return: stage -> config record at the end of the stage, for the completed stages of the run
+        :rtype: dict
+        """
+        try:
+            with open(os.path.join(self.path, run_id + '.pkl'), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def done(self, run_id: str, stage: str) -> bool:
+        return stage in self.stages(run_id)
+
+    def save(self, run_id: str, stage: str, config: Configuration, data: Data=None):
+        """
+        Record the stage as completed
+        :param data: the stage output data
+        """
+        if data is not None:
+            self.data.put(run_id, data)
+
+        stages = self.stages(run_id)
+        stages[stage] = config().to_dict()
+        # Write in a temp file then rename, so a crash never leaves a partial checkpoint
+        tmp_file = os.path.join(self.path, '.tmp-' + uuid.uuid4().hex)
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(stages, f)
+        os.replace(tmp_file, os.path.join(self.path, run_id + '.pkl'))
+
+    def model_file(self, run_id: str, model_file: str) -> str:
+        """
+        :param model_file: the config model_file
+        :return: the path of the model of the run, with the same name as model_file
+        :rtype: str
+        """
+        path = os.path.join(self.path, 'models', run_id)
+        os.makedirs(path, exist_ok=True)
+        return os.path.join(path, os.path.basename(os.path.normpath(model_file)))
+
+    def save_split(self, run_id: str, train_index, test_index):
+        """
+        Save the train and test indexes of the run, see BaseLearner.split
+        """
+        os.makedirs(os.path.join(self.path, 'splits'), exist_ok=True)
+        tmp_file = os.path.join(self.path, 'splits', '.tmp-' + uuid.uuid4().hex)
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, train=np.asarray(train_index), test=np.asarray(test_index))
+        os.replace(tmp_file, self.split_file(run_id))
+
+    def load_split(self, run_id: str) -> tuple:
+        """
+        :return: train index, test index saved by save_split
+        :rtype: tuple of np.ndarray
+        """
+        with np.load(self.split_file(run_id)) as split:
+            return split['train'], split['test']
+
+    def split_file(self, run_id: str) -> str:
+        return os.path.join(self.path, 'splits', run_id + '.npz')
+
+    def load_config(self, run_id: str, stage: str) -> dict:
+        return self.stages(run_id)[stage]
+
+    def load_data(self, run_id: str) -> Data:
+        return self.data.get(run_id)
+
+    def clear(self, run_id: str):
+        """
+        Remove the checkpoint of the run, to run it again from the start
+        """
+        if os.path.exists(os.path.join(self.path, run_id + '.pkl')):
+            os.remove(os.path.join(self.path, run_id + '.pkl'))
+        if os.path.exists(self.split_file(run_id)):
+            os.remove(self.split_file(run_id))
+        shutil.rmtree(os.path.join(self.data.path, run_id), ignore_errors=True)
+        shutil.rmtree(os.path.join(self.path, 'models', run_id), ignore_errors=True)
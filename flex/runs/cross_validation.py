@@ -0,0 +1,100 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numbers
+import os
+
+from ..config import Configuration
+from ..data import Data, DataView
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+# Data and factories shared by the folds of a worker process, set once per worker by init_worker
+_shared = {}
+
+
+def init_worker(data: Data, model, learner):
+    _shared.update(data=data, model=model, learner=learner)
+
+
+def run_shared_fold(config: dict, train_index: np.ndarray, test_index: np.ndarray) -> pd.DataFrame:
+    return run_fold(_shared['data'], _shared['model'], _shared['learner'], config, train_index, test_index)
+
+
+def run_fold(data: Data, model, learner, config: dict, train_index: np.ndarray, test_index: np.ndarray) -> pd.DataFrame:
+    """
+    Build, train and test a new model on one fold, as views of the shared data
+    :param model: BaseModel factory, called with the fold config
+    :param learner: BaseLearner factory, called with the fold config
+    :param config: the fold config
+    :return: the fold config record, with the results logged by the learner
+    :rtype: pd.DataFrame
+    """
+    config = Configuration(config=config, logs=pd.DataFrame())
+    fold_model = model(config)
+    fold_learner = learner(config)
+    fold_model.build()
+    fold_learner.train(train_data=DataView(data, train_index), model=fold_model)
+    fold_learner.test(test_data=DataView(data, test_index), model=fold_model)
+    return config.data_mgr.config
+
+
+def cross_validate(data: Data, model, learner, config: dict, folds, workers: int=None, threads: bool=False) -> dict:
+    """
+    Run the folds in parallel, each with a new model and learner
+    :param data: the shared data. Sent once per worker process, not per fold
+    :param model: BaseModel factory. Must be picklable for processes, e.g. the model class
+    :param learner: BaseLearner factory. Must be picklable for processes
+    :param config: the base config
+    :param folds: list of (train index, test index)
+    :param workers: number of workers. Default: number of CPUs. 0 runs the folds one after the other in this process
+    :param threads: run the folds on threads instead of processes, for learners releasing the GIL
+    :return: metrics: fold<i>_<metric> for each fold, and the mean <metric> and <metric>_std of the numeric ones
+    :rtype: dict
+    """
+    configs = [dict(config, fold=i) for i in range(len(folds))]
+    workers = min(os.cpu_count() if workers is None else workers, len(folds))
+
+    if workers == 0:
+        records = [run_fold(data, model, learner, fold_config, train_index, test_index)
+                   for fold_config, (train_index, test_index) in zip(configs, folds)]
+    elif threads:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            records = list(executor.map(run_fold, [data] * len(folds), [model] * len(folds), [learner] * len(folds),
+                                        configs, *zip(*folds)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(data, model, learner)) as executor:
+            records = list(executor.map(run_shared_fold, configs, *zip(*folds)))
+
+    # Metrics: keys added or changed by the learner, even if the base config has them, e.g. from a previous run
+    metrics = {}
+    keys = []
+    for fold_config, record in zip(configs, records):
+        for key in record.columns:
+            if key not in keys and changed(fold_config, key, record[key].iloc[-1]):
+                keys.append(key)
+    for key in keys:
+        values = [record[key].iloc[-1] if key in record.columns else None for record in records]
+        for i, value in enumerate(values):
+            metrics['fold' + str(i) + '_' + str(key)] = value
+        if all(isinstance(value, numbers.Number) for value in values):
+            metrics[key] = float(np.mean(values))
+            metrics[str(key) + '_std'] = float(np.std(values))
+    return metrics
+
+
+def changed(config: dict, key, value) -> bool:
+    """
+    Check if the value of key differs from config, missing values being equal
+    """
+    if key not in config:
+        return True
+    before = config[key]
+    try:
+        if pd.isna(before) and pd.isna(value):
+            return False
+        return bool(before != value)
+    except (TypeError, ValueError):
+        # e.g. arrays
+        return before is not value
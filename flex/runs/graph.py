@@ -0,0 +1,222 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import uuid
+
+from ..config import Configuration
+
+
+class Stage:
+    '''
+    A step of a Graph: func is called with the values of its inputs, in order, and returns its outputs,
+    one value for one output, a tuple for more, None for none.
+    '''
+    def __init__(self, name: str, func, inputs: list=None, outputs: list=None, plugin=None, cache: bool=True):
+        """
+
+        :param name: unique name of the stage
+        :param func: the step, e.g. loader.load_data
+        :param inputs: names of the values passed to func, outputs of other stages or passed to Graph.run
+        :param outputs: names of the values returned by func
+        :param plugin: the plugin func depends on. Its class and config_keys values key the cached outputs.
+        Default: the func source and the whole graph config
+        :param cache: False if the outputs can't be reused between runs, e.g. a stage with side effects
+        """
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs or [])
+        self.outputs = list(outputs or [])
+        self.plugin = plugin
+        self.cache = cache
+
+
+class Graph:
+    '''
+    Stages declaring their inputs and outputs, run in the order of their dependencies.
+
+    Independent stages, e.g. two preprocessors feeding an ensemble, run in parallel on threads.
+    With a cache_path, the outputs of a stage are saved, and reused by the next runs while the stage, its config
+    and its upstream stages don't change. The keys logged in the config by the runs, e.g. the metrics of the monitors
+    and of the stages, are not part of the config of the stages, see Configuration.param_keys.
+    '''
+    def __init__(self, config: Configuration, cache_path: str=None, workers: int=None, monitor=None):
+        """
+
+        :param config: the config of the stages
+        :type config: Configuration
+        :param cache_path: directory of the cached outputs. Default: not cached
+        :type cache_path: str
+        :param workers: max number of stages running in parallel. Default: ThreadPoolExecutor default
+        :type workers: int
+        :param monitor: measures the stages, logged in config, see StageMonitor
+        :type monitor: StageMonitor
+        """
+        self.config = config
+        self.cache_path = cache_path
+        self.workers = workers
+        self.monitor = monitor
+        self.stages = {}
+        if cache_path:
+            os.makedirs(cache_path, exist_ok=True)
+
+    def add(self, name: str, func, inputs: list=None, outputs: list=None, plugin=None, cache: bool=True) -> Stage:
+        """
+        Add a stage, see Stage
+        """
+        assert name not in self.stages, 'Stage ' + name + ' already added'
+        stage = Stage(name, func, inputs, outputs, plugin, cache)
+        self.stages[name] = stage
+        return stage
+
+    def remove(self, name: str):
+        del self.stages[name]
+
+    def producers(self) -> dict:
+        producers = {}
+        for stage in self.stages.values():
+            for output in stage.outputs:
+                assert output not in producers, 'Output ' + output + ' of ' + stage.name + ' already produced by ' + producers[output]
+                producers[output] = stage.name
+        return producers
+
+    def keys(self, values: dict) -> dict:
+        """
+        Cache key of each stage: hash of the stage and of the keys of its upstream stages.
+        None for the stages not cached, or depending on one of them or on passed values
+        """
+        producers = self.producers()
+        config = self.config()
+        keys = {}
+
+        def key(name):
+            if name in keys:
+                return keys[name]
+            keys[name] = None
+            stage = self.stages[name]
+            upstream = []
+            for input in stage.inputs:
+                if input in values or input not in producers:
+                    return None
+                upstream.append(key(producers[input]))
+            if not stage.cache or None in upstream:
+                return None
+
+            if getattr(stage.plugin, 'config_keys', None) is not None:
+                stage_config = {str(k): stage.plugin.config().get(k) for k in stage.plugin.config_keys}
+            else:
+                stage_config = {str(k): config.get(k) for k in self.config.param_keys()}
+            try:
+                source = inspect.getsource(type(stage.plugin) if stage.plugin is not None else stage.func)
+            except (OSError, TypeError):
+                source = None
+            keys[name] = hashlib.sha256(json.dumps({'name': name,
+                                                    'func': getattr(stage.func, '__qualname__', repr(stage.func)),
+                                                    'source': source,
+                                                    'config': stage_config,
+                                                    'inputs': stage.inputs,
+                                                    'outputs': stage.outputs,
+                                                    'upstream': upstream},
+                                                   sort_keys=True, default=str).encode()).hexdigest()
+            return keys[name]
+
+        for name in self.stages:
+            key(name)
+        return keys
+
+    def run(self, outputs: list=None, **values) -> dict:
+        """
+        Run the stages needed for outputs
+        :param outputs: names of the needed outputs. Default: all the stages run
+        :param values: inputs not produced by a stage
+        :return: all the values, by name
+        :rtype: dict
+        """
+        producers = self.producers()
+        values = dict(values)
+        keys = self.keys(values)
+
+        # The stages needed for outputs, and their upstream stages
+        needed = set()
+        pending = list(outputs) if outputs is not None else [output for stage in self.stages.values() for output in stage.outputs]
+        names = [] if outputs is not None else list(self.stages)
+        for output in pending:
+            if output not in values:
+                assert output in producers, 'No stage produces ' + output
+                names.append(producers[output])
+        while names:
+            name = names.pop()
+            if name in needed:
+                continue
+            needed.add(name)
+            for input in self.stages[name].inputs:
+                if input not in values:
+                    assert input in producers, 'No stage produces ' + input + ', input of ' + name
+                    names.append(producers[input])
+
+        if self.monitor:
+            self.monitor.reset()
+
+        done = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            running = {}
+            while needed - done:
+                # Start the stages with all their inputs ready
+                for name in needed - done - set(running.values()):
+                    if all(input in values for input in self.stages[name].inputs):
+                        args = [values[input] for input in self.stages[name].inputs]
+                        running[executor.submit(self.run_stage, self.stages[name], args, keys[name])] = name
+                assert running, 'Cycle between the stages ' + ', '.join(sorted(needed - done))
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    # Raises the stage error, the running stages finish but no new one starts
+                    values.update(future.result())
+                    done.add(name)
+
+        if self.monitor:
+            self.monitor.save_profile(self.cache_path)
+            if self.monitor.metrics and not self.config.data_mgr.config.empty:
+                self.config.add_config_attribs(self.monitor.metrics)
+        return values
+
+    def run_stage(self, stage: Stage, args: list, key: str) -> dict:
+        cached = self.load(key)
+        if cached is not None:
+            return cached
+
+        if self.monitor:
+            with self.monitor.stage(stage.name):
+                result = stage.func(*args)
+        else:
+            result = stage.func(*args)
+
+        if len(stage.outputs) == 0:
+            outputs = {}
+        elif len(stage.outputs) == 1:
+            outputs = {stage.outputs[0]: result}
+        else:
+            outputs = dict(zip(stage.outputs, result))
+        self.save(key, outputs)
+        return outputs
+
+    def load(self, key: str) -> dict:
+        if not self.cache_path or key is None:
+            return None
+        try:
+            with open(os.path.join(self.cache_path, key + '.pkl'), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, key: str, outputs: dict):
+        if not self.cache_path or key is None:
+            return
+        # Write in a temp file then rename, so other runs never see a partial output
+        tmp_file = os.path.join(self.cache_path, '.tmp-' + uuid.uuid4().hex)
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(outputs, f)
+        os.replace(tmp_file, os.path.join(self.cache_path, key + '.pkl'))
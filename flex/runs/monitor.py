@@ -0,0 +1,105 @@
+from contextlib import contextmanager
+import sys
+import time
+import tracemalloc
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss() -> int:
+    """
+    Peak resident memory of this process so far in bytes, None if unknown
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class StageMonitor:
+    '''
+    Measure each stage of a run: wall time, CPU time and peak RSS of the process at the end of the stage,
+    and optionally the memory allocated by Python during the stage, traced with tracemalloc.
+
+    The metrics are named <stage>_<metric>, e.g. train_time, and are logged in the run config record,
+    so they can be queried across runs like any other metric.
+    <stage>_process_peak_rss is the peak RSS of the whole process since it started, not of the stage alone:
+    it only grows over the stages, use trace_memory for the memory of each stage.
+    With a profiler, the stages are also profiled, see BaseProfiler.
+    '''
+    def __init__(self, enabled: bool=True, trace_memory: bool=False, profiler=None):
+        """
+
+        :param enabled: False to not measure anything
+        :type enabled: bool
+        :param trace_memory: also measure the Python allocations with tracemalloc. Slows down the run
+        :type trace_memory: bool
+        :param profiler: profile the run stages. Default: not profiled
+        :type profiler: BaseProfiler
+        """
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.profiler = profiler
+        self.metrics = {}
+
+    def reset(self):
+        self.metrics = {}
+        if self.profiler:
+            self.profiler.reset()
+
+    def save_profile(self, path: str=None):
+        """
+        Save the profile of the run, and add its file to the metrics as profile_file
+        :param path: directory of the file, if the profiler has no path
+        """
+        if self.profiler:
+            file = self.profiler.save(path)
+            if file:
+                self.metrics['profile_file'] = file
+
+    @contextmanager
+    def stage(self, name: str, profile: bool=True):
+        """
+        Measure the with block as the stage name
+        :param profile: False to not profile the stage
+        """
+        if self.profiler and profile and self.profiler.profiles(name):
+            self.profiler.start()
+            try:
+                with self.measure(name):
+                    yield
+            finally:
+                self.profiler.stop()
+        else:
+            with self.measure(name):
+                yield
+
+    @contextmanager
+    def measure(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            self.metrics[name + '_time'] = time.perf_counter() - wall_start
+            self.metrics[name + '_cpu_time'] = time.process_time() - cpu_start
+            self.metrics[name + '_process_peak_rss'] = peak_rss()
+            if self.trace_memory:
+                traced, traced_peak = tracemalloc.get_traced_memory()
+                self.metrics[name + '_traced_delta'] = traced - traced_start
+                self.metrics[name + '_traced_peak'] = traced_peak - traced_start
+            if started_tracing:
+                tracemalloc.stop()
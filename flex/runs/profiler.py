@@ -0,0 +1,164 @@
+from abc import ABCMeta, abstractmethod
+import cProfile
+import collections
+import os
+import sys
+import threading
+import time
+import uuid
+
+
+class BaseProfiler(metaclass=ABCMeta):
+    '''
+    Profile the stages of a run, passed to a StageMonitor.
+
+    All the profiled stages of a run are collected in one profile, saved by save() in a new file
+    of the path directory, and its file name is logged in the run config record as profile_file.
+    '''
+    extension = None
+
+    def __init__(self, path: str=None, stages: list=None):
+        """
+
+        :param path: directory of the profile files. Default: the directory of the run config file, or the current one
+        :type path: str
+        :param stages: names of the stages to profile, e.g. ['train']. Default: all the stages of the run
+        :type stages: list
+        """
+        self.path = path
+        self.stages = stages
+        self.profiled = False
+
+    def profiles(self, stage: str) -> bool:
+        return self.stages is None or stage in self.stages
+
+    def reset(self):
+        self.profiled = False
+        self.clear()
+
+    def save(self, path: str=None) -> str:
+        """
+        Save the profile of the run in a new file, and reset it
+        :param path: directory of the file, if the profiler has no path
+        :return: the profile file, None if nothing was profiled
+        :rtype: str
+        """
+        if not self.profiled:
+            return None
+
+        path = self.path or path or '.'
+        os.makedirs(path, exist_ok=True)
+        file = os.path.join(path, 'profile_' + time.strftime('%Y%m%d-%H%M%S') + '_' + uuid.uuid4().hex[:8] + self.extension)
+        self.dump(file)
+        self.reset()
+        return file
+
+    @abstractmethod
+    def start(self):
+        pass
+
+    @abstractmethod
+    def stop(self):
+        pass
+
+    @abstractmethod
+    def dump(self, file: str):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class CProfiler(BaseProfiler):
+    '''
+    Deterministic profile of every function call with cProfile, saved as a pstats file:
+    python -m pstats profile.prof, or snakeviz profile.prof
+    '''
+    extension = '.prof'
+
+    def __init__(self, path: str=None, stages: list=None):
+        super().__init__(path, stages)
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profiled = True
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def dump(self, file: str):
+        self.profile.dump_stats(file)
+
+    def clear(self):
+        self.profile = cProfile.Profile()
+
+
+class SamplingProfiler(BaseProfiler):
+    '''
+    Sample the stack of the running thread every interval seconds, with a low overhead on long runs.
+    Saved in the collapsed stacks format, one "frame;frame;... count" line per stack, for flamegraph.pl or speedscope.
+
+    Each thread running a profiled stage, e.g. the parallel stages of a Graph, has its own sampler,
+    stopped when its outermost stage stops.
+    '''
+    extension = '.folded'
+
+    def __init__(self, path: str=None, stages: list=None, interval: float=0.005):
+        """
+
+        :param interval: time in seconds between two samples
+        :type interval: float
+        """
+        super().__init__(path, stages)
+        self.interval = interval
+        self.stacks = collections.Counter()
+        # Thread id -> [stop event, sampler thread, number of started stages]
+        self.samplers = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.profiled = True
+        thread_id = threading.get_ident()
+        with self.lock:
+            sampler = self.samplers.get(thread_id)
+            if sampler:
+                # Nested stage, already sampled
+                sampler[2] += 1
+                return
+            stopped = threading.Event()
+            thread = threading.Thread(target=self.sample, args=(thread_id, stopped), daemon=True)
+            self.samplers[thread_id] = [stopped, thread, 1]
+        thread.start()
+
+    def stop(self):
+        with self.lock:
+            sampler = self.samplers[threading.get_ident()]
+            sampler[2] -= 1
+            if sampler[2]:
+                return
+            del self.samplers[threading.get_ident()]
+        stopped, thread, _ = sampler
+        stopped.set()
+        thread.join()
+
+    def sample(self, thread_id: int, stopped: threading.Event):
+        while not stopped.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(code.co_name + ' (' + os.path.basename(code.co_filename) + ':' + str(code.co_firstlineno) + ')')
+                frame = frame.f_back
+            if stack:
+                with self.lock:
+                    self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self, file: str):
+        with open(file, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(stack + ' ' + str(count) + '\n')
+
+    def clear(self):
+        self.stacks = collections.Counter()
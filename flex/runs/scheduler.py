@@ -0,0 +1,151 @@
+from __future__ import annotations
+from abc import ABCMeta, abstractmethod
+from multiprocessing.managers import BaseManager
+import threading
+
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+
+
+class BaseScheduler(metaclass=ABCMeta):
+    '''
+    Decide to stop the sweep trials early, from the intermediate metrics reported by BaseLearner.report during train.
+
+    A stopped trial ends, and its worker runs the next trial. Every decision is kept, see decisions.
+    '''
+    def __init__(self, metric: str, mode: str='min'):
+        """
+
+        :param metric: the reported metric the trials are compared on
+        :type metric: str
+        :param mode: min or max, if lower or higher values of metric are better
+        :type mode: str
+        """
+        assert mode in ['min', 'max']
+        self.metric = metric
+        self.mode = mode
+        # trial -> {step: score}, lower scores are better
+        self.history = {}
+        self.log = []
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # The lock can't be pickled, e.g. to the manager process
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def report(self, trial: int, step: int, metrics: dict) -> bool:
+        """
+        Record the metrics of the trial at step
+        :return: True if the trial should stop
+        :rtype: bool
+        """
+        value = metrics.get(self.metric)
+        if value is None:
+            return False
+        score = float(value) if self.mode == 'min' else -float(value)
+
+        with self.lock:
+            self.history.setdefault(trial, {})[step] = score
+            stop = self.should_stop(trial, step, score)
+            self.log.append({'trial': trial, 'step': step, self.metric: value, 'decision': 'stop' if stop else 'continue'})
+        return stop
+
+    def decisions(self) -> list:
+        """
+        :return: dicts of trial, step, metric and decision (continue or stop), in the order of the reports
+        :rtype: list
+        """
+        with self.lock:
+            return list(self.log)
+
+    @abstractmethod
+    def should_stop(self, trial: int, step: int, score: float) -> bool:
+        pass
+
+
+class MedianStoppingScheduler(BaseScheduler):
+    '''
+    Stop a trial when its best score so far is worse than the median of the other trials best scores at the same step.
+    '''
+    def __init__(self, metric: str, mode: str='min', grace_steps: int=1, min_trials: int=3):
+        """
+
+        :param grace_steps: don't stop trials before this step
+        :type grace_steps: int
+        :param min_trials: min number of other trials that reached the step, to compare with
+        :type min_trials: int
+        """
+        super().__init__(metric, mode)
+        self.grace_steps = grace_steps
+        self.min_trials = min_trials
+
+    def should_stop(self, trial: int, step: int, score: float) -> bool:
+        if step < self.grace_steps:
+            return False
+
+        # The trials that reached the step, and reported at or before it, e.g. not only with a longer interval
+        others = [min(other_score for other_step, other_score in history.items() if other_step <= step)
+                  for other, history in self.history.items()
+                  if other != trial and max(history) >= step and min(history) <= step]
+        if len(others) < self.min_trials:
+            return False
+
+        best = min(trial_score for trial_step, trial_score in self.history[trial].items() if trial_step <= step)
+        return best > np.median(others)
+
+
+class SuccessiveHalvingScheduler(BaseScheduler):
+    '''
+    Asynchronous successive halving: at the rungs min_steps, min_steps * reduction, min_steps * reduction ** 2...
+    a trial continues only if its score is in the top 1 / reduction of the trials that reached the rung so far.
+    '''
+    def __init__(self, metric: str, mode: str='min', min_steps: int=1, reduction: int=2):
+        """
+
+        :param min_steps: first rung
+        :type min_steps: int
+        :param reduction: fraction of the trials stopped at each rung is 1 - 1 / reduction
+        :type reduction: int
+        """
+        assert min_steps >= 1, 'min_steps must be at least 1'
+        assert reduction >= 2, 'reduction must be at least 2'
+        super().__init__(metric, mode)
+        self.min_steps = min_steps
+        self.reduction = reduction
+        # rung -> {trial: score}
+        self.rungs = {}
+
+    def is_rung(self, step: int) -> bool:
+        rung = self.min_steps
+        while rung < step:
+            rung *= self.reduction
+        return rung == step
+
+    def should_stop(self, trial: int, step: int, score: float) -> bool:
+        if not self.is_rung(step):
+            return False
+
+        scores = self.rungs.setdefault(step, {})
+        scores[trial] = score
+        rank = sum(other_score < score for other_score in scores.values())
+        return rank >= max(len(scores) // self.reduction, 1)
+
+
+def serve_scheduler(scheduler: BaseScheduler) -> BaseScheduler:
+    return scheduler
+
+
+class SchedulerManager(BaseManager):
+    '''
+    Server process of a scheduler shared by the sweep workers: SchedulerManager().Scheduler(scheduler) returns a proxy
+    '''
+
+
+SchedulerManager.register('Scheduler', callable=serve_scheduler)
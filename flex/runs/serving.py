@@ -0,0 +1,182 @@
+from __future__ import annotations
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import collections
+import json
+import queue
+import threading
+import time
+
+from ..data import RawData
+from ..lazy import LazyModule
+
+np = LazyModule('numpy')
+
+
+class MicroBatcher:
+    '''
+    Group concurrent single sample requests into micro batches for the Application model.
+
+    The model is loaded once by start(). A batch is sent to the preprocessor and the model when it has
+    max_batch_size requests, or max_wait seconds after its first request, trading latency against throughput.
+    The model predict result must be indexable by sample.
+    '''
+    def __init__(self, app, max_batch_size: int=32, max_wait: float=0.005, stats_size: int=10000):
+        """
+
+        :param app: Application with the preprocessor and model
+        :type app: Application
+        :param max_batch_size: max number of requests per predict call
+        :type max_batch_size: int
+        :param max_wait: max time in seconds to wait for more requests after the first one of a batch
+        :type max_wait: float
+        :param stats_size: number of recent requests kept for the latency stats
+        :type stats_size: int
+        """
+        self.app = app
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.latencies = collections.deque(maxlen=stats_size)
+        self.batch_sizes = collections.deque(maxlen=stats_size)
+        self.thread = None
+
+    def start(self):
+        self.app.model.load()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.requests.put(None)
+        self.thread.join()
+
+    def predict(self, x, timeout: float=None):
+        """
+        Predict one sample, batched with the concurrent requests
+        :param x: raw sample, as in RawData.x
+        :param timeout: max time in seconds to wait for the result
+        :return: the model result for this sample
+        """
+        future = Future()
+        self.requests.put((x, future, time.perf_counter()))
+        return future.result(timeout)
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+
+            # Wait for more requests until the batch is full or the first request waited max_wait
+            batch = [request]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    request = self.requests.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)
+                    break
+                batch.append(request)
+
+            self.predict_batch(batch)
+
+    def predict_batch(self, batch: list):
+        # Any error goes to the requests, the batcher thread keeps serving the next ones
+        try:
+            raw_data = RawData(x=[x for x, _, _ in batch], y=[None] * len(batch))
+            data = self.app.preprocessor.preprocess_data(raw_data)
+            results = self.app.model.predict(data)
+            if len(results) != len(batch):
+                raise ValueError('The model returned ' + str(len(results)) + ' results for a batch of ' +
+                                 str(len(batch)) + ' samples')
+            results = [results[i] for i in range(len(batch))]
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        end = time.perf_counter()
+        self.batch_sizes.append(len(batch))
+        for (_, future, start), result in zip(batch, results):
+            self.latencies.append(end - start)
+            future.set_result(result)
+
+    def stats(self) -> dict:
+        """
+        Latencies in seconds and batch sizes of the recent requests
+        """
+        latencies = np.array(self.latencies)
+        return {'requests': len(latencies),
+                'batches': len(self.batch_sizes),
+                'mean_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.,
+                'p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                'p99': float(np.percentile(latencies, 99)) if len(latencies) else None}
+
+
+class PredictHandler(BaseHTTPRequestHandler):
+    '''
+    POST /predict {"x": sample} -> {"y": result}
+    GET /stats -> MicroBatcher.stats()
+    '''
+    def do_POST(self):
+        if self.path != '/predict':
+            self.reply(404, {'error': 'Unknown path ' + self.path})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            result = self.server.batcher.predict(request['x'])
+        except Exception as e:
+            self.reply(500, {'error': repr(e)})
+            return
+        self.reply(200, {'y': result})
+
+    def do_GET(self):
+        if self.path != '/stats':
+            self.reply(404, {'error': 'Unknown path ' + self.path})
+            return
+        self.reply(200, self.server.batcher.stats())
+
+    def reply(self, code: int, response: dict):
+        body = json.dumps(response, default=self.to_json).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Don't log every request
+        pass
+
+    @staticmethod
+    def to_json(value):
+        # numpy arrays and scalars
+        if hasattr(value, 'tolist'):
+            return value.tolist()
+        return str(value)
+
+
+class ModelServer(ThreadingHTTPServer):
+    '''
+    Long lived local HTTP server for an Application, batching the concurrent requests with a MicroBatcher
+    '''
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, app, host: str='127.0.0.1', port: int=8000, **batcher_args):
+        """
+
+        :param app: Application with the preprocessor and model
+        :param host:
+        :param port: 0 picks a free port, see server_address
+        :param batcher_args: MicroBatcher args: max_batch_size, max_wait, stats_size
+        """
+        super().__init__((host, port), PredictHandler)
+        self.batcher = MicroBatcher(app, **batcher_args)
+        self.batcher.start()
+
+    def server_close(self):
+        super().server_close()
+        self.batcher.stop()
@@ -0,0 +1,219 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import contextlib
+import copy
+import itertools
+import random
+import traceback
+import warnings
+import os
+
+from ..config import Configuration
+from ..data import Data, DataCache
+from ..learners import TrialPruned
+from ..lazy import LazyModule
+from ..models import ArtifactStore
+from . import Experiment
+from .checkpoint import Checkpoint
+from .scheduler import BaseScheduler, SchedulerManager
+from .tracking import GitTracker
+
+pd = LazyModule('pandas')
+
+# Data and factories shared by the trials of a worker process, set once per worker by init_worker
+_shared = {}
+
+
+def init_worker(data: Data, model, learner, config: dict, scheduler: BaseScheduler=None, checkpoint: Checkpoint=None,
+                artifacts: ArtifactStore=None):
+    _shared.update(data=data, model=model, learner=learner, config=config, scheduler=scheduler, checkpoint=checkpoint,
+                   artifacts=artifacts)
+
+
+def run_trial(trial: int, params: dict) -> pd.DataFrame:
+    """
+    Run one Experiment on the shared data, with the base config updated by params
+    :return: the trial config record, with the results logged by the learner
+    :rtype: pd.DataFrame
+    """
+    trial_config = dict(_shared['config'])
+    trial_config.update(params)
+    trial_config['trial'] = trial
+    if trial_config.get('run_id') is not None:
+        trial_config['run_id'] = str(trial_config['run_id']) + '-' + str(trial)
+    config = Configuration(config=trial_config, logs=pd.DataFrame())
+    learner = _shared['learner'](config)
+    learner.scheduler = _shared['scheduler']
+    learner.trial = trial
+    experiment = Experiment(model=_shared['model'](config),
+                            learner=learner,
+                            config=config,
+                            performance_file=None,
+                            checkpoint=_shared['checkpoint'],
+                            artifacts=_shared['artifacts'])
+    try:
+        experiment.run(data=_shared['data'])
+        # With a checkpoint, run already saved the model after training
+        if experiment.artifacts and not experiment.checkpoint:
+            experiment.save_model()
+        if learner.scheduler is not None:
+            config.add_config_attribs({'pruned': False})
+    except TrialPruned as e:
+        # The last reported metrics, at the step the trial was stopped
+        config.add_config_attribs(dict(e.metrics, pruned=True, pruned_step=e.step))
+    except Exception:
+        config.add_config_attribs({'trial_error': traceback.format_exc()})
+    return config.data_mgr.config
+
+
+class Sweep:
+    '''
+    Run an Experiment for every point of a parameter grid or sampler, on a pool of worker processes.
+
+    The data is loaded and preprocessed once, and shared with the workers: inherited when processes are forked,
+    otherwise pickled once per worker, not per point.
+    Each point runs with the base config updated by its params, and its record is logged in config.
+    With a scheduler, unpromising trials are stopped early, and logged with pruned=True and pruned_step.
+    With a checkpoint, a sweep run again, e.g. after a node failure, doesn't run again the completed trials.
+    With a tracker, each trial is committed and tagged on the branch sweeps/<name>, all in one pack file.
+    With an artifact store, each trial model is saved and stored in it, only the chunks not saved by other trials.
+    '''
+    def __init__(self,
+                 loader,
+                 preprocessor,
+                 model,
+                 learner,
+                 config: Configuration,
+                 params,
+                 workers: int=None,
+                 logs_file: str=None,
+                 cache: DataCache=None,
+                 scheduler: BaseScheduler=None,
+                 checkpoint: Checkpoint=None,
+                 tracker: GitTracker=None,
+                 artifacts: ArtifactStore=None):
+        """
+
+        :param loader: BaseDataLoader factory, called with the base config. e.g. the loader class
+        :param preprocessor: BaseDataPreprocessor factory, called with the base config
+        :param model: BaseModel factory, called with the trial config. Must be picklable
+        :param learner: BaseLearner factory, called with the trial config. Must be picklable
+        :param config: base config. The trials records are logged in it
+        :type config: Configuration
+        :param params: grid: dict of key -> list of values, or sampler: iterable of dicts, e.g. Sweep.sample(...)
+        :type params: dict, iterable
+        :param workers: number of worker processes. Default: number of CPUs. 0 runs the trials in this process
+        :type workers: int
+        :param logs_file: incrementally save the logs to this file after each trial
+        :type logs_file: str
+        :param cache: get the preprocessed data from this cache
+        :type cache: DataCache
+        :param scheduler: stops trials early from the metrics reported by the learners, e.g. MedianStoppingScheduler
+        :type scheduler: BaseScheduler
+        :param checkpoint: record the completed stages of the trials, to resume the sweep
+        :type checkpoint: Checkpoint
+        :param tracker: commit the work tree with each trial record, tagged <name>-trial-<trial>
+        :type tracker: GitTracker
+        :param artifacts: store of the trials models, referenced by model_artifact in their records.
+        The trials running in parallel must save their model to different model_file, e.g. a model_file param
+        :type artifacts: ArtifactStore
+        """
+        self.loader = loader
+        self.preprocessor = preprocessor
+        self.model = model
+        self.learner = learner
+        self.config = config
+        self.params = params
+        self.workers = os.cpu_count() if workers is None else workers
+        self.logs_file = logs_file
+        self.cache = cache
+        self.scheduler = scheduler
+        self.checkpoint = checkpoint
+        self.tracker = tracker
+        self.artifacts = artifacts
+        # The scheduler decisions of the last run, see BaseScheduler.decisions
+        self.decisions = pd.DataFrame()
+
+    @staticmethod
+    def grid(params: dict) -> list:
+        """
+        All the combinations of the params values
+        :param params: key -> list of values
+        :return: list of dicts
+        """
+        keys = list(params.keys())
+        return [dict(zip(keys, values)) for values in itertools.product(*params.values())]
+
+    @staticmethod
+    def sample(space: dict, trials: int, seed: int=None):
+        """
+        Random points of a params space
+        :param space: key -> list of values to choose from, or function taking a random.Random and returning a value
+        e.g. {'optimizer': ['adam', 'sgd'], 'lr': lambda rng: 10 ** rng.uniform(-5, -1)}
+        :param trials: number of points
+        :param seed: random seed
+        :return: generator of dicts
+        """
+        rng = random.Random(seed)
+        for _ in range(trials):
+            yield {key: values(rng) if callable(values) else rng.choice(values) for key, values in space.items()}
+
+    def points(self):
+        return self.grid(self.params) if isinstance(self.params, dict) else self.params
+
+    def load_data(self) -> Data:
+        loader, preprocessor = self.loader(self.config), self.preprocessor(self.config)
+        if self.cache:
+            return self.cache.load(loader, preprocessor)
+        return preprocessor.preprocess_data(loader.load_data())
+
+    def run(self) -> pd.DataFrame:
+        """
+        Run all the trials
+        :return: the trials records, in the order they finished
+        :rtype: pd.DataFrame
+        """
+        shared = (self.load_data(), self.model, self.learner, self.config.config.to_dict())
+
+        # Every run starts from the passed scheduler state. The worker processes share it in a manager process
+        scheduler = copy.deepcopy(self.scheduler)
+        manager = None
+        if scheduler and self.workers != 0:
+            manager = SchedulerManager()
+            manager.start()
+            scheduler = manager.Scheduler(scheduler)
+
+        records = []
+        try:
+            # The commits of all the trials in one pack
+            with self.tracker.batch() if self.tracker else contextlib.nullcontext():
+                if self.workers == 0:
+                    init_worker(*shared, scheduler=scheduler, checkpoint=self.checkpoint, artifacts=self.artifacts)
+                    for trial, params in enumerate(self.points()):
+                        records.append(self.log(run_trial(trial, params)))
+                else:
+                    with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                             initargs=shared + (scheduler, self.checkpoint, self.artifacts)) as executor:
+                        futures = [executor.submit(run_trial, trial, params) for trial, params in enumerate(self.points())]
+                        for future in as_completed(futures):
+                            records.append(self.log(future.result()))
+            self.decisions = pd.DataFrame(scheduler.decisions()) if scheduler else pd.DataFrame()
+        finally:
+            if manager:
+                manager.shutdown()
+
+        return pd.concat(records, sort=False, ignore_index=True) if records else pd.DataFrame()
+
+    def log(self, record: pd.DataFrame) -> pd.DataFrame:
+        if 'trial_error' in record.columns:
+            warnings.warn(UserWarning("Trial " + str(record['trial'].iloc[-1]) + " failed:\n" + record['trial_error'].iloc[-1]))
+
+        self.config.append_logs(record)
+        if self.logs_file:
+            self.config.save_logs(self.logs_file, incremental=True)
+        if self.tracker:
+            name = str(self.config().get('name', 'sweep'))
+            tag = name + '-trial-' + str(record['trial'].iloc[-1])
+            self.tracker.snapshot(branch='sweeps/' + name, tag=tag,
+                                  files={'runs/' + tag + '.csv': record.to_csv(index=False).encode()})
+        return record
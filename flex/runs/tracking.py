@@ -0,0 +1,368 @@
+from contextlib import contextmanager
+import fnmatch
+import hashlib
+import json
+import os
+import stat
+import struct
+import threading
+import time
+import zlib
+
+from ..lazy import LazyModule
+
+subprocess = LazyModule('subprocess')
+
+
+class GitTracker:
+    '''
+    Track runs as git commits, written as git objects directly in the repository, in this process.
+
+    A snapshot hashes the changed files of the work tree only (by size and mtime, remembered between snapshots),
+    builds the tree, and commits it on a branch, with an optional tag, without checking out the branch,
+    touching the index or changing the current directory. The files ignored by the repository (.gitignore...) are not
+    tracked, as with git add.
+    In a batch, the objects of all the snapshots are written in one pack file instead of one file per object.
+    Refs are updated under a <ref>.lock file as git does. If another tracker committed on the branch since it was read,
+    both commits are merged, so none is lost.
+    '''
+    types = {'commit': 1, 'tree': 2, 'blob': 3, 'tag': 4}
+    # Seconds to wait for a ref locked by another tracker
+    lock_timeout = 60
+
+    def __init__(self,
+                 repo_path: str,
+                 git_dir: str=None,
+                 exclude: list=None,
+                 author_name: str='flex',
+                 author_email: str='flex@localhost'):
+        """
+
+        :param repo_path: work tree to snapshot
+        :type repo_path: str
+        :param git_dir: the repository, e.g. a bare one. Default: repo_path/.git
+        :type git_dir: str
+        :param exclude: glob patterns of the file and directory names not tracked, besides the ones ignored by the repository.
+        Default: .git, __pycache__, *.pyc
+        :type exclude: list
+        :param author_name: author and committer of the commits
+        :param author_email:
+        """
+        self.repo_path = repo_path
+        self.git_dir = git_dir if git_dir else os.path.join(repo_path, '.git')
+        self.exclude = exclude if exclude is not None else ['.git', '__pycache__', '*.pyc']
+        self.author_name = author_name
+        self.author_email = author_email
+        self.lock = threading.RLock()
+        # Objects written by this tracker
+        self.known = set()
+        # Objects and refs of the current batch, sha -> (type, content), name -> sha and name -> sha before the batch
+        self.pending = None
+        self.pending_refs = None
+        self.pending_old = None
+        # Tree of the commits of this tracker, to merge them
+        self.trees = {}
+        # path -> [mtime_ns, size, blob sha], to hash only the changed files
+        self.stat_file = os.path.join(self.git_dir, 'flex-stat-cache.json')
+        try:
+            with open(self.stat_file) as f:
+                self.stats = json.load(f)
+        except (OSError, ValueError):
+            self.stats = {}
+
+    def snapshot(self, branch: str, tag: str=None, message: str=None, files: dict=None) -> str:
+        """
+        Commit the work tree on branch, with the current branch commit as parent
+        :param branch: created if missing
+        :param tag: lightweight tag of the commit
+        :param message: commit message. Default: tag, or the branch
+        :param files: extra files, path in the tree -> bytes, e.g. the run config, not written to the work tree
+        :return: the commit sha
+        :rtype: str
+        """
+        with self.lock:
+            root = self.scan()
+            for path, content in (files or {}).items():
+                node = root
+                parts = path.replace(os.sep, '/').split('/')
+                for part in parts[:-1]:
+                    node = node.setdefault(part, {})
+                node[parts[-1]] = ('100644', self.write('blob', content))
+            tree = self.write_tree(root)
+
+            parent = self.ref('refs/heads/' + branch)
+            now = str(int(time.time())) + ' +0000'
+            identity = self.author_name + ' <' + self.author_email + '> ' + now
+            commit = 'tree ' + tree + '\n'
+            if parent:
+                commit += 'parent ' + parent + '\n'
+            commit += 'author ' + identity + '\ncommitter ' + identity + '\n\n' + (message or tag or branch) + '\n'
+            sha = self.write('commit', commit.encode())
+            self.trees[sha] = tree
+
+            self.set_ref('refs/heads/' + branch, sha, old=parent)
+            if tag:
+                self.set_ref('refs/tags/' + tag, sha)
+            if self.pending is None:
+                self.save_stats()
+            return sha
+
+    @contextmanager
+    def batch(self):
+        """
+        Write the objects of the snapshots of the with block in one pack file
+        """
+        with self.lock:
+            nested = self.pending is not None
+            if not nested:
+                self.pending = {}
+                self.pending_refs = {}
+                self.pending_old = {}
+            try:
+                yield self
+            finally:
+                if not nested:
+                    pending, self.pending = self.pending, None
+                    pending_refs, self.pending_refs = self.pending_refs, None
+                    pending_old, self.pending_old = self.pending_old, None
+                    # The pack first, so the refs never point to missing objects
+                    self.write_pack(pending)
+                    for name, sha in pending_refs.items():
+                        self.set_ref(name, sha, old=pending_old[name])
+                    # Only now the cached blobs exist in the repository, a crash before must hash them again
+                    self.save_stats()
+
+    def push(self, remote: str='origin', refs: list=None) -> int:
+        """
+        Push the branches and tags, in one git call
+        :param refs: e.g. ['refs/heads/experiments', 'refs/tags/exp1']. Default: all the branches and tags
+        :return: the git exit code
+        :rtype: int
+        """
+        refs = refs if refs else ['refs/heads/*:refs/heads/*', 'refs/tags/*:refs/tags/*']
+        return subprocess.call(['git', '--git-dir', self.git_dir, 'push', '-f', remote] + refs)
+
+    def files(self) -> list:
+        """
+        :return: paths in the work tree of the files to track, / separated: the files not ignored by the repository
+        (.gitignore, info/exclude...), listed by git in one call, nor by exclude
+        :rtype: list
+        """
+        output = subprocess.check_output(['git', '--git-dir', os.path.abspath(self.git_dir), '--work-tree', '.',
+                                          'ls-files', '--cached', '--others', '--exclude-standard', '-z'],
+                                         cwd=self.repo_path)
+        paths = []
+        for path in os.fsdecode(output).split('\0'):
+            # Directories are nested repositories
+            if not path or path.endswith('/'):
+                continue
+            if any(fnmatch.fnmatch(part, pattern) for part in path.split('/') for pattern in self.exclude):
+                continue
+            paths.append(path)
+        return paths
+
+    def scan(self) -> dict:
+        """
+        :return: name -> (mode, blob sha) for files, name -> dict for directories
+        :rtype: dict
+        """
+        tree = {}
+        for path in self.files():
+            parts = path.split('/')
+            file = os.path.join(self.repo_path, *parts)
+            try:
+                info = os.lstat(file)
+            except OSError:
+                # In the index, but deleted
+                continue
+            if not stat.S_ISREG(info.st_mode):
+                continue
+            node = tree
+            for part in parts[:-1]:
+                node = node.setdefault(part, {})
+            mode = '100755' if info.st_mode & 0o111 else '100644'
+            cached = self.stats.get(file)
+            if cached and cached[0] == info.st_mtime_ns and cached[1] == info.st_size:
+                node[parts[-1]] = (mode, cached[2])
+                continue
+            with open(file, 'rb') as f:
+                sha = self.write('blob', f.read())
+            self.stats[file] = [info.st_mtime_ns, info.st_size, sha]
+            node[parts[-1]] = (mode, sha)
+        return tree
+
+    def write_tree(self, tree: dict) -> str:
+        entries = []
+        for name, node in tree.items():
+            if isinstance(node, dict):
+                entries.append((name + '/', b'40000 ' + name.encode() + b'\0' + bytes.fromhex(self.write_tree(node))))
+            else:
+                mode, sha = node
+                entries.append((name, mode.encode() + b' ' + name.encode() + b'\0' + bytes.fromhex(sha)))
+        # git sorts the directories as if their name ended with /
+        return self.write('tree', b''.join(entry for _, entry in sorted(entries)))
+
+    def write(self, type: str, content: bytes) -> str:
+        """
+        Write a git object, loose or in the pending batch
+        :return: its sha
+        :rtype: str
+        """
+        data = type.encode() + b' ' + str(len(content)).encode() + b'\0' + content
+        sha = hashlib.sha1(data).hexdigest()
+        if sha in self.known:
+            return sha
+
+        if self.pending is not None:
+            self.pending[sha] = (type, content)
+        else:
+            path = os.path.join(self.git_dir, 'objects', sha[:2], sha[2:])
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.write_file(path, zlib.compress(data))
+        self.known.add(sha)
+        return sha
+
+    def write_pack(self, objects: dict):
+        """
+        Write the objects in a pack file, with its version 2 index
+        """
+        if not objects:
+            return
+        pack = [b'PACK' + struct.pack('>II', 2, len(objects))]
+        offset = len(pack[0])
+        entries = []
+        for sha, (type, content) in objects.items():
+            # Type and size header: 3 bits of type, then the size 4 bits then 7 bits per byte
+            size = len(content)
+            header = bytearray([(self.types[type] << 4) | (size & 0x0f)])
+            size >>= 4
+            while size:
+                header[-1] |= 0x80
+                header.append(size & 0x7f)
+                size >>= 7
+            entry = bytes(header) + zlib.compress(content)
+            entries.append((bytes.fromhex(sha), zlib.crc32(entry), offset))
+            pack.append(entry)
+            offset += len(entry)
+        pack = b''.join(pack)
+        pack_sha = hashlib.sha1(pack).digest()
+        pack += pack_sha
+
+        entries.sort()
+        fanout = [0] * 256
+        for sha, _, _ in entries:
+            fanout[sha[0]] += 1
+        index = [b'\xfftOc', struct.pack('>I', 2)]
+        total = 0
+        for count in fanout:
+            total += count
+            index.append(struct.pack('>I', total))
+        index += [sha for sha, _, _ in entries]
+        index += [struct.pack('>I', crc) for _, crc, _ in entries]
+        index += [struct.pack('>I', offset) for _, _, offset in entries]
+        index.append(pack_sha)
+        index = b''.join(index)
+        index += hashlib.sha1(index).digest()
+
+        pack_path = os.path.join(self.git_dir, 'objects', 'pack')
+        os.makedirs(pack_path, exist_ok=True)
+        name = os.path.join(pack_path, 'pack-' + pack_sha.hex())
+        # The pack first, git looks up objects from the index
+        self.write_file(name + '.pack', pack)
+        self.write_file(name + '.idx', index)
+
+    def ref(self, name: str) -> str:
+        """
+        :return: the sha of the ref, None if missing
+        :rtype: str
+        """
+        if self.pending_refs and name in self.pending_refs:
+            return self.pending_refs[name]
+        return self.read_ref(name)
+
+    def read_ref(self, name: str) -> str:
+        """
+        :return: the sha of the ref in the repository, None if missing
+        :rtype: str
+        """
+        try:
+            with open(os.path.join(self.git_dir, name)) as f:
+                return f.read().strip()
+        except OSError:
+            pass
+        try:
+            with open(os.path.join(self.git_dir, 'packed-refs')) as f:
+                for line in f:
+                    if line.strip().endswith(' ' + name):
+                        return line.split()[0]
+        except OSError:
+            pass
+        return None
+
+    def set_ref(self, name: str, sha: str, old: str=None):
+        """
+        :param old: the branch commit sha read before committing sha on it, None for a new branch or a tag.
+        If the branch moved since, it's set to a merge of both commits
+        """
+        if self.pending is not None:
+            # Set at the end of the batch, after the pack is written
+            self.pending_refs[name] = sha
+            self.pending_old.setdefault(name, old)
+            return
+        path = os.path.join(self.git_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        lock_path = path + '.lock'
+        fd = self.lock_ref(lock_path)
+        try:
+            current = self.read_ref(name)
+            if name.startswith('refs/heads/') and current and current != old:
+                # Another tracker committed on the branch
+                sha = self.merge(name, current, sha)
+            os.write(fd, (sha + '\n').encode())
+            os.close(fd)
+            fd = None
+            os.replace(lock_path, path)
+        except BaseException:
+            if fd is not None:
+                os.close(fd)
+            os.remove(lock_path)
+            raise
+
+    def lock_ref(self, lock_path: str) -> int:
+        """
+        Create the lock file of a ref, waiting for the other trackers to release it
+        :return: its file descriptor
+        :rtype: int
+        """
+        deadline = time.time() + self.lock_timeout
+        while True:
+            try:
+                return os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            except FileExistsError:
+                if time.time() > deadline:
+                    raise TimeoutError(lock_path + ' is locked. Remove it if no other process is tracking runs.')
+                time.sleep(0.01)
+
+    def merge(self, name: str, current: str, sha: str) -> str:
+        """
+        Commit the tree of sha with both commits as parents
+        :return: the merge commit sha
+        :rtype: str
+        """
+        now = str(int(time.time())) + ' +0000'
+        identity = self.author_name + ' <' + self.author_email + '> ' + now
+        commit = 'tree ' + self.trees[sha] + '\nparent ' + current + '\nparent ' + sha + '\n' + \
+                 'author ' + identity + '\ncommitter ' + identity + '\n\nMerge ' + name + '\n'
+        return self.write('commit', commit.encode())
+
+    def save_stats(self):
+        self.write_file(self.stat_file, json.dumps(self.stats).encode())
+
+    @staticmethod
+    def write_file(path: str, content: bytes):
+        # Write in a temp file then rename, so git never reads a partial file
+        tmp_path = path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
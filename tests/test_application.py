@@ -0,0 +1,204 @@
+from unittest import TestCase
+from flex.flex.config import Configuration
+from flex.flex.data import BaseDataLoader, BaseDataPreprocessor, RawData, Data
+from flex.flex.models import BaseModel
+from flex.flex.runs import Application, StageMonitor, CProfiler, SamplingProfiler
+import numpy as np
+import pandas as pd
+import time
+import asyncio
+import os
+import pstats
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Loader(BaseDataLoader):
+    def load_data(self, *args, **kwargs) -> RawData:
+        return RawData(x=list(range(10)), y=[0] * 10)
+
+
+class ChunkLoader(Loader):
+    def load_chunks(self, chunk_size: int, *args, **kwargs):
+        for start in range(0, 10, chunk_size):
+            stop = min(start + chunk_size, 10)
+            yield RawData(x=list(range(start, stop)), y=[0] * (stop - start))
+
+
+class SlowLoader(ChunkLoader):
+    def load_chunks(self, chunk_size: int, *args, **kwargs):
+        for chunk in super().load_chunks(chunk_size):
+            time.sleep(0.05)
+            if self.config()['name'] == 'fail':
+                raise IOError('Chunk not found')
+            yield chunk
+
+
+class AsyncLoader(Loader):
+    async def aload_data(self, *args, **kwargs) -> RawData:
+        await asyncio.sleep(0.2)
+        return self.load_data()
+
+
+class Preprocessor(BaseDataPreprocessor):
+    def preprocess_data(self, data: RawData, *args, **kwargs) -> Data:
+        return Data(x=np.array(data.x, dtype=float), y=np.array(data.y))
+
+
+class SlowPreprocessor(Preprocessor):
+    def preprocess_data(self, data: RawData, *args, **kwargs) -> Data:
+        time.sleep(0.05)
+        return super().preprocess_data(data)
+
+
+class Model(BaseModel):
+    def build(self, *args, **kwargs):
+        pass
+
+    def load(self, *args, **kwargs):
+        self.loads = getattr(self, 'loads', 0) + 1
+        self.batch_sizes = []
+
+    def save(self, *args, **kwargs):
+        pass
+
+    def predict(self, data, *args, **kwargs):
+        self.batch_sizes.append(len(data))
+        return data.x * 2
+
+
+class TestApplication(TestCase):
+
+    def setUp(self):
+        self.config = Configuration(config={'name': 'app'}, logs=pd.DataFrame())
+
+    def test_stream(self):
+        """
+        Test streaming the chunks from the loader through the model in batches
+        :return: Expected the same results as run(), predicted in batches not bigger than batch_size
+        :rtype:
+        """
+        for loader in [Loader, ChunkLoader]:
+            model = Model(self.config)
+            app = Application(loader(self.config), Preprocessor(self.config), model, self.config)
+            results = app.stream(chunk_size=4, batch_size=3)
+
+            self.assertTrue(np.array_equal(np.concatenate(list(results)), app.run()))
+            self.assertEqual(model.loads, 2)
+
+            list(app.stream(chunk_size=4, batch_size=3))
+            self.assertEqual(model.batch_sizes, [3, 1, 3, 1, 2])
+
+    def test_stream_pipeline(self):
+        """
+        Test running the stages concurrently
+        :return: Expected the same results in less time than running the stages one after the other
+        :rtype:
+        """
+        model = Model(self.config)
+        app = Application(SlowLoader(self.config), SlowPreprocessor(self.config), model, self.config)
+
+        start = time.time()
+        results = list(app.stream(chunk_size=1))
+        sequential_time = time.time() - start
+
+        start = time.time()
+        pipelined_results = list(app.stream(chunk_size=1, pipeline=True))
+        pipelined_time = time.time() - start
+
+        self.assertTrue(np.array_equal(np.concatenate(results), np.concatenate(pipelined_results)))
+        self.assertLess(pipelined_time, 0.8 * sequential_time)
+
+        # Stop early
+        results = app.stream(chunk_size=1, pipeline=True)
+        next(results)
+        results.close()
+
+    def test_stream_pipeline_error(self):
+        """
+        Test failing in a background stage
+        :return: Expected the loader error
+        :rtype:
+        """
+        config = Configuration(config={'name': 'fail'}, logs=pd.DataFrame())
+        app = Application(SlowLoader(config), Preprocessor(config), Model(config), config)
+        with self.assertRaises(IOError):
+            list(app.stream(chunk_size=1, pipeline=True))
+
+    def test_arun(self):
+        """
+        Test running many apps concurrently on the event loop, with async and sync plugins
+        :return: Expected the same results as run(), with the loaders I/O overlapping
+        :rtype:
+        """
+        apps = [Application(AsyncLoader(self.config), Preprocessor(self.config), Model(self.config), self.config)
+                for _ in range(10)]
+
+        async def run_all():
+            return await asyncio.gather(*[app.arun() for app in apps])
+
+        start = time.time()
+        results = asyncio.run(run_all())
+        self.assertLess(time.time() - start, 1)
+        for result in results:
+            self.assertTrue(np.array_equal(result, apps[0].run()))
+
+    def test_stage_metrics(self):
+        """
+        Test measuring the run stages
+        :return: Expected the time, CPU time and memory of each stage in the config, overwritten by the next run
+        :rtype:
+        """
+        app = Application(Loader(self.config), SlowPreprocessor(self.config), Model(self.config), self.config,
+                          monitor=StageMonitor(trace_memory=True))
+        app.run()
+        app.run()
+
+        config = self.config()
+        for stage in ['load_data', 'preprocess_data', 'load', 'predict']:
+            for metric in ['_time', '_cpu_time', '_process_peak_rss', '_traced_delta', '_traced_peak']:
+                self.assertIn(stage + metric, config.index)
+        self.assertGreaterEqual(config['preprocess_data_time'], 0.05)
+        self.assertEqual(list(self.config.data_mgr.config.columns).count('predict_time'), 1)
+
+    def test_stage_metrics_threads(self):
+        """
+        Test logging the stages metrics of apps running in several threads on the same config
+        :return: Expected every run to log its metrics in the single config record
+        :rtype:
+        """
+        apps = [Application(Loader(self.config), Preprocessor(self.config), Model(self.config), self.config)
+                for _ in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda app: [app.run() for _ in range(20)], apps))
+
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len(self.config.logs), 1)
+        self.assertEqual(len(self.config.data_mgr.edits), 8 * 20)
+        self.assertIn('predict_process_peak_rss', self.config().index)
+
+    def test_profile(self):
+        """
+        Test profiling the run stages
+        :return: Expected one profile file per run, with the profiled stages, logged in the config
+        :rtype:
+        """
+        with tempfile.TemporaryDirectory() as path:
+            app = Application(Loader(self.config), SlowPreprocessor(self.config), Model(self.config), self.config,
+                              monitor=StageMonitor(profiler=CProfiler(path=path)))
+            app.run()
+            profile_file = self.config()['profile_file']
+            self.assertEqual(os.path.dirname(profile_file), path)
+            functions = [function for _, _, function in pstats.Stats(profile_file).stats]
+            self.assertIn('preprocess_data', functions)
+
+            app.run()
+            self.assertNotEqual(self.config()['profile_file'], profile_file)
+            self.assertEqual(len(os.listdir(path)), 2)
+
+            app.monitor = StageMonitor(profiler=SamplingProfiler(path=path, stages=['preprocess_data'], interval=0.001))
+            app.run()
+            with open(self.config()['profile_file']) as f:
+                stacks = f.read()
+            self.assertIn('preprocess_data', stacks)
+            self.assertNotIn('predict', stacks)
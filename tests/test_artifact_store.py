@@ -0,0 +1,131 @@
+from unittest import TestCase
+from flex.flex.config import Configuration
+from flex.flex.models import ArtifactStore, BaseModel
+from flex.flex.runs import Experiment
+from .test_experiment import Loader, Preprocessor, Learner
+import numpy as np
+import pandas as pd
+import os
+import pickle
+import tempfile
+
+
+class SavedModel(BaseModel):
+    def build(self, *args, **kwargs):
+        self.weight = 0.
+
+    def load(self, *args, **kwargs):
+        with open(self.config()['model_file'], 'rb') as f:
+            self.weight = pickle.load(f)
+
+    def save(self, *args, **kwargs):
+        with open(self.config()['model_file'], 'wb') as f:
+            pickle.dump(self.weight, f)
+
+    def predict(self, data, *args, **kwargs):
+        return data.x * self.weight
+
+
+class TestArtifactStore(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = ArtifactStore(os.path.join(self.dir.name, 'artifacts'), avg_chunk_size=2 ** 12)
+        self.data = np.random.default_rng(0).integers(0, 256, size=2 ** 18, dtype=np.uint8).tobytes()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.dir.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_dedup(self):
+        """
+        Test storing an artifact, the same one again, then an edited copy
+        :return: Expected the same ID and no new chunk for the same content, and only the chunks around the edit stored
+        :rtype:
+        """
+        first = self.store.put(self.write('model.bin', self.data))
+        self.assertEqual(self.store.stats['new_bytes'], len(self.data))
+        chunks = self.store.stats['chunks']
+        self.assertGreater(chunks, 10)
+
+        self.assertEqual(self.store.put(self.write('copy.bin', self.data)), first)
+        self.assertEqual(self.store.stats['new_chunks'], 0)
+
+        # Inserted bytes shift everything after them, only their chunk changes
+        edited = self.data[:100000] + b'edited' + self.data[100000:]
+        second = self.store.put(self.write('model.bin', edited))
+        self.assertNotEqual(second, first)
+        self.assertLessEqual(self.store.stats['new_chunks'], 2)
+        self.assertLess(self.store.stats['new_bytes'], len(edited) / 10)
+
+        self.store.get(first, os.path.join(self.dir.name, 'first.bin'))
+        self.store.get(second, os.path.join(self.dir.name, 'second.bin'))
+        with open(os.path.join(self.dir.name, 'first.bin'), 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+        with open(os.path.join(self.dir.name, 'second.bin'), 'rb') as f:
+            self.assertEqual(f.read(), edited)
+
+    def test_blocks(self):
+        """
+        Test splitting a file read in small blocks, smaller than the rolling hash window and not aligned to the chunks
+        :return: Expected the same chunks as with the file read at once
+        :rtype:
+        """
+        path = self.write('model.bin', self.data)
+        with open(path, 'rb') as f:
+            chunks = list(self.store.split(f))
+        self.assertEqual(b''.join(chunks), self.data)
+        self.assertGreater(len(chunks), 10)
+
+        for block_size in [7, 1000, 2 ** 12 + 1]:
+            self.store.block_size = block_size
+            with open(path, 'rb') as f:
+                self.assertEqual(list(self.store.split(f)), chunks)
+
+    def test_directory(self):
+        """
+        Test storing a directory, read back by a store with another codec
+        :return: Expected the same files restored, the compressible ones stored smaller
+        :rtype:
+        """
+        self.write('model/weights.bin', self.data)
+        self.write('model/config/params.txt', b'lr = 0.1\n' * 10000)
+        artifact = self.store.put(os.path.join(self.dir.name, 'model'))
+        self.assertLess(self.store.stats['stored_bytes'], self.store.stats['bytes'])
+
+        ArtifactStore(self.store.path, codec='none').get(artifact, os.path.join(self.dir.name, 'restored'))
+        with open(os.path.join(self.dir.name, 'restored', 'weights.bin'), 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+        with open(os.path.join(self.dir.name, 'restored', 'config', 'params.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'lr = 0.1\n' * 10000)
+
+    def test_experiment(self):
+        """
+        Test saving and loading the model of an Experiment with an artifact store
+        :return: Expected the model artifact referenced in the saved config, and the model file restored on load
+        :rtype:
+        """
+        model_file = os.path.join(self.dir.name, 'model.pkl')
+        config = Configuration(config={'model_file': model_file, 'test_size': 0}, logs=pd.DataFrame())
+        experiment = Experiment(loader=Loader(config), preprocessor=Preprocessor(config), model=SavedModel(config),
+                                learner=Learner(config), config=config, performance_file=None, artifacts=self.store)
+        experiment.model.build()
+        experiment.learner.train(train_data=Preprocessor(config).preprocess_data(Loader(config).load_data()),
+                                 model=experiment.model)
+        weight = experiment.model.weight
+        experiment.save(config_file=os.path.join(self.dir.name, 'config.csv'))
+
+        artifact = config()['model_artifact']
+        self.assertGreater(config()['model_artifact_new_bytes'], 0)
+        self.assertEqual(pd.read_csv(os.path.join(self.dir.name, 'config.csv'))['model_artifact'].iloc[-1], artifact)
+
+        os.remove(model_file)
+        experiment.model.weight = None
+        experiment.load_model()
+        self.assertEqual(experiment.model.weight, weight)
@@ -1,5 +1,19 @@
 from unittest import TestCase
 from flex.flex.config import Configuration
+import pandas as pd
+import tempfile
+import os
+import multiprocessing
+import pickle
+
+
+def log_runs(file, worker, runs):
+    # Each worker loads the history once, then logs its runs to the shared file
+    cfg = Configuration(config={'name': 'worker' + str(worker) + '_run0'}, logs=file if os.path.exists(file) else None)
+    cfg.save_logs(file, shared=True)
+    for run in range(1, runs):
+        cfg.config = {'name': 'worker' + str(worker) + '_run' + str(run), 'worker': worker}
+        cfg.save_logs(file, shared=True)
 
 class TestConfiguration(TestCase):
     def test_save_config(self):
@@ -42,3 +56,154 @@ class TestConfiguration(TestCase):
 
     def test_df_to_exp_attribs(self):
         self.fail()
+
+    def test_save_logs_incremental(self):
+        """
+        Test saving the logs incrementally, with a new column in the middle
+        :return: Expected the saved file to have the same records as a full save
+        :rtype:
+        """
+        tmp_dir = tempfile.mkdtemp()
+        for ext in ['csv', 'jsonl']:
+            file = os.path.join(tmp_dir, 'logs.' + ext)
+            cfg = Configuration(config={'name': 'exp0', 'lr': 0.1}, logs=pd.DataFrame())
+            cfg.save_logs(file, incremental=True)
+            cfg.append_logs(pd.DataFrame({'name': 'exp1', 'lr': 0.2}, index=[0]))
+            cfg.save_logs(file, incremental=True)
+            cfg.save_logs(file, incremental=True)
+            cfg.append_logs(pd.DataFrame({'name': 'exp2', 'acc': 0.9}, index=[0]))
+            cfg.save_logs(file, incremental=True)
+
+            full_file = os.path.join(tmp_dir, 'full_logs.' + ext)
+            cfg.save_logs(full_file)
+            self.assertTrue(pd.read_csv(file, index_col=0).equals(pd.read_csv(full_file, index_col=0))
+                            if ext == 'csv' else
+                            pd.read_json(file, lines=True).equals(pd.read_json(full_file, lines=True)))
+            self.assertEqual(len(cfg.logs), 3)
+
+    def test_save_logs_incremental_after_load(self):
+        """
+        Test appending the new records to the same logs file they were loaded from
+        :return: Expected the old records and the new config record in the file
+        :rtype:
+        """
+        file = os.path.join(tempfile.mkdtemp(), 'logs.jsonl')
+        pd.DataFrame({'name': ['exp0', 'exp1'], 'lr': [0.1, 0.2]}).to_json(file, orient='records', lines=True)
+
+        cfg = Configuration(config={'name': 'exp2', 'lr': 0.3}, logs=file)
+        cfg.save_logs(file, incremental=True)
+        self.assertEqual(list(pd.read_json(file, lines=True)['name']), ['exp0', 'exp1', 'exp2'])
+
+        # Editing an already saved record needs a full save
+        cfg.add_config_attribs({'acc': 0.9})
+        cfg.save_logs(file, incremental=True)
+        logs_df = pd.read_json(file, lines=True)
+        self.assertEqual(len(logs_df), 3)
+        self.assertEqual(logs_df['acc'].iloc[-1], 0.9)
+
+    def test_compact_logs(self):
+        """
+        Test compacting the incrementally saved logs into another format
+        :return: Expected the compacted file to have all the records
+        :rtype:
+        """
+        tmp_dir = tempfile.mkdtemp()
+        cfg = Configuration(config={'name': 'exp0', 'lr': 0.1}, logs=pd.DataFrame())
+        cfg.save_logs(os.path.join(tmp_dir, 'logs.jsonl'), incremental=True)
+        cfg.append_logs(pd.DataFrame({'name': 'exp1', 'lr': 0.2}, index=[0]))
+        cfg.save_logs(os.path.join(tmp_dir, 'logs.jsonl'), incremental=True)
+
+        cfg.compact_logs(os.path.join(tmp_dir, 'logs.jsonl'), os.path.join(tmp_dir, 'logs.csv'))
+        self.assertEqual(list(pd.read_csv(os.path.join(tmp_dir, 'logs.csv'), index_col=0)['name']), ['exp0', 'exp1'])
+
+    def test_load_logs_columns_filters(self):
+        """
+        Test loading only some columns and rows of the logs, for all the supported types
+        :return: Expected only the selected columns and the rows matching the filters
+        :rtype:
+        """
+        tmp_dir = tempfile.mkdtemp()
+        logs_df = pd.DataFrame({'name': ['exp0', 'exp1', 'exp2'],
+                                'lr': [0.1, 0.2, 0.3],
+                                'val_acc': [0.5, 0.9, 0.7],
+                                'comment': ['a', 'b', 'c']})
+        for ext in ['csv', 'jsonl', 'pkl', 'parquet', 'feather']:
+            file = os.path.join(tmp_dir, 'logs.' + ext)
+            cfg = Configuration(config={}, logs=logs_df)
+            cfg.save_logs(file)
+
+            cfg.load_logs(file, columns=['name', 'lr'], filters=[('val_acc', '>', 0.6)])
+            self.assertEqual(list(cfg.logs.columns), ['name', 'lr'])
+            self.assertEqual(list(cfg.logs['name']), ['exp1', 'exp2'])
+
+            # Only filters: all the columns
+            cfg.load_logs(file, filters=[('val_acc', '>', 0.6)])
+            self.assertEqual(list(cfg.logs.columns), ['name', 'lr', 'val_acc', 'comment'])
+            self.assertEqual(list(cfg.logs['name']), ['exp1', 'exp2'])
+
+    def test_save_logs_incremental_parquet(self):
+        """
+        Test appending parquet parts and compacting them
+        :return: Expected all the records in one parquet file after compaction
+        :rtype:
+        """
+        file = os.path.join(tempfile.mkdtemp(), 'logs.parquet')
+        cfg = Configuration(config={'name': 'exp0', 'lr': 0.1}, logs=pd.DataFrame())
+        cfg.save_logs(file)
+        cfg.append_logs(pd.DataFrame({'name': 'exp1', 'acc': 0.9}, index=[0]))
+        cfg.save_logs(file, incremental=True)
+        self.assertTrue(os.path.isdir(file))
+        self.assertEqual(list(pd.read_parquet(os.path.join(file, 'part-00001.parquet'))['name']), ['exp1'])
+
+        cfg.compact_logs(file)
+        self.assertTrue(os.path.isfile(file))
+        self.assertEqual(list(pd.read_parquet(file, columns=['name', 'acc'])['name']), ['exp0', 'exp1'])
+
+    def test_save_logs_shared(self):
+        """
+        Test many processes logging to the same files
+        :return: Expected no lost records
+        :rtype:
+        """
+        tmp_dir = tempfile.mkdtemp()
+        for ext in ['csv', 'jsonl', 'json', 'pkl']:
+            file = os.path.join(tmp_dir, 'logs.' + ext)
+            workers = [multiprocessing.Process(target=log_runs, args=(file, worker, 5)) for worker in range(8)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            self.assertEqual([worker.exitcode for worker in workers], [0] * len(workers))
+
+            cfg = Configuration(config={}, logs=file)
+            self.assertEqual(sorted(cfg.logs['name']),
+                             sorted('worker' + str(worker) + '_run' + str(run) for worker in range(8) for run in range(5)))
+
+    def test_config_view(self):
+        """
+        Test the cached config view across edits and pickling
+        :return: Expected the same view until the config is edited or set, with the column types kept
+        :rtype:
+        """
+        cfg = Configuration(config={'name': 'exp0', 'lr': 0.1, 'batch_size': 32}, logs=pd.DataFrame())
+        view = cfg()
+        self.assertIs(cfg(), view)
+        self.assertEqual(view.name, 'exp0')
+        self.assertEqual(view['batch_size'], 32)
+        self.assertIsInstance(view['batch_size'], int)
+        self.assertIn('lr', view.index)
+        with self.assertRaises(TypeError):
+            view.lr = 0.2
+        with self.assertRaises(AttributeError):
+            view.missing
+
+        cfg.add_config_attribs({'lr': 0.2, 'acc': 0.9})
+        self.assertEqual((cfg().lr, cfg().acc), (0.2, 0.9))
+        self.assertEqual(view.lr, 0.1)
+
+        cfg.config = {'name': 'exp1'}
+        self.assertEqual(cfg().to_dict(), {'name': 'exp1'})
+
+        copy = pickle.loads(pickle.dumps(cfg))
+        self.assertEqual(copy().to_dict(), {'name': 'exp1'})
+        self.assertEqual(pickle.loads(pickle.dumps(cfg())), cfg())
@@ -0,0 +1,115 @@
+from unittest import TestCase
+from flex.flex.config import Configuration
+from flex.flex.data import BaseDataLoader, BaseDataPreprocessor, RawData, Data, DataCache
+from flex.flex.models import BaseModel
+from flex.flex.runs import Application
+import numpy as np
+import pandas as pd
+import tempfile
+
+
+class Loader(BaseDataLoader):
+    config_keys = ['size']
+    calls = 0
+
+    def load_data(self, *args, **kwargs) -> RawData:
+        Loader.calls += 1
+        size = int(self.config()['size'])
+        return RawData(x=list(range(size)), y=list(range(size)))
+
+
+class Preprocessor(BaseDataPreprocessor):
+    config_keys = ['scale']
+
+    def preprocess_data(self, data: RawData, *args, **kwargs) -> Data:
+        return Data(x=np.array(data.x) * self.config()['scale'], y=np.array(data.y))
+
+
+class ConfigLoader(Loader):
+    # Depends on the whole config
+    config_keys = None
+
+
+class ConfigPreprocessor(Preprocessor):
+    config_keys = None
+
+
+class Model(BaseModel):
+    def build(self, *args, **kwargs):
+        pass
+
+    def load(self, *args, **kwargs):
+        pass
+
+    def save(self, *args, **kwargs):
+        pass
+
+    def predict(self, data, *args, **kwargs):
+        return data.x
+
+
+class TestDataCache(TestCase):
+
+    def setUp(self):
+        Loader.calls = 0
+
+    def load(self, cache, **config):
+        config = Configuration(config=config, logs=pd.DataFrame())
+        return cache.load(Loader(config), Preprocessor(config))
+
+    def test_load(self):
+        """
+        Test loading the same data config twice
+        :return: Expected the data loaded once, then memory mapped from the cache
+        :rtype:
+        """
+        cache = DataCache(tempfile.mkdtemp())
+        data = self.load(cache, size=10, scale=2, lr=0.1)
+        cached = self.load(cache, size=10, scale=2, lr=0.2)
+
+        self.assertEqual(Loader.calls, 1)
+        self.assertIsInstance(cached.x, np.memmap)
+        self.assertTrue(np.array_equal(data.x, cached.x))
+        self.assertTrue(np.array_equal(data.y, cached.y))
+
+        # Changed data config
+        self.load(cache, size=10, scale=3, lr=0.1)
+        self.assertEqual(Loader.calls, 2)
+
+    def test_evict(self):
+        """
+        Test evicting when the cache is full
+        :return: Expected the least recently used entry to be loaded again
+        :rtype:
+        """
+        cache = DataCache(tempfile.mkdtemp(), max_size=2 * 2 * (128 + 100 * 8))
+        self.load(cache, size=100, scale=1)
+        self.load(cache, size=100, scale=2)
+        self.load(cache, size=100, scale=1)
+        self.load(cache, size=100, scale=3)
+        self.assertEqual(Loader.calls, 3)
+
+        # scale=1 was used more recently than scale=2
+        self.load(cache, size=100, scale=1)
+        self.assertEqual(Loader.calls, 3)
+        self.load(cache, size=100, scale=2)
+        self.assertEqual(Loader.calls, 4)
+
+    def test_run_metrics(self):
+        """
+        Test running the same app several times, with plugins depending on the whole config
+        :return: Expected the data loaded once, the metrics logged by the runs not changing the key
+        :rtype:
+        """
+        cache = DataCache(tempfile.mkdtemp())
+        config = Configuration(config={'size': 10, 'scale': 2}, logs=pd.DataFrame())
+        app = Application(ConfigLoader(config), ConfigPreprocessor(config), Model(config), config, cache=cache)
+        for _ in range(3):
+            self.assertTrue(np.array_equal(app.run(), np.arange(10) * 2))
+
+        self.assertIn('load_data_time', config().index)
+        self.assertEqual(Loader.calls, 1)
+
+        config.add_config_attribs({'scale': 3})
+        self.assertTrue(np.array_equal(app.run(), np.arange(10) * 3))
+        self.assertEqual(Loader.calls, 2)
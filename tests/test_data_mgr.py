@@ -0,0 +1,140 @@
+from unittest import TestCase
+from flex.flex.config import DataMgr
+import pandas as pd
+
+
+class TestDataMgr(TestCase):
+
+    def test_append_buffered(self):
+        """
+        Test appending many records, crossing the chunk boundary
+        :return: Expected logs to be the same as concatenating all the records at once
+        :rtype:
+        """
+        records = [pd.DataFrame({'name': 'exp' + str(i), 'lr': 0.1 * i}, index=[0]) for i in range(10)]
+        records.append(pd.DataFrame({'name': 'exp10', 'acc': 0.9}, index=[0]))
+
+        data_mgr = DataMgr()
+        data_mgr.chunk_size = 4
+        for record in records:
+            data_mgr.append(record)
+
+        expected = pd.concat(records, sort=False, ignore_index=True)
+        self.assertTrue(expected.equals(data_mgr.logs))
+
+        # Reading again doesn't change the logs
+        self.assertTrue(expected.equals(data_mgr.logs))
+
+    def test_tail(self):
+        """
+        Test getting the new records, buffered in chunks and pending records
+        :return: Expected the records from start on, indexed by position, without folding the buffers
+        :rtype:
+        """
+        logs = pd.DataFrame({'name': ['exp0', 'exp1', 'exp2'], 'lr': [0.0, 0.1, 0.2]})
+        records = [pd.DataFrame({'name': 'exp' + str(i), 'lr': 0.1 * i}, index=[0]) for i in range(3, 13)]
+
+        data_mgr = DataMgr(logs=logs)
+        data_mgr.chunk_size = 4
+        for record in records:
+            data_mgr.append(record)
+        chunks, pending = len(data_mgr.chunks), len(data_mgr.pending)
+
+        expected = pd.concat([logs] + records, sort=False, ignore_index=True)
+        for start in range(3, 13):
+            self.assertTrue(expected.iloc[start:].equals(data_mgr.tail(start)))
+        self.assertTrue(data_mgr.tail(13).empty)
+        self.assertEqual((len(data_mgr.chunks), len(data_mgr.pending)), (chunks, pending))
+
+    def test_edit_config_buffered(self):
+        """
+        Test editing the config while the last record is still buffered
+        :return: Expected the last logs record to be updated, without changing the passed config
+        :rtype:
+        """
+        logs = pd.DataFrame({'name': ['exp0', 'exp1'], 'acc': [0.5, 0.6]})
+        config = pd.DataFrame({'name': 'exp2', 'acc': 0.0}, index=[0])
+
+        data_mgr = DataMgr(logs=logs, config=config)
+        data_mgr.edit_config({'lr': 0.1})
+
+        self.assertEqual(len(data_mgr.logs), 3)
+        self.assertEqual(data_mgr.logs.iloc[-1]['name'], 'exp2')
+        self.assertEqual(data_mgr.config.iloc[-1]['lr'], 0.1)
+        self.assertEqual(list(config.columns), ['name', 'acc'])
+
+        # Editing an existing key overwrites it in place
+        data_mgr.edit_config({'acc': 0.7})
+        self.assertEqual(list(data_mgr.config.columns), ['name', 'acc', 'lr'])
+        self.assertEqual(data_mgr.logs.iloc[-1]['acc'], 0.7)
+
+    def test_compact(self):
+        """
+        Test keeping wide, mostly NaN logs compact, and editing the compacted config record
+        :return: Expected less memory with the same values, and the edits applied
+        :rtype:
+        """
+        rows = 1000
+        logs = pd.DataFrame({'name': ['exp' + str(i) for i in range(rows)],
+                             'optimizer': ['adam' if i % 3 else 'sgd' for i in range(rows)],
+                             'epochs': [i % 10 for i in range(rows)]})
+        for key in range(20):
+            logs['param' + str(key)] = [0.5 if i % 20 == key else None for i in range(rows)]
+        config = pd.DataFrame({'name': 'new', 'optimizer': 'adam'}, index=[0])
+
+        data_mgr = DataMgr(logs=logs, config=config, compact=True)
+        memory = data_mgr.memory()
+        self.assertLess(memory['bytes'], memory['dense_bytes'] / 3)
+        self.assertGreater(memory['saving'], 0.6)
+        self.assertIsInstance(data_mgr.logs['param0'].dtype, pd.SparseDtype)
+        self.assertIsInstance(data_mgr.logs['optimizer'].dtype, pd.CategoricalDtype)
+
+        data_mgr.edit_config({'optimizer': 'rmsprop', 'param0': 1.5})
+        dense = data_mgr.dense()
+        self.assertEqual(len(dense), rows + 1)
+        self.assertEqual(dense.iloc[-1]['optimizer'], 'rmsprop')
+        self.assertEqual(dense.iloc[-1]['param0'], 1.5)
+        self.assertFalse(any(isinstance(dtype, (pd.SparseDtype, pd.CategoricalDtype)) for dtype in dense.dtypes))
+        self.assertEqual(list(dense['name'].iloc[:rows]), list(logs['name']))
+        self.assertEqual(dense['param3'].iloc[:rows].sum(), logs['param3'].sum())
+
+    def test_top(self):
+        """
+        Test the leaderboard kept updated while records are appended and the config edited
+        :return: Expected the best records without ranking the logs again
+        :rtype:
+        """
+        data_mgr = DataMgr(logs=pd.DataFrame({'name': ['exp0', 'exp1'], 'acc': [0.5, 0.6]}),
+                           config=pd.DataFrame({'name': 'exp2'}, index=[0]))
+        self.assertEqual(list(data_mgr.top('acc')['name']), ['exp1', 'exp0'])
+
+        leaderboard = data_mgr.leaderboards[('acc', 'max')]
+        data_mgr.edit_config({'acc': 0.85})
+        for i in range(3, 10):
+            data_mgr.append(pd.DataFrame({'name': 'exp' + str(i), 'acc': 0.1 * i}, index=[0]))
+
+        self.assertIs(data_mgr.leaderboards[('acc', 'max')], leaderboard)
+        self.assertEqual(list(data_mgr.top('acc', k=3)['name']), ['exp9', 'exp2', 'exp8'])
+        expected = data_mgr.logs.sort_values('acc', ascending=False, kind='stable')['name'].iloc[:3]
+        self.assertEqual(list(data_mgr.top('acc', k=3)['name']), list(expected))
+
+        # Overwriting the logs ranks them again, with the config record
+        data_mgr.logs = pd.DataFrame({'name': ['exp10'], 'acc': [0.1]})
+        self.assertEqual(list(data_mgr.top('acc')['name']), ['exp2', 'exp10'])
+
+    def test_compact_edit(self):
+        """
+        Test editing existing numeric keys of the config record after the logs are compacted
+        :return: Expected the edited values, even if they don't fit the downcast types
+        :rtype:
+        """
+        logs = pd.DataFrame({'name': ['exp0', 'exp1'], 'acc': [0.5, 0.25], 'epochs': [10, 20]})
+        config = pd.DataFrame({'name': 'exp2', 'acc': 0.5, 'epochs': 5}, index=[0])
+        data_mgr = DataMgr(logs=logs, config=config, compact=True)
+        self.assertEqual(data_mgr.logs['epochs'].dtype, 'int8')
+        self.assertEqual(data_mgr.logs['acc'].dtype, 'float32')
+
+        data_mgr.edit_config({'acc': 0.9123, 'epochs': 100000})
+        self.assertEqual(data_mgr.logs.iloc[-1]['acc'], 0.9123)
+        self.assertEqual(data_mgr.logs.iloc[-1]['epochs'], 100000)
+        self.assertEqual(list(data_mgr.logs['epochs']), [10, 20, 100000])
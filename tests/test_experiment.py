@@ -0,0 +1,259 @@
+from unittest import TestCase
+from flex.flex.config import Configuration
+from flex.flex.data import BaseDataLoader, BaseDataPreprocessor, RawData, Data, DataView
+from flex.flex.models import BaseModel
+from flex.flex.learners import BaseLearner
+from flex.flex.runs import Experiment, StageMonitor, CProfiler, Checkpoint
+import numpy as np
+import pandas as pd
+import os
+import pickle
+import tempfile
+
+
+class Loader(BaseDataLoader):
+    def load_data(self, *args, **kwargs) -> RawData:
+        return RawData(x=list(range(10)), y=[x * 2 + x % 3 for x in range(10)])
+
+
+class Preprocessor(BaseDataPreprocessor):
+    def preprocess_data(self, data: RawData, *args, **kwargs) -> Data:
+        return Data(x=np.array(data.x, dtype=float), y=np.array(data.y, dtype=float))
+
+
+class Model(BaseModel):
+    def build(self, *args, **kwargs):
+        self.weight = 0.
+
+    def load(self, *args, **kwargs):
+        pass
+
+    def save(self, *args, **kwargs):
+        pass
+
+    def predict(self, data, *args, **kwargs):
+        return data.x * self.weight
+
+
+class Learner(BaseLearner):
+    def train(self, model: BaseModel, train_data: Data, *args, **kwargs):
+        model.weight = float(np.mean(train_data.y / np.maximum(train_data.x, 1)))
+
+    def test(self, model: BaseModel, test_data: Data, *args, **kwargs):
+        error = np.abs(model.predict(test_data) - test_data.y).mean()
+        self.config.add_config_attribs({'error': float(error), 'test_samples': len(test_data)})
+
+
+class ThreadLearner(Learner):
+    releases_gil = True
+
+
+class CountingLoader(Loader):
+    loads = 0
+
+    def load_data(self, *args, **kwargs) -> RawData:
+        CountingLoader.loads += 1
+        return super().load_data()
+
+
+class SavedModel(Model):
+    def load(self, *args, **kwargs):
+        with open(self.config()['model_file'], 'rb') as f:
+            self.weight = pickle.load(f)
+
+    def save(self, *args, **kwargs):
+        with open(self.config()['model_file'], 'wb') as f:
+            pickle.dump(self.weight, f)
+
+
+class FailingLearner(Learner):
+    fail = False
+    trains = 0
+
+    def train(self, model: BaseModel, train_data: Data, *args, **kwargs):
+        FailingLearner.trains += 1
+        model.weight = 2.
+
+    def test(self, model: BaseModel, test_data: Data, *args, **kwargs):
+        if FailingLearner.fail:
+            raise ValueError('Test failed')
+        super().test(model, test_data)
+
+
+class SplitLearner(FailingLearner):
+    trained = None
+
+    def train(self, model: BaseModel, train_data: Data, *args, **kwargs):
+        super().train(model, train_data)
+        SplitLearner.trained = set(train_data.x)
+
+    def test(self, model: BaseModel, test_data: Data, *args, **kwargs):
+        super().test(model, test_data)
+        self.config.add_config_attribs({'tested_trained': len(SplitLearner.trained & set(test_data.x))})
+
+
+class TestExperiment(TestCase):
+
+    def setUp(self):
+        self.config = Configuration(config={'name': 'exp'}, logs=pd.DataFrame())
+
+    def test_profile(self):
+        """
+        Test profiling the train stage
+        :return: Expected the profile saved next to the performance file, and its path in the saved config
+        :rtype:
+        """
+        with tempfile.TemporaryDirectory() as path:
+            performance_file = os.path.join(path, 'performance.csv')
+            experiment = Experiment(Loader(self.config), Preprocessor(self.config), Model(self.config),
+                                    Learner(self.config), self.config, performance_file=performance_file,
+                                    monitor=StageMonitor(profiler=CProfiler(stages=['train'])))
+            experiment.run()
+
+            profile_file = self.config()['profile_file']
+            self.assertEqual(os.path.dirname(profile_file), path)
+            self.assertTrue(os.path.exists(profile_file))
+            self.assertEqual(pd.read_csv(performance_file)['profile_file'].iloc[-1], profile_file)
+            self.assertIn('save_config_time', self.config().index)
+
+    def test_split(self):
+        """
+        Test splitting the data in train and test
+        :return: Expected disjoint views of the same data, with test_size of the samples in test
+        :rtype:
+        """
+        self.config.add_config_attribs({'test_size': 0.3, 'seed': 1})
+        data = Preprocessor(self.config).preprocess_data(Loader(self.config).load_data())
+        train_index, test_index = Learner(self.config).split(data)
+
+        self.assertEqual(len(test_index), 3)
+        self.assertEqual(sorted(np.concatenate([train_index, test_index])), list(range(10)))
+        self.assertTrue(np.array_equal(Learner(self.config).split(data)[1], test_index))
+
+        test_data = DataView(data, test_index)
+        self.assertIs(test_data.data, data)
+        self.assertTrue(np.array_equal(test_data.x, data.x[test_index]))
+        self.assertTrue(np.array_equal(test_data[1:].y, data.y[test_index[1:]]))
+
+    def test_cross_validate(self):
+        """
+        Test a 5 folds cross validation, on processes, threads and in process
+        :return: Expected the same per fold and aggregate metrics logged in the config
+        :rtype:
+        """
+        results = []
+        for learner, workers in [(Learner, 2), (ThreadLearner, 2), (Learner, 0)]:
+            config = Configuration(config={'name': 'cv', 'folds': 5, 'seed': 0}, logs=pd.DataFrame())
+            experiment = Experiment(Loader(config), Preprocessor(config), Model(config), learner(config), config,
+                                    performance_file=None, workers=workers)
+            experiment.run()
+
+            record = config()
+            folds = [record['fold' + str(i) + '_error'] for i in range(5)]
+            self.assertAlmostEqual(record['error'], np.mean(folds))
+            self.assertAlmostEqual(record['error_std'], np.std(folds))
+            self.assertEqual(len(set(record['fold' + str(i) + '_test_samples'] for i in range(5))), 1)
+            results.append(folds)
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+
+        # Run again with the metrics of the previous run in the config
+        config.add_config_attribs({'error': -1.})
+        experiment.run()
+        self.assertAlmostEqual(config()['error'], np.mean(results[2]))
+
+    def test_resume(self):
+        """
+        Test running again an experiment failing in test, in a new process and in the same one
+        :return: Expected load_data, preprocess_data and train to be skipped, with the trained model loaded
+        :rtype:
+        """
+        with tempfile.TemporaryDirectory() as path:
+            checkpoint = Checkpoint(os.path.join(path, 'checkpoints'))
+            # Fine tuned from a pretrained model, saved with the checkpoint
+            config = {'name': 'exp', 'model_file': os.path.join(path, 'model.pkl'), 'seed': 0}
+            with open(config['model_file'], 'wb') as f:
+                pickle.dump(0., f)
+
+            def experiment(config):
+                return Experiment(CountingLoader(config), Preprocessor(config), SavedModel(config), FailingLearner(config),
+                                  config, performance_file=None, checkpoint=checkpoint)
+
+            FailingLearner.fail = True
+            first = experiment(Configuration(config=config, logs=pd.DataFrame()))
+            with self.assertRaises(ValueError):
+                first.run()
+            self.assertEqual(CountingLoader.loads, 1)
+            self.assertEqual(FailingLearner.trains, 1)
+
+            # Restarted
+            FailingLearner.fail = False
+            restarted_config = Configuration(config=config, logs=pd.DataFrame())
+            restarted = experiment(restarted_config)
+            restarted.run()
+            self.assertEqual(CountingLoader.loads, 1)
+            self.assertEqual(FailingLearner.trains, 1)
+            self.assertEqual(restarted.model.weight, 2.)
+            self.assertEqual(restarted_config()['checkpoint_id'], first.run_id)
+
+            # Retried in the same process
+            FailingLearner.fail = True
+            retried_config = Configuration(config=dict(config, name='retried'), logs=pd.DataFrame())
+            retried = experiment(retried_config)
+            with self.assertRaises(ValueError):
+                retried.run()
+            FailingLearner.fail = False
+            retried.run()
+            self.assertEqual(CountingLoader.loads, 2)
+            self.assertEqual(FailingLearner.trains, 2)
+
+            # Completed runs are not run again
+            restarted = experiment(Configuration(config=config, logs=pd.DataFrame()))
+            restarted.run()
+            self.assertEqual(FailingLearner.trains, 2)
+            self.assertEqual(restarted.config()['error'], restarted_config()['error'])
+            with open(config['model_file'], 'rb') as f:
+                self.assertEqual(pickle.load(f), 0.)
+
+    def test_resume_split(self):
+        """
+        Test restarting an experiment failing in test, with a shuffled split without seed
+        :return: Expected the restarted test on the samples not trained on
+        :rtype:
+        """
+        with tempfile.TemporaryDirectory() as path:
+            checkpoint = Checkpoint(os.path.join(path, 'checkpoints'))
+            config = {'name': 'exp', 'model_file': os.path.join(path, 'model.pkl'), 'test_size': 0.4}
+            with open(config['model_file'], 'wb') as f:
+                pickle.dump(0., f)
+
+            for fail in [True, False]:
+                FailingLearner.fail = fail
+                restarted_config = Configuration(config=config, logs=pd.DataFrame())
+                experiment = Experiment(Loader(restarted_config), Preprocessor(restarted_config),
+                                        SavedModel(restarted_config), SplitLearner(restarted_config), restarted_config,
+                                        performance_file=None, checkpoint=checkpoint)
+                if fail:
+                    with self.assertRaises(ValueError):
+                        experiment.run()
+                else:
+                    experiment.run()
+
+            self.assertEqual(restarted_config()['tested_trained'], 0)
+            self.assertEqual(len(SplitLearner.trained), 6)
+
+    def test_graph(self):
+        """
+        Test the Experiment stages as a graph
+        :return: Expected the model trained and tested on the split, with the metrics in the config
+        :rtype:
+        """
+        experiment = Experiment(Loader(self.config), Preprocessor(self.config), Model(self.config),
+                                Learner(self.config), self.config, performance_file=None)
+        values = experiment.graph().run()
+
+        self.assertIs(values['trained_model'], experiment.model)
+        self.assertEqual(len(values['train_data']) + len(values['test_data']), 10)
+        self.assertIn('error', self.config().index)
+        self.assertIn('train_time', self.config().index)
@@ -0,0 +1,199 @@
+from unittest import TestCase
+from flex.flex.config import Configuration
+from flex.flex.data import BaseDataLoader, BaseDataPreprocessor, RawData, Data
+from flex.flex.models import BaseModel
+from flex.flex.runs import Application, Graph, StageMonitor, SamplingProfiler
+import numpy as np
+import pandas as pd
+import tempfile
+import threading
+import time
+
+
+class Loader(BaseDataLoader):
+    config_keys = ['size']
+
+    def load_data(self, *args, **kwargs) -> RawData:
+        self.loads = getattr(self, 'loads', 0) + 1
+        size = int(self.config()['size'])
+        return RawData(x=list(range(size)), y=[0] * size)
+
+
+class ScalePreprocessor(BaseDataPreprocessor):
+    config_keys = ['scale']
+
+    def preprocess_data(self, data: RawData, *args, **kwargs) -> Data:
+        time.sleep(0.2)
+        self.runs = getattr(self, 'runs', 0) + 1
+        return Data(x=np.array(data.x, dtype=float) * self.config()['scale'], y=np.array(data.y))
+
+
+class ShiftPreprocessor(ScalePreprocessor):
+    config_keys = ['shift']
+
+    def preprocess_data(self, data: RawData, *args, **kwargs) -> Data:
+        time.sleep(0.2)
+        self.runs = getattr(self, 'runs', 0) + 1
+        return Data(x=np.array(data.x, dtype=float) + self.config()['shift'], y=np.array(data.y))
+
+
+class CountingLoader(BaseDataLoader):
+    loads = 0
+
+    def load_data(self, *args, **kwargs) -> RawData:
+        CountingLoader.loads += 1
+        return RawData(x=list(range(10)), y=[0] * 10)
+
+
+class Model(BaseModel):
+    def build(self, *args, **kwargs):
+        pass
+
+    def load(self, *args, **kwargs):
+        pass
+
+    def save(self, *args, **kwargs):
+        pass
+
+    def predict(self, data, *args, **kwargs):
+        return data.x * 2
+
+
+class TestGraph(TestCase):
+
+    def setUp(self):
+        self.config = Configuration(config={'name': 'graph', 'size': 10, 'scale': 2, 'shift': 1}, logs=pd.DataFrame())
+
+    def ensemble(self, cache_path=None):
+        loader, scale, shift = Loader(self.config), ScalePreprocessor(self.config), ShiftPreprocessor(self.config)
+        graph = Graph(self.config, cache_path=cache_path)
+        graph.add('load_data', loader.load_data, outputs=['raw_data'], plugin=loader)
+        graph.add('scale', scale.preprocess_data, inputs=['raw_data'], outputs=['scaled'], plugin=scale)
+        graph.add('shift', shift.preprocess_data, inputs=['raw_data'], outputs=['shifted'], plugin=shift)
+        graph.add('ensemble', lambda scaled, shifted: (scaled.x + shifted.x) / 2, inputs=['scaled', 'shifted'],
+                  outputs=['x'])
+        return graph, loader, scale, shift
+
+    def test_run(self):
+        """
+        Test running an ensemble of two preprocessors
+        :return: Expected the preprocessors to run in parallel, and only the needed stages to run for an output
+        :rtype:
+        """
+        graph, loader, scale, shift = self.ensemble()
+        start = time.time()
+        values = graph.run()
+        self.assertLess(time.time() - start, 0.35)
+        self.assertTrue(np.array_equal(values['x'], (np.arange(10) * 2 + np.arange(10) + 1) / 2))
+
+        values = graph.run(outputs=['scaled'])
+        self.assertNotIn('shifted', values)
+        self.assertEqual((scale.runs, shift.runs), (2, 1))
+
+        # Passed inputs replace their stages
+        values = graph.run(outputs=['scaled'], raw_data=RawData(x=[1], y=[0]))
+        self.assertEqual(list(values['scaled'].x), [2.])
+        self.assertEqual(loader.loads, 2)
+
+        graph.add('cycle', lambda x: x, inputs=['cycle_x'], outputs=['cycle_y'])
+        graph.add('cycle_back', lambda x: x, inputs=['cycle_y'], outputs=['cycle_x'])
+        with self.assertRaises(AssertionError):
+            graph.run()
+
+    def test_cache(self):
+        """
+        Test reusing the outputs between runs
+        :return: Expected only the stages with a changed config, and their downstream stages, to run again
+        :rtype:
+        """
+        with tempfile.TemporaryDirectory() as path:
+            graph, loader, scale, shift = self.ensemble(path)
+            expected = graph.run()['x']
+
+            graph, loader, scale, shift = self.ensemble(path)
+            self.assertTrue(np.array_equal(graph.run()['x'], expected))
+            self.assertEqual([getattr(plugin, 'loads', getattr(plugin, 'runs', 0)) for plugin in [loader, scale, shift]],
+                             [0, 0, 0])
+
+            self.config.add_config_attribs({'shift': 2})
+            graph.run()
+            self.assertEqual([getattr(plugin, 'loads', getattr(plugin, 'runs', 0)) for plugin in [loader, scale, shift]],
+                             [0, 0, 1])
+
+    def test_application(self):
+        """
+        Test the Application stages as a graph, with a stage added
+        :return: Expected the same result as run, and the added stage output
+        :rtype:
+        """
+        app = Application(Loader(self.config), ScalePreprocessor(self.config), Model(self.config), self.config)
+        graph = app.graph()
+        graph.add('mean', lambda result: result.mean(), inputs=['result'], outputs=['mean'])
+        values = graph.run()
+
+        self.assertTrue(np.array_equal(values['result'], app.run()))
+        self.assertEqual(values['mean'], values['result'].mean())
+        self.assertIn('predict_time', self.config().index)
+
+    def test_cache_metrics(self):
+        """
+        Test running the cached Application graph again, with the metrics of the last runs logged in the config
+        :return: Expected the data stages read from the cache, for plugins depending on the whole config
+        :rtype:
+        """
+        with tempfile.TemporaryDirectory() as path:
+            CountingLoader.loads = 0
+            app = Application(CountingLoader(self.config), ScalePreprocessor(self.config), Model(self.config), self.config)
+            expected = app.graph(cache_path=path).run()['result']
+            graph = app.graph(cache_path=path)
+            for _ in range(2):
+                self.assertTrue(np.array_equal(graph.run()['result'], expected))
+            self.assertIn('load_data_time', self.config().index)
+            self.assertEqual(CountingLoader.loads, 1)
+
+    def test_cache_params(self):
+        """
+        Test running the cached graph again after changing a param named like a monitor metric
+        :return: Expected the stage run again with the new param
+        :rtype:
+        """
+        with tempfile.TemporaryDirectory() as path:
+            self.config.config = {'name': 'graph', 'window_time': 10}
+            graph = Graph(self.config, cache_path=path, monitor=StageMonitor())
+            graph.add('rolling', lambda: self.config()['window_time'] * 2, outputs=['window'])
+            self.assertEqual(graph.run()['window'], 20)
+            self.assertEqual(graph.run()['window'], 20)
+
+            self.config.add_config_attribs({'window_time': 60})
+            self.assertEqual(graph.run()['window'], 120)
+
+    def test_profile(self):
+        """
+        Test profiling stages running in parallel, one finishing before the other
+        :return: Expected the slow stage sampled until it finishes, in the profile logged in the config
+        :rtype:
+        """
+        started = threading.Barrier(2)
+
+        def fast_stage():
+            started.wait()
+
+        def sleep():
+            time.sleep(0.3)
+
+        def slow_stage():
+            started.wait()
+            sleep()
+
+        profiler = SamplingProfiler(interval=0.001)
+        with tempfile.TemporaryDirectory() as path:
+            graph = Graph(self.config, cache_path=path, workers=2, monitor=StageMonitor(profiler=profiler))
+            graph.add('fast', fast_stage, cache=False)
+            graph.add('slow', slow_stage, cache=False)
+            graph.run()
+
+            self.assertEqual(profiler.samplers, {})
+            with open(self.config()['profile_file']) as f:
+                stacks = f.read()
+            # Sampled after the fast stage finished
+            self.assertRegex(stacks, r'slow_stage \(test_graph\.py:\d+\);sleep \(test_graph\.py')
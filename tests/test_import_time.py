@@ -0,0 +1,46 @@
+from unittest import TestCase
+import json
+import os
+import subprocess
+import sys
+
+from flex.flex.lazy import LazyModule
+
+
+def imported_modules(module: str, code: str = '') -> list:
+    """
+    Import module in a new interpreter, then run code
+    :return: the heavy dependencies imported with them
+    :rtype: list
+    """
+    code = ('import sys\n'
+            'import ' + module + '\n' + code +
+            'print(" ".join(name for name in ["numpy", "pandas", "yaml", "asyncio"] if name in sys.modules))')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout
+    return output.split()
+
+
+class TestImportTime(TestCase):
+
+    def test_import_time(self):
+        """
+        Test importing flex without using it, as a serving entry point or a CLI does
+        :return: Expected numpy, pandas, yaml and asyncio not imported
+        :rtype:
+        """
+        for module in ['flex.flex.config', 'flex.flex.data', 'flex.flex.models', 'flex.flex.learners', 'flex.flex.runs']:
+            self.assertEqual(imported_modules(module), [], module)
+
+    def test_lazy_module(self):
+        """
+        Test a lazy module after its first use
+        :return: Expected the module imported on the first access, and its attributes copied so later accesses
+        don't go through __getattr__
+        :rtype:
+        """
+        lazy = LazyModule('json')
+        self.assertEqual(lazy.dumps([1]), '[1]')
+        self.assertIs(vars(lazy)['dumps'], json.dumps)
+        self.assertIs(lazy.loads, json.loads)
+        self.assertEqual(imported_modules('flex.flex.config.compact', 'flex.flex.config.compact.np.zeros(1)\n'), ['numpy'])
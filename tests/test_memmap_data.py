@@ -0,0 +1,46 @@
+from unittest import TestCase
+from flex.flex.data import Data, MemmapData
+import numpy as np
+import tempfile
+
+
+class TestMemmapData(TestCase):
+
+    def test_from_chunks(self):
+        """
+        Test writing the data chunk by chunk
+        :return: Expected memory mapped x and y with all the chunks
+        :rtype:
+        """
+        x = np.arange(30, dtype=np.float32).reshape(10, 3)
+        y = np.arange(10)
+        data = MemmapData.from_chunks(tempfile.mkdtemp(), (Data(x[i:i + 4], y[i:i + 4]) for i in range(0, 10, 4)))
+
+        self.assertIsInstance(data.x, np.memmap)
+        self.assertEqual(len(data), 10)
+        self.assertTrue(np.array_equal(data.x, x))
+        self.assertTrue(np.array_equal(data.y, y))
+
+        # Lazy slicing
+        batches = list(data.batches(3))
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 3, 1])
+        self.assertIsInstance(batches[1].x, np.memmap)
+        self.assertTrue(np.array_equal(batches[1].x, x[3:6]))
+
+    def test_create(self):
+        """
+        Test filling empty files in place
+        :return: Expected the written values when opened again
+        :rtype:
+        """
+        path = tempfile.mkdtemp()
+        data = MemmapData.create(path, length=5, x_shape=(2,), y_dtype=np.int64)
+        data.x[:] = 1.5
+        data.y[2:4] = 7
+        data.x.flush()
+        data.y.flush()
+
+        data = MemmapData(path)
+        self.assertEqual(data.x.shape, (5, 2))
+        self.assertTrue(np.all(data.x == 1.5))
+        self.assertEqual(list(data.y), [0, 0, 7, 7, 0])
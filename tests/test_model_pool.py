@@ -0,0 +1,164 @@
+from unittest import TestCase
+from flex.flex.config import Configuration
+from flex.flex.data import BaseDataLoader, BaseDataPreprocessor, RawData, Data
+from flex.flex.models import BaseModel, ModelPool
+from flex.flex.learners import BaseLearner
+from flex.flex.runs import Application, Experiment
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+
+class Loader(BaseDataLoader):
+    def load_data(self, *args, **kwargs) -> RawData:
+        return RawData(x=[1, 2, 3], y=[0, 0, 0])
+
+
+class Preprocessor(BaseDataPreprocessor):
+    def preprocess_data(self, data: RawData, *args, **kwargs) -> Data:
+        return Data(x=np.array(data.x), y=np.array(data.y))
+
+
+class Model(BaseModel):
+    config_keys = []
+    loads = 0
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def build(self, *args, **kwargs):
+        pass
+
+    def load(self, *args, **kwargs):
+        Model.loads += 1
+
+    def save(self, *args, **kwargs):
+        pass
+
+    def predict(self, data, *args, **kwargs):
+        with Model.lock:
+            Model.active += 1
+            Model.max_active = max(Model.max_active, Model.active)
+        time.sleep(0.05)
+        with Model.lock:
+            Model.active -= 1
+        return data.x * 2
+
+
+class ConfigModel(Model):
+    # Depends on the whole config
+    config_keys = None
+
+    def predict(self, data, *args, **kwargs):
+        return data.x * 2
+
+
+class TrainedModel(Model):
+    def load(self, *args, **kwargs):
+        super().load()
+        self.weight = 1.
+
+    def predict(self, data, *args, **kwargs):
+        return data.x * self.weight
+
+
+class Learner(BaseLearner):
+    def train(self, model: BaseModel, train_data: Data, *args, **kwargs):
+        model.weight *= self.config()['lr']
+
+    def test(self, model: BaseModel, test_data: Data, *args, **kwargs):
+        self.config.add_config_attribs({'weight': model.weight})
+
+
+class TestModelPool(TestCase):
+
+    def setUp(self):
+        Model.loads = Model.active = Model.max_active = 0
+
+    def config(self, model_file):
+        return Configuration(config={'model_file': model_file}, logs=pd.DataFrame())
+
+    def test_replicas(self):
+        """
+        Test concurrent runs of the same model
+        :return: Expected the model loaded once per replica, and at most replicas concurrent predict calls
+        :rtype:
+        """
+        pool = ModelPool(replicas=2)
+        config = self.config('model.h5')
+        apps = [Application(Loader(config), Preprocessor(config), Model(config), config, pool=pool) for _ in range(8)]
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda app: app.run(), apps))
+
+        for result in results:
+            self.assertTrue(np.array_equal(result, [2, 4, 6]))
+        self.assertEqual(Model.loads, 2)
+        self.assertEqual(Model.max_active, 2)
+
+    def test_evict(self):
+        """
+        Test loading more models than the pool can keep
+        :return: Expected the least recently used model to be loaded again
+        :rtype:
+        """
+        pool = ModelPool(max_models=2)
+        for model_file in ['a.h5', 'b.h5', 'a.h5', 'c.h5', 'a.h5']:
+            with pool.acquire(Model(self.config(model_file))):
+                pass
+        self.assertEqual(Model.loads, 3)
+
+        with pool.acquire(Model(self.config('b.h5'))):
+            pass
+        self.assertEqual(Model.loads, 4)
+
+        # Taken models are not kept, and don't count in max_models
+        model = Model(self.config('b.h5'))
+        pool.take(model)
+        self.assertNotIn(pool.key(model), pool.models)
+        self.assertEqual(len(pool.models), 1)
+        with pool.acquire(Model(self.config('b.h5'))):
+            pass
+        self.assertEqual(Model.loads, 5)
+
+    def test_run_metrics(self):
+        """
+        Test running and streaming the same app several times, with a model depending on the whole config
+        :return: Expected the model loaded once, the metrics logged by the runs not changing its key
+        :rtype:
+        """
+        pool = ModelPool()
+        config = Configuration(config={'model_file': 'model.h5', 'lr': 0.1}, logs=pd.DataFrame())
+        app = Application(Loader(config), Preprocessor(config), ConfigModel(config), config, pool=pool)
+        for _ in range(3):
+            self.assertTrue(np.array_equal(app.run(), [2, 4, 6]))
+        for _ in range(2):
+            self.assertTrue(np.array_equal(np.concatenate(list(app.stream(chunk_size=2))), [2, 4, 6]))
+
+        self.assertIn('predict_time', config().index)
+        self.assertEqual(Model.loads, 1)
+        self.assertEqual(len(pool.models), 1)
+
+        # A new config is a new model
+        config.config = {'model_file': 'model.h5', 'lr': 0.2}
+        app.run()
+        self.assertEqual(Model.loads, 2)
+
+    def test_experiments(self):
+        """
+        Test training the model of the same model_file in successive experiments
+        :return: Expected the model loaded once, and each experiment training its own copy of the loaded model
+        :rtype:
+        """
+        pool = ModelPool(max_models=1)
+        for lr in [2., 3.]:
+            config = Configuration(config={'model_file': 'model.h5', 'lr': lr, 'test_size': 0.5}, logs=pd.DataFrame())
+            experiment = Experiment(Loader(config), Preprocessor(config), TrainedModel(config), Learner(config), config,
+                                    performance_file=None, pool=pool)
+            experiment.run()
+            self.assertEqual(config()['weight'], lr)
+            self.assertIs(experiment.model.config, config)
+
+        self.assertEqual(Model.loads, 1)
+        self.assertEqual(len(pool.models), 1)
@@ -0,0 +1,105 @@
+from unittest import TestCase
+from flex.flex.config import Configuration
+from flex.flex.data import BaseDataLoader, BaseDataPreprocessor, RawData, Data
+from flex.flex.models import BaseModel
+from flex.flex.runs import Application, ModelServer, MicroBatcher
+from concurrent.futures import ThreadPoolExecutor
+import urllib.request
+import threading
+import json
+import numpy as np
+import pandas as pd
+
+
+class Loader(BaseDataLoader):
+    def load_data(self, *args, **kwargs) -> RawData:
+        pass
+
+
+class Preprocessor(BaseDataPreprocessor):
+    def preprocess_data(self, data: RawData, *args, **kwargs) -> Data:
+        return Data(x=np.array(data.x, dtype=float), y=np.array(data.y))
+
+
+class Model(BaseModel):
+    loads = 0
+
+    def build(self, *args, **kwargs):
+        pass
+
+    def load(self, *args, **kwargs):
+        Model.loads += 1
+
+    def save(self, *args, **kwargs):
+        pass
+
+    def predict(self, data, *args, **kwargs):
+        return data.x.sum(axis=1)
+
+
+class ShortModel(Model):
+    def load(self, *args, **kwargs):
+        pass
+
+    def predict(self, data, *args, **kwargs):
+        # One result too few for batches of 2 samples or more, none for a failed sample
+        if (data.x[:, 0] < 0).any():
+            return None
+        return data.x.sum(axis=1)[:max(len(data.x) - 1, 1)]
+
+
+class TestModelServer(TestCase):
+
+    def test_serve(self):
+        """
+        Test concurrent requests to the HTTP endpoint
+        :return: Expected the right result for each request, batched, with the model loaded once
+        :rtype:
+        """
+        config = Configuration(config={'name': 'app'}, logs=pd.DataFrame())
+        app = Application(Loader(config), Preprocessor(config), Model(config), config)
+        server = ModelServer(app, port=0, max_batch_size=8, max_wait=0.05)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:' + str(server.server_address[1])
+
+        def predict(i):
+            request = urllib.request.Request(url + '/predict', data=json.dumps({'x': [i, 1]}).encode(), method='POST')
+            with urllib.request.urlopen(request) as response:
+                return json.loads(response.read())['y']
+
+        try:
+            with ThreadPoolExecutor(16) as executor:
+                results = list(executor.map(predict, range(32)))
+            with urllib.request.urlopen(url + '/stats') as response:
+                stats = json.loads(response.read())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(results, [i + 1. for i in range(32)])
+        self.assertEqual(Model.loads, 1)
+        self.assertEqual(stats['requests'], 32)
+        self.assertLess(stats['batches'], 32)
+        self.assertLessEqual(stats['p50'], stats['p99'])
+
+    def test_bad_results(self):
+        """
+        Test a model returning too few results, or not indexable ones
+        :return: Expected the errors raised to the requests of the batch, and the next requests still served
+        :rtype:
+        """
+        config = Configuration(config={'name': 'app'}, logs=pd.DataFrame())
+        batcher = MicroBatcher(Application(Loader(config), Preprocessor(config), ShortModel(config), config),
+                               max_batch_size=2, max_wait=1)
+        batcher.start()
+        try:
+            with ThreadPoolExecutor(2) as executor:
+                futures = [executor.submit(batcher.predict, [i, 1], 5) for i in range(2)]
+                for future in futures:
+                    with self.assertRaises(ValueError):
+                        future.result()
+            with self.assertRaises(TypeError):
+                batcher.predict([-1, 1], timeout=5)
+            self.assertEqual(batcher.predict([2, 1], timeout=5), 3.)
+        finally:
+            batcher.stop()
@@ -0,0 +1,107 @@
+from unittest import TestCase
+from flex.flex.config import Configuration, SQLiteDataMgr
+import pandas as pd
+import tempfile
+import pickle
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TestSQLiteDataMgr(TestCase):
+
+    def setUp(self):
+        self.file = os.path.join(tempfile.mkdtemp(), 'logs.db')
+        self.logs_df = pd.DataFrame({'name': ['exp0', 'exp1', 'exp2'],
+                                     'tag': ['sweep1', 'sweep1', 'sweep2'],
+                                     'lr': [0.1, 0.2, 0.3],
+                                     'val_acc': [0.5, 0.9, 0.7]})
+
+    def test_logs(self):
+        """
+        Test logging to the database, with config keys changing between runs
+        :return: Expected the same logs as the in memory DataMgr
+        :rtype:
+        """
+        cfg = Configuration(config={'name': 'exp3', 'optimizer': 'adam'}, logs=self.logs_df,
+                            data_mgr=SQLiteDataMgr(self.file))
+        cfg.add_config_attribs({'test_acc': 0.8})
+        expected = Configuration(config={'name': 'exp3', 'optimizer': 'adam'}, logs=self.logs_df)
+        expected.add_config_attribs({'test_acc': 0.8})
+
+        # Columns in the order the database first got them
+        self.assertTrue(expected.logs.equals(cfg.logs[expected.logs.columns]))
+
+        # Another process gets the old runs from the database
+        cfg = Configuration(config={'name': 'exp4'}, data_mgr=SQLiteDataMgr(self.file))
+        self.assertEqual(list(cfg.logs['name']), ['exp0', 'exp1', 'exp2', 'exp3', 'exp4'])
+
+    def test_shared_logs(self):
+        """
+        Test loading old logs into a database other writers log to, and logging from several threads
+        :return: Expected the runs of the other writers kept, and every thread edit in the config record
+        :rtype:
+        """
+        writer = Configuration(config={'name': 'a'}, data_mgr=SQLiteDataMgr(self.file))
+        writer.append_logs(pd.DataFrame({'name': ['a1', 'a2']}))
+
+        cfg = Configuration(config={'name': 'b'}, logs=pd.DataFrame({'name': ['old']}), data_mgr=SQLiteDataMgr(self.file))
+        self.assertEqual(list(cfg.logs['name']), ['a', 'a1', 'a2', 'old', 'b'])
+        self.assertEqual(len(cfg.data_mgr.tail(cfg.data_mgr.loaded)), 1)
+
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(lambda i: cfg.add_config_attribs({'metric' + str(i): i}), range(8)))
+        self.assertEqual([cfg()['metric' + str(i)] for i in range(8)], list(range(8)))
+        record = cfg.query_logs(filters=[('name', '==', 'b')])
+        self.assertEqual(record['metric7'].iloc[0], 7)
+
+    def test_query_logs(self):
+        """
+        Test indexed queries by name, tag and metric range
+        :return: Expected only the matching runs and the selected columns
+        :rtype:
+        """
+        cfg = Configuration(config={}, logs=self.logs_df, data_mgr=SQLiteDataMgr(self.file))
+
+        self.assertEqual(list(cfg.query_logs(filters=[('name', '==', 'exp1')])['lr']), [0.2])
+        self.assertEqual(list(cfg.query_logs(filters=[('tag', 'in', ['sweep1'])])['name']), ['exp0', 'exp1'])
+
+        logs_df = cfg.query_logs(columns=['name', 'val_acc'], filters=[('val_acc', '>=', 0.6), ('lr', '<', 0.3)])
+        self.assertEqual(list(logs_df.columns), ['name', 'val_acc'])
+        self.assertEqual(list(logs_df['name']), ['exp1'])
+
+        # Ranges only match values of the same type
+        cfg.append_logs(pd.DataFrame({'name': ['exp4'], 'val_acc': ['n/a']}))
+        self.assertEqual(list(cfg.query_logs(filters=[('val_acc', '>=', 0.9)])['name']), ['exp1'])
+        self.assertEqual(list(cfg.query_logs(filters=[('val_acc', '>', 'a')])['name']), ['exp4'])
+
+    def test_pickle(self):
+        """
+        Test passing the DataMgr to another process
+        :return: Expected the unpickled DataMgr to open its own connection to the same database
+        :rtype:
+        """
+        data_mgr = SQLiteDataMgr(self.file, logs=self.logs_df)
+        data_mgr.logs
+        data_mgr = pickle.loads(pickle.dumps(data_mgr))
+        data_mgr.append(pd.DataFrame({'name': 'exp3'}, index=[0]))
+        self.assertEqual(data_mgr.count(), 4)
+
+    def test_top_logs(self):
+        """
+        Test the leaderboard of the logs, with runs logged and edited after the first query
+        :return: Expected the same best runs from the database index and from the in memory DataMgr
+        :rtype:
+        """
+        for data_mgr in [SQLiteDataMgr(self.file), None]:
+            cfg = Configuration(config={'name': 'exp3', 'tag': 'sweep2'}, logs=self.logs_df, data_mgr=data_mgr)
+            self.assertEqual(list(cfg.top_logs('val_acc', k=2)['name']), ['exp1', 'exp2'])
+
+            cfg.add_config_attribs({'val_acc': 0.95, 'lr': 0.4})
+            cfg.append_logs(pd.DataFrame({'name': 'exp4', 'tag': 'sweep2', 'val_acc': 0.6}, index=[0]))
+            self.assertEqual(list(cfg.top_logs('val_acc', k=3)['name']), ['exp3', 'exp1', 'exp2'])
+            self.assertEqual(list(cfg.top_logs('val_acc', k=2, mode='min')['name']), ['exp0', 'exp4'])
+
+            top = cfg.top_logs('val_acc', k=5, filters=[('tag', '==', 'sweep2')], columns=['name', 'val_acc'])
+            self.assertEqual(list(top.columns), ['name', 'val_acc'])
+            self.assertEqual(list(top['name']), ['exp3', 'exp2', 'exp4'])
+            self.assertEqual(list(top['val_acc']), [0.95, 0.7, 0.6])
@@ -0,0 +1,253 @@
+from unittest import TestCase
+from flex.flex.config import Configuration
+from flex.flex.data import BaseDataLoader, BaseDataPreprocessor, RawData, Data
+from flex.flex.models import ArtifactStore, BaseModel
+from flex.flex.learners import BaseLearner
+from flex.flex.runs import Sweep, MedianStoppingScheduler, SuccessiveHalvingScheduler, Checkpoint
+import numpy as np
+import pandas as pd
+import os
+import pickle
+import tempfile
+import warnings
+
+
+class Loader(BaseDataLoader):
+    def load_data(self, *args, **kwargs) -> RawData:
+        return RawData(x=list(range(10)), y=list(range(10)))
+
+
+class Preprocessor(BaseDataPreprocessor):
+    def preprocess_data(self, data: RawData, *args, **kwargs) -> Data:
+        return Data(x=np.array(data.x), y=np.array(data.y))
+
+
+class Model(BaseModel):
+    def build(self, *args, **kwargs):
+        self.weight = self.config()['lr']
+
+    def load(self, *args, **kwargs):
+        pass
+
+    def save(self, *args, **kwargs):
+        pass
+
+    def predict(self, data, *args, **kwargs):
+        return data.x * self.weight
+
+
+class Learner(BaseLearner):
+    def train(self, model: BaseModel, train_data: Data, *args, **kwargs):
+        pass
+
+    def test(self, model: BaseModel, test_data: Data, *args, **kwargs):
+        if self.config()['batch_size'] == 0:
+            raise ValueError('Bad batch size')
+        error = np.abs(model.predict(test_data) - test_data.y).mean()
+        self.config.add_config_attribs({'error': float(error), 'pid': os.getpid()})
+
+
+class EpochLearner(Learner):
+    def train(self, model: BaseModel, train_data: Data, *args, **kwargs):
+        # The loss of lr 1 goes down to 0, the other ones stay higher
+        for epoch in range(1, 9):
+            self.config.add_config_attribs({'epochs': epoch})
+            self.report(epoch, {'loss': abs(1 - model.weight) + 1 / epoch})
+
+
+class RebuiltModel(Model):
+    def load(self, *args, **kwargs):
+        # Nothing learned to save
+        self.build()
+
+
+class CountingLearner(Learner):
+    fail = False
+    tests = 0
+
+    def test(self, model: BaseModel, test_data: Data, *args, **kwargs):
+        CountingLearner.tests += 1
+        if CountingLearner.fail and self.config()['lr'] == 1.0:
+            raise ValueError('Node failure')
+        super().test(model, test_data)
+
+
+class FileModel(Model):
+    def load(self, *args, **kwargs):
+        with open(self.config()['model_file'], 'rb') as f:
+            self.weight = pickle.load(f)
+
+    def save(self, *args, **kwargs):
+        with open(self.config()['model_file'], 'wb') as f:
+            pickle.dump(self.weight, f)
+
+
+class CountingFileModel(FileModel):
+    saves = 0
+
+    def save(self, *args, **kwargs):
+        CountingFileModel.saves += 1
+        super().save()
+
+
+class FineTuningLearner(Learner):
+    fail = False
+
+    def train(self, model: BaseModel, train_data: Data, *args, **kwargs):
+        model.weight = self.config()['lr']
+
+    def test(self, model: BaseModel, test_data: Data, *args, **kwargs):
+        if FineTuningLearner.fail and self.config()['lr'] == 0.5:
+            raise ValueError('Node failure')
+        super().test(model, test_data)
+
+
+class TestSweep(TestCase):
+
+    def test_run_grid(self):
+        """
+        Test running a grid on a process pool
+        :return: Expected one record per point logged in the base config, with the results from the learner
+        :rtype:
+        """
+        config = Configuration(config={'name': 'sweep', 'test_size': 0}, logs=pd.DataFrame())
+        sweep = Sweep(loader=Loader, preprocessor=Preprocessor, model=Model, learner=Learner, config=config,
+                      params={'lr': [0.5, 1.0], 'batch_size': [16, 32]}, workers=2)
+        records = sweep.run().sort_values('trial')
+
+        self.assertEqual(list(records['lr']), [0.5, 0.5, 1.0, 1.0])
+        self.assertEqual(list(records['batch_size']), [16, 32, 16, 32])
+        self.assertEqual(list(records['error']), [2.25, 2.25, 0.0, 0.0])
+        self.assertNotIn(os.getpid(), list(records['pid']))
+        self.assertEqual(len(config.logs), 5)
+
+    def test_run_sample_in_process(self):
+        """
+        Test running random points in this process, with a failing trial
+        :return: Expected the failure to be logged, and the other trials to run
+        :rtype:
+        """
+        config = Configuration(config={'name': 'sweep', 'test_size': 0}, logs=pd.DataFrame())
+        points = list(Sweep.sample({'lr': lambda rng: rng.uniform(0, 1), 'batch_size': [0, 32]}, trials=6, seed=0))
+        sweep = Sweep(loader=Loader, preprocessor=Preprocessor, model=Model, learner=Learner, config=config,
+                      params=points, workers=0)
+        with self.assertWarns(UserWarning):
+            records = sweep.run()
+
+        self.assertEqual(len(records), 6)
+        for point, (_, record) in zip(points, records.iterrows()):
+            self.assertEqual(point['lr'], record['lr'])
+            self.assertEqual(isinstance(record['trial_error'], str), point['batch_size'] == 0)
+
+    def test_scheduler(self):
+        """
+        Test stopping the worst trials early, in this process and on a process pool
+        :return: Expected the best trials to run all their epochs, and the worst ones to be pruned and logged
+        :rtype:
+        """
+        for scheduler in [MedianStoppingScheduler('loss', grace_steps=2, min_trials=3),
+                          SuccessiveHalvingScheduler('loss', min_steps=2, reduction=2)]:
+            for workers in [0, 2]:
+                config = Configuration(config={'name': 'sweep', 'test_size': 0}, logs=pd.DataFrame())
+                # The trials get worse in the grid order, so the last ones are compared with the first ones
+                sweep = Sweep(loader=Loader, preprocessor=Preprocessor, model=Model, learner=EpochLearner, config=config,
+                              params={'lr': [1.0, 0.9, 0.8, 0.5, 0.2, 0.1], 'batch_size': [32]}, workers=workers, scheduler=scheduler)
+                records = sweep.run().sort_values('trial')
+
+                self.assertFalse(records['pruned'].iloc[0])
+                self.assertEqual(records['epochs'].iloc[0], 8)
+                self.assertTrue(records['pruned'].iloc[-1])
+                self.assertLess(records['pruned_step'].iloc[-1], 8)
+                self.assertIn('pruned', config.logs.columns)
+
+                decisions = sweep.decisions
+                self.assertEqual(len(decisions[decisions['decision'] == 'stop']), records['pruned'].sum())
+                self.assertEqual(len(decisions[decisions['trial'] == 0]), 8)
+
+    def test_scheduler_intervals(self):
+        """
+        Test trials reporting at different intervals, and invalid rungs
+        :return: Expected the trials without a report at the step not compared, and the invalid rungs rejected
+        :rtype:
+        """
+        scheduler = MedianStoppingScheduler('loss', grace_steps=1, min_trials=1)
+        for step in [4, 8]:
+            self.assertFalse(scheduler.report(0, step, {'loss': 0.1}))
+        self.assertFalse(scheduler.report(1, 2, {'loss': 0.9}))
+        self.assertTrue(scheduler.report(1, 4, {'loss': 0.9}))
+
+        with self.assertRaises(AssertionError):
+            SuccessiveHalvingScheduler('loss', min_steps=0)
+        with self.assertRaises(AssertionError):
+            SuccessiveHalvingScheduler('loss', reduction=1)
+
+    def test_resume(self):
+        """
+        Test running again a sweep with a failed trial, e.g. after a node failure
+        :return: Expected only the failed trial to run again, and the records of all the trials
+        :rtype:
+        """
+        with tempfile.TemporaryDirectory() as path:
+            CountingLearner.tests = 0
+            for fail, tests in [(True, 2), (False, 3)]:
+                CountingLearner.fail = fail
+                config = Configuration(config={'name': 'sweep', 'test_size': 0}, logs=pd.DataFrame())
+                sweep = Sweep(loader=Loader, preprocessor=Preprocessor, model=RebuiltModel, learner=CountingLearner, config=config,
+                              params={'lr': [0.5, 1.0], 'batch_size': [32]}, workers=0, checkpoint=Checkpoint(path))
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    records = sweep.run()
+                self.assertEqual(CountingLearner.tests, tests)
+
+            self.assertEqual(list(records['error']), [2.25, 0.0])
+
+    def test_resume_model(self):
+        """
+        Test resuming a failed trial, with the trials fine tuning the same model_file
+        :return: Expected the resumed trial to load its own trained model, and the pretrained model unchanged
+        :rtype:
+        """
+        with tempfile.TemporaryDirectory() as path:
+            model_file = os.path.join(path, 'model.pkl')
+            with open(model_file, 'wb') as f:
+                pickle.dump(0., f)
+
+            for fail in [True, False]:
+                FineTuningLearner.fail = fail
+                config = Configuration(config={'name': 'sweep', 'test_size': 0, 'model_file': model_file},
+                                       logs=pd.DataFrame())
+                sweep = Sweep(loader=Loader, preprocessor=Preprocessor, model=FileModel, learner=FineTuningLearner,
+                              config=config, params={'lr': [0.5, 1.0], 'batch_size': [32]}, workers=0,
+                              checkpoint=Checkpoint(os.path.join(path, 'checkpoints')))
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    records = sweep.run()
+
+            self.assertEqual(sorted(records['error']), [0.0, 2.25])
+            with open(model_file, 'rb') as f:
+                self.assertEqual(pickle.load(f), 0.)
+
+    def test_artifacts_checkpoint(self):
+        """
+        Test a sweep storing the trained models, with a checkpoint
+        :return: Expected each model saved once, in the checkpoint, and referenced by the trial record
+        :rtype:
+        """
+        with tempfile.TemporaryDirectory() as path:
+            model_file = os.path.join(path, 'model.pkl')
+            with open(model_file, 'wb') as f:
+                pickle.dump(0., f)
+            CountingFileModel.saves = 0
+            FineTuningLearner.fail = False
+            config = Configuration(config={'name': 'sweep', 'test_size': 0, 'model_file': model_file},
+                                   logs=pd.DataFrame())
+            sweep = Sweep(loader=Loader, preprocessor=Preprocessor, model=CountingFileModel, learner=FineTuningLearner,
+                          config=config, params={'lr': [0.5, 1.0], 'batch_size': [32]}, workers=0,
+                          checkpoint=Checkpoint(os.path.join(path, 'checkpoints')),
+                          artifacts=ArtifactStore(os.path.join(path, 'artifacts')))
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                records = sweep.run()
+
+            self.assertEqual(CountingFileModel.saves, 2)
+            self.assertEqual(records['model_artifact'].nunique(), 2)
@@ -0,0 +1,144 @@
+from unittest import TestCase
+from flex.flex.config import Configuration
+from flex.flex.runs import GitTracker, Sweep
+from .test_sweep import Loader, Preprocessor, Model, Learner
+import pandas as pd
+import os
+import subprocess
+import tempfile
+
+
+def git(git_dir: str, *args) -> str:
+    return subprocess.run(['git', '--git-dir', git_dir] + list(args), capture_output=True, text=True, check=True).stdout
+
+
+def loose_objects(git_dir: str) -> int:
+    objects = os.path.join(git_dir, 'objects')
+    return sum(len(os.listdir(os.path.join(objects, name))) for name in os.listdir(objects) if len(name) == 2)
+
+
+class TestGitTracker(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.git_dir = os.path.join(self.dir.name, 'repo.git')
+        self.work_tree = os.path.join(self.dir.name, 'work')
+        subprocess.run(['git', 'init', '-q', '--bare', self.git_dir], check=True)
+        os.makedirs(os.path.join(self.work_tree, 'models'))
+        os.makedirs(os.path.join(self.work_tree, '__pycache__'))
+        for file, content in [('train.py', 'lr = 0.1\n'), ('models/model.py', 'layers = 2\n'), ('__pycache__/train.pyc', 'x')]:
+            with open(os.path.join(self.work_tree, file), 'w') as f:
+                f.write(content)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_snapshot(self):
+        """
+        Test committing the work tree in a bare repository
+        :return: Expected valid commits and tags read by git, with only the changed files written again
+        :rtype:
+        """
+        tracker = GitTracker(self.work_tree, git_dir=self.git_dir)
+        first = tracker.snapshot(branch='experiments', tag='exp1')
+
+        self.assertEqual(git(self.git_dir, 'ls-tree', '-r', '--name-only', 'experiments').split(), ['models/model.py', 'train.py'])
+        self.assertEqual(git(self.git_dir, 'show', 'exp1:train.py'), 'lr = 0.1\n')
+
+        with open(os.path.join(self.work_tree, 'train.py'), 'w') as f:
+            f.write('lr = 0.01\n')
+        objects = loose_objects(self.git_dir)
+        second = GitTracker(self.work_tree, git_dir=self.git_dir).snapshot(branch='experiments', tag='exp2',
+                                                                            files={'runs/exp2.csv': b'lr\n0.01\n'})
+
+        # The changed file, the config file, the root and runs trees, and the commit
+        self.assertEqual(loose_objects(self.git_dir) - objects, 5)
+        self.assertEqual(git(self.git_dir, 'rev-parse', 'experiments^').strip(), first)
+        self.assertEqual(git(self.git_dir, 'rev-parse', 'exp2').strip(), second)
+        self.assertEqual(git(self.git_dir, 'show', 'exp2:runs/exp2.csv'), 'lr\n0.01\n')
+        self.assertEqual(git(self.git_dir, 'log', '--format=%s', 'experiments').split(), ['exp2', 'exp1'])
+        git(self.git_dir, 'fsck', '--strict')
+
+    def test_batch(self):
+        """
+        Test committing many trials in one batch
+        :return: Expected one pack file with all the objects, and no loose object
+        :rtype:
+        """
+        tracker = GitTracker(self.work_tree, git_dir=self.git_dir)
+        with tracker.batch():
+            for trial in range(20):
+                tracker.snapshot(branch='sweep', tag='trial-' + str(trial), files={'trial.txt': str(trial).encode()})
+
+        pack_path = os.path.join(self.git_dir, 'objects', 'pack')
+        packs = [file for file in os.listdir(pack_path) if file.endswith('.idx')]
+        self.assertEqual(len(packs), 1)
+        self.assertEqual(loose_objects(self.git_dir), 0)
+        git(self.git_dir, 'verify-pack', os.path.join(pack_path, packs[0]))
+        git(self.git_dir, 'fsck', '--strict')
+        self.assertEqual(len(git(self.git_dir, 'log', '--format=%H', 'sweep').split()), 20)
+        self.assertEqual(git(self.git_dir, 'show', 'trial-7:trial.txt'), '7')
+
+    def test_sweep(self):
+        """
+        Test tracking the trials of a sweep
+        :return: Expected one tagged commit per trial, with the trial record
+        :rtype:
+        """
+        config = Configuration(config={'name': 'grid', 'test_size': 0}, logs=pd.DataFrame())
+        sweep = Sweep(loader=Loader, preprocessor=Preprocessor, model=Model, learner=Learner, config=config,
+                      params={'lr': [0.5, 1.0], 'batch_size': [32]}, workers=0,
+                      tracker=GitTracker(self.work_tree, git_dir=self.git_dir))
+        sweep.run()
+
+        self.assertEqual(git(self.git_dir, 'tag').split(), ['grid-trial-0', 'grid-trial-1'])
+        record = git(self.git_dir, 'show', 'grid-trial-1:runs/grid-trial-1.csv')
+        self.assertIn('error', record)
+
+    def test_ignored(self):
+        """
+        Test a work tree with ignored data and models
+        :return: Expected the files ignored by .gitignore not committed
+        :rtype:
+        """
+        os.makedirs(os.path.join(self.work_tree, 'data'))
+        for file, content in [('.gitignore', 'data/\n*.h5\n'), ('data/big.bin', 'data'), ('model.h5', 'weights')]:
+            with open(os.path.join(self.work_tree, file), 'w') as f:
+                f.write(content)
+        GitTracker(self.work_tree, git_dir=self.git_dir).snapshot(branch='experiments')
+        self.assertEqual(git(self.git_dir, 'ls-tree', '-r', '--name-only', 'experiments').split(),
+                         ['.gitignore', 'models/model.py', 'train.py'])
+
+    def test_concurrent(self):
+        """
+        Test two trackers committing on the same branch, one of them in a batch
+        :return: Expected the commits of both on the branch
+        :rtype:
+        """
+        tracker = GitTracker(self.work_tree, git_dir=self.git_dir)
+        with tracker.batch():
+            batched = tracker.snapshot(branch='sweep', tag='trial-0')
+            other = GitTracker(self.work_tree, git_dir=self.git_dir).snapshot(branch='sweep', tag='trial-1')
+
+        commits = git(self.git_dir, 'log', '--format=%H', 'sweep').split()
+        self.assertIn(batched, commits)
+        self.assertIn(other, commits)
+        self.assertEqual(git(self.git_dir, 'rev-parse', 'trial-0').strip(), batched)
+        self.assertFalse(os.path.exists(os.path.join(self.git_dir, 'refs', 'heads', 'sweep.lock')))
+        git(self.git_dir, 'fsck', '--strict')
+
+    def test_batch_crash(self):
+        """
+        Test a new process snapshotting after a process crashed in a batch
+        :return: Expected the files hashed again, with no commit pointing to missing objects
+        :rtype:
+        """
+        tracker = GitTracker(self.work_tree, git_dir=self.git_dir)
+        batch = tracker.batch()
+        batch.__enter__()
+        tracker.snapshot(branch='sweeps/crashed', tag='crashed-trial-0')
+        # Crashed: the batch is never written
+
+        GitTracker(self.work_tree, git_dir=self.git_dir).snapshot(branch='experiments', tag='exp1')
+        self.assertEqual(git(self.git_dir, 'show', 'exp1:train.py'), 'lr = 0.1\n')
+        git(self.git_dir, 'fsck', '--strict')